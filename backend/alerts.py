@@ -1,6 +1,5 @@
 # alerts.py
 import os
-from twilio.rest import Client
 from database import SessionLocal
 from models import UserPref
 from messages import format_alert
@@ -9,25 +8,18 @@ from messages import translations
 
 load_dotenv()
 
-# load creds from env (don't hardcode)
-account_sid = os.getenv("TWILIO_SID")
-auth_token = os.getenv("TWILIO_TOKEN")
-twilio_client = Client(account_sid, auth_token)
+from twilio_client import send_message
+from metrics import ALERTS_EVALUATED, ALERTS_FIRED, ALERTS_DELIVERED
+from risk import check_thresholds
 
 FROM_SMS = os.getenv("FROM_SMS")              # +1419...
 FROM_WHATSAPP = os.getenv("FROM_WHATSAPP")    # whatsapp:+1415...
-MOISTURE_THRESHOLD = int(os.getenv("MOISTURE_THRESHOLD", "80"))
-VIBRATION_THRESHOLD = int(os.getenv("VIBRATION_THRESHOLD", "10"))
-TILT_THRESHOLD = int(os.getenv("TILT_THRESHOLD", "10"))
 
 def check_and_alert(moisture, vibration, tilt):
-    exceeded_count = sum([
-        moisture > MOISTURE_THRESHOLD,
-        vibration > VIBRATION_THRESHOLD,
-        tilt > TILT_THRESHOLD
-    ])
-    if exceeded_count < 2:
+    ALERTS_EVALUATED.inc()
+    if not check_thresholds({"moisture": moisture, "vibration": vibration, "tilt": tilt})["should_alert"]:
         return
+    ALERTS_FIRED.inc()
 
     # craft per-language messages and send
     with SessionLocal() as session:
@@ -38,22 +30,18 @@ def check_and_alert(moisture, vibration, tilt):
 
             # WhatsApp
             try:
-                twilio_client.messages.create(
-                    from_=FROM_WHATSAPP,
-                    to=f"whatsapp:{u.phone}",
-                    body=msg
-                )
+                send_message(from_=FROM_WHATSAPP, to=f"whatsapp:{u.phone}", body=msg, operation="alert")
+                ALERTS_DELIVERED.inc(channel="whatsapp", outcome="sent")
             except Exception as e:
+                ALERTS_DELIVERED.inc(channel="whatsapp", outcome="failed")
                 print("WhatsApp send failed for", u.phone, e)
 
             # SMS fallback (optional) - if you want SMS copies too
             try:
-                twilio_client.messages.create(
-                    body=msg,
-                    from_=FROM_SMS,
-                    to=u.phone
-                )
+                send_message(from_=FROM_SMS, to=u.phone, body=msg, operation="alert")
+                ALERTS_DELIVERED.inc(channel="sms", outcome="sent")
             except Exception as e:
+                ALERTS_DELIVERED.inc(channel="sms", outcome="failed")
                 print("SMS send failed for", u.phone, e)
 
     print("✅ Alerts sent to subscribed users")
@@ -1,62 +1,233 @@
 # app.py
-from flask import Flask, request, jsonify
-from supabase import create_client
-from dotenv import load_dotenv
+"""
+TerraShield backend API.
+
+create_app() builds the Flask app. Supabase, Twilio, the spool, the archive
+and the messaging gateway are created on first use, so building the app needs
+no network and is safe in each worker after fork. serve.py runs it with
+several workers and threads; `python app.py` does the same.
+
+GET /healthz, /readyz and /metrics expose liveness, readiness and
+Prometheus-style metrics (request latency per route, Supabase and Twilio call
+latency, ingest and alert counters, cache hits, spool backlog and per-node
+freshness). GET /traces lists the slowest recent ingest traces.
+
+Requests can be profiled (profiling.py): PROFILE_RATE, SIGUSR2, or
+GET/POST /admin/profile with the X-Admin-Token header (ADMIN_TOKEN).
+"""
+
 import os
-from messages import translations, format_sensor_values
-from alerts import check_and_alert
-from twilio.rest import Client
-import math
+import time
+import hmac
+from flask import Flask, Blueprint, Response, request, jsonify, stream_with_context, g
+from dotenv import load_dotenv
+import pandas as pd
+from datetime import datetime, timezone
+from calibration import calibrate_rows, parse_node_id, with_derived
+from link_quality import link_tracker
+from node_summary import summary_store
+from export import export_stream, CONTENT_TYPES
+from archive import get_archive, to_timestamp
+from data_access import get_database, is_rejected, is_unavailable, reading_record, DatabaseError
+from spool import get_spool
+from rollups import bucket_for_points
+from gateway import create_blueprint, get_gateway
+from metrics import REGISTRY, CONTENT_TYPE, CACHE_REQUESTS, counter, gauge, histogram, collector
+from tracing import Trace, tracer, parse_timestamp
+from profiling import profiler
 
 # --- Load environment variables ---
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-FROM_WHATSAPP = os.getenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
-TWILIO_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 
-# --- Supabase & Twilio setup ---
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-twilio_client = Client(TWILIO_SID, TWILIO_TOKEN)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+api = Blueprint("api", __name__)
+
+REQUEST_SECONDS = histogram("http_request_duration_seconds", "Request latency", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = gauge("http_requests_in_flight", "Requests being handled")
+READINGS_INGESTED = counter("readings_ingested_total", "Readings accepted on POST /sensor-data", ("outcome",))
+BREAKER_STATES = {"closed": 0, "half-open": 1, "open": 2}
+DERIVED_FIELDS = ("moisture", "vibration", "tilt")   # stored with every reading
+
+
+def create_app(config=None):
+    """Backend app; PRIMARY_WORKER=False leaves archive maintenance to another
+    worker (every worker replays the spool). WORKERS is the number of processes
+    serving the app"""
+    app = Flask(__name__)
+    app.config.from_mapping(PRIMARY_WORKER=True, WORKERS=1)
+    app.config.from_mapping(config or {})
+
+    app.register_blueprint(api)
+    app.register_blueprint(create_blueprint(get_gateway))   # POST /whatsapp
+    app.before_request(start_request_timer)
+    app.after_request(record_request_status)
+    app.teardown_request(observe_request)
+    collector(backend_state)
+
+    archive = get_archive()
+    if archive is not None:
+        archive.maintenance = app.config["PRIMARY_WORKER"]
+        archive.shared = app.config["WORKERS"] > 1   # Other workers buffer readings too
+    # Every worker replays readings spooled while Supabase was unreachable,
+    # so a worker's own segments never wait on another worker
+    get_spool().start_replayer(
+        lambda batch: get_database().upsert_readings([reading_record(r) for r in batch]),
+        can_send=lambda: get_database().breaker.state != "open",
+        is_rejected=is_rejected,   # Quarantined, so one bad segment cannot block the rest
+    )
+    return app
+
+
+def shutdown():
+    """Flush buffered state once requests have drained"""
+    archive = get_archive()
+    if archive is not None:
+        archive.flush()
+    gateway = get_gateway(create=False)
+    if gateway is not None:
+        gateway.prefs.flush()
+
+
+# ------------------ METRICS ------------------
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.response_status = 500   # Until a response is produced
+    REQUESTS_IN_FLIGHT.inc()
+    if profiler.enabled:
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        g.profile = profiler.start(f"{request.method}{rule.replace('/', '_')}")
+
+
+def record_request_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+def observe_request(exc=None):
+    if "request_started" not in g:
+        return
+    REQUESTS_IN_FLIGHT.dec()
+    profiler.stop(g.pop("profile", None))
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                            method=request.method, route=route, status=g.response_status)
+
+
+def backend_state():
+    """Scrape-time gauges read from the breaker, spool and per-node stores"""
+    try:
+        breaker = get_database().breaker.state
+        yield ("supabase_circuit_state", "gauge", "0 closed, 1 half-open, 2 open",
+               [({}, BREAKER_STATES[breaker])])
+    except ValueError:
+        pass   # Supabase not configured
+
+    segments, size = get_spool().backlog()
+    yield ("spool_segments", "gauge", "Spool segments waiting for replay", [({}, segments)])
+    yield ("spool_bytes", "gauge", "Bytes of spooled readings waiting for replay", [({}, size)])
+
+    summary = summary_store.snapshot()
+    yield ("node_reading_age_seconds", "gauge", "Seconds since the node's newest reading was taken",
+           [({"node_id": node_id}, s["age_seconds"]) for node_id, s in summary.items()])
+
+    links = link_tracker.snapshot()
+    yield ("node_seconds_since_seen", "gauge", "Seconds since a packet from the node arrived",
+           [({"node_id": node_id}, s["seconds_since_seen"]) for node_id, s in links.items()])
+    yield ("node_packet_loss_ratio", "gauge", "Packet loss over the node's recent window",
+           [({"node_id": node_id}, s["loss_rate"]) for node_id, s in links.items()])
+
+
+@api.route("/healthz", methods=["GET"])
+def healthz():
+    """The process is up and serving requests"""
+    return jsonify({"status": "ok"})
+
+
+@api.route("/readyz", methods=["GET"])
+def readyz():
+    """Ready when Supabase is configured; an open breaker only marks it degraded
+    (readings are spooled meanwhile)"""
+    try:
+        breaker = get_database().breaker.state
+    except ValueError as e:
+        return jsonify({"status": "not ready", "database": str(e)}), 503
+    segments, _ = get_spool().backlog()
+    return jsonify({
+        "status": "degraded" if breaker == "open" else "ready",
+        "database": breaker,
+        "spool_segments": segments,
+    })
+
+
+@api.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@api.route("/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """Profiler status (GET) or control (POST JSON: {"rate", "mode", "count"}) for this worker"""
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({"status": "error", "message": "Not found"}), 404
+
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(rate=body.get("rate"), mode=body.get("mode"))
+            if "count" in body:
+                profiler.arm(int(body["count"]))
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(profiler.status())
+
+
+@api.route("/traces", methods=["GET"])
+def get_traces():
+    """Slowest recent traces handled by this worker: ?pipeline=ingest&limit="""
+    try:
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer"}), 400
+    return jsonify(tracer.slowest(request.args.get("pipeline"), limit))
 
-app = Flask(__name__)
 
 # ------------------ ROOT ROUTE ------------------
-@app.route("/sensor-data", methods=["GET"])
+@api.route("/sensor-data", methods=["GET"])
 def get_sensor_data():
+    # ?since=<created_at> returns rows at or after that cursor, oldest first,
+    # so clients can page forward incrementally; otherwise the newest rows
+    since = request.args.get("since")
     try:
-        response = (
-            supabase.table("sensor_readings")
-            .select("ax, ay, az, gx, gy, gz, moisture, temperature, created_at")
-            .order("created_at", desc=True)
-            .limit(50)
-            .execute()
-        )
-        print("DEBUG Supabase rows:", response.data)
+        limit = min(max(int(request.args.get("limit", 50)), 1), 1000)
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer"}), 400
 
-        rows = response.data or []
+    try:
+        # Served from the local archive when it holds the whole answer
+        try:
+            processed = archive_sensor_rows(since, limit)
+        except Exception as e:
+            print("Archive read failed, using Supabase:", e)
+            processed = None
+        CACHE_REQUESTS.inc(cache="archive", result="miss" if processed is None else "hit")
+        if processed is not None:
+            return jsonify(processed)
+
+        data = get_database().recent_readings(
+            "node_id, ax, ay, az, gx, gy, gz, soil_raw, moisture, vibration, tilt, temperature, created_at",
+            limit=limit, since=since
+        )
+        rows = with_derived(data)
         processed = []
 
         for row in rows:
-            gx, gy, gz = row.get("gx", 0), row.get("gy", 0), row.get("gz", 0)
-
-            # ✅ Always positive magnitude
-            vibration = math.sqrt(gx**2 + gy**2 + gz**2)
-
-            # ✅ Tilt angle (from accelerometer)
-            ax, ay, az = row.get("ax", 0), row.get("ay", 0), row.get("az", 0)
-            try:
-                tilt = math.degrees(math.atan2(
-                    math.sqrt(ax**2 + ay**2), az
-                ))
-            except Exception:
-                tilt = 0
-
             processed.append({
-                "moisture": row.get("moisture", 0),
-                "vibration": round(vibration, 2),   # keep it clean
-                "tilt": round(tilt, 2),
+                "node_id": row.get("node_id"),
+                "moisture": row["moisture"],
+                "vibration": row["vibration"],   # deg/s
+                "tilt": row["tilt"],             # degrees
                 "temperature": row.get("temperature", 0),
                 "timestamp": row.get("created_at"),
             })
@@ -67,111 +238,228 @@ def get_sensor_data():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def archive_sensor_rows(since, limit):
+    """/sensor-data rows from the archive, or None if it cannot answer fully"""
+    archive = get_archive()
+    if archive is None or not archive.authoritative:
+        return None   # Readings written to Supabase directly are only there
 
-# ------------------ WHATSAPP WEBHOOK ------------------
-@app.route("/whatsapp", methods=["POST"])
-def whatsapp_webhook():
-    incoming_raw = request.values.get("Body", "") or ""
-    incoming_msg = incoming_raw.strip().lower()
-    from_number = (request.values.get("From") or "").strip()
+    # With several workers, readings newer than this may still sit in another
+    # worker's buffer; answers reaching past it come from Supabase
+    settled = archive.settled_before()
+    if since:
+        if not archive.covers(since):
+            return None
+        if settled is not None and to_timestamp(since) >= settled:
+            return None
+        df = archive.since(since, limit, end=settled)
+        if settled is not None and len(df) < limit:
+            return None   # The answer runs into the unsettled tail
+    else:
+        if settled is not None:
+            return None   # The newest rows are the unsettled tail
+        df = archive.latest(limit)
+        if len(df) < limit:
+            return None   # Older rows may only be in Supabase
 
-    if not from_number:
-        return jsonify({"status": "error", "message": "No sender number"}), 400
+    return [
+        {
+            "node_id": int(row.node_id),
+            "moisture": row.moisture,
+            "vibration": row.vibration,
+            "tilt": row.tilt,
+            "temperature": 0 if pd.isna(row.temperature) else row.temperature,
+            "timestamp": row.created_at.isoformat(),
+        }
+        for row in df.itertuples(index=False)
+        if not pd.isna(row.node_id)   # Rows without a usable node_id are never archived
+    ]
 
-    normalized_phone = from_number.lower()
 
-    # Check if user exists
-    user_resp = supabase.table("user_prefs").select("*").eq("phone", normalized_phone).execute()
-    user = user_resp.data[0] if user_resp.data else None
+# ------------------ INGEST ------------------
+@api.route("/sensor-data", methods=["POST"])
+def ingest_sensor_data():
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({"status": "error", "message": "Expected a JSON packet or list of packets"}), 400
 
-    # New user
-    if not user:
-        supabase.table("user_prefs").insert({"phone": normalized_phone, "language": None, "subscribed": True}).execute()
-        try:
-            twilio_client.messages.create(
-                from_=FROM_WHATSAPP,
-                to=from_number,
-                body="Welcome! 🙏\nPlease enter your preferred language (English / Hindi / Marathi)."
-            )
-        except Exception as e:
-            print("Twilio send error (new user):", e)
-            return jsonify({"status": "error", "message": str(e)}), 500
-        return jsonify({"status": "asked for language"})
-
-    # Language selection
-    if incoming_msg in ("english", "en", "hindi", "hi", "marathi", "mr"):
-        if incoming_msg in ("english", "en"):
-            new_lang = "english"
-        elif incoming_msg in ("hindi", "hi"):
-            new_lang = "hindi"
-        else:
-            new_lang = "marathi"
+    packets = payload if isinstance(payload, list) else [payload]
+    if not all(isinstance(p, dict) for p in packets):
+        return jsonify({"status": "error", "message": "Packets must be JSON objects"}), 400
+    # Every store (Supabase, spool, archive, summaries) keys readings by an integer node_id
+    for i, packet in enumerate(packets):
+        node_id = parse_node_id(packet.get("node_id"))
+        if node_id is None:
+            return jsonify({"status": "error", "message": f"Packet {i}: node_id must be an integer"}), 400
+        packet["node_id"] = node_id
 
-        supabase.table("user_prefs").update({"language": new_lang}).eq("phone", normalized_phone).execute()
+    # Stamp arrival time so spooled readings keep it when replayed later
+    received = time.time()
+    received_at = datetime.fromtimestamp(received, timezone.utc).isoformat()
+    traces = []
+    for packet in packets:
+        packet.setdefault("created_at", received_at)
+        origin = parse_timestamp(packet["created_at"]) or received
+        traces.append(Trace(f"{packet.get('node_id')}:{packet.get('packet_no')}", origin).mark("received", received))
+
+    try:
+        calibrated = calibrate_rows(packets)
+
+        # Store the raw packet with its derived values, so readers never recompute them;
+        # keys that are not sensor_readings columns are dropped
+        records = []
+        for packet, row in zip(packets, calibrated):
+            record = reading_record(packet)
+            for field in DERIVED_FIELDS:
+                record[field] = row[field]
+            records.append(record)
 
         try:
-            lang_msg = translations["language_set"].get(new_lang, translations["language_set"]["english"])
-            twilio_client.messages.create(
-                from_=FROM_WHATSAPP,
-                to=from_number,
-                body=lang_msg
-            )
+            get_database().insert_readings(records)
+            spooled = False
         except Exception as e:
-            print("Twilio send error (language set):", e)
-            return jsonify({"status": "error", "message": str(e)}), 500
+            # Database unreachable or down behind PostgREST: keep the readings
+            # locally and replay them later. Query errors are not retried.
+            if not isinstance(e, DatabaseError) and not is_unavailable(e):
+                raise
+            print("Supabase insert failed, spooling readings:", e)
+            get_spool().append(records)
+            spooled = True
+        # Only count packets that were actually kept, in stored or spooled form
+        for packet in packets:
+            link_tracker.record(packet)
+        READINGS_INGESTED.inc(len(records), outcome="spooled" if spooled else "stored")
+        stored = time.time()
+        for trace in traces:
+            tracer.finish(trace.mark("spooled" if spooled else "stored", stored), "ingest",
+                          outcome="spooled" if spooled else "ok")
 
-        return jsonify({"status": "language set", "language": new_lang})
+        summary_store.update_many(calibrated)
 
-    # Sensor values request
-    if "sensor values" in incoming_msg:
-        latest = supabase.table("sensor_readings").select(
-            "node_id, packet_no, moisture, gx, latitude, longitude, created_at"
-        ).order("created_at", {"ascending": False}).limit(1).execute()
+        archive = get_archive()
+        if archive is not None:
+            archive.append(calibrated)
+        return jsonify({"status": "ok", "ingested": len(records), "spooled": spooled})
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        lang = user["language"] or "english"
-        if latest.data:
-            msg_body = format_sensor_values(latest.data[0], lang=lang)
-        else:
-            msg_body = translations["no_data"].get(lang, translations["no_data"]["english"])
 
-        try:
-            twilio_client.messages.create(
-                from_=FROM_WHATSAPP,
-                to=from_number,
-                body=msg_body
-            )
-        except Exception as e:
-            print("Twilio send error (sensor values):", e)
-            return jsonify({"status": "error", "message": str(e)}), 500
 
-        return jsonify({"status": "sensor values sent", "language": lang})
+# ------------------ NODES ------------------
+@api.route("/nodes", methods=["GET"])
+def get_nodes():
+    """Node metadata: last reported position of every node"""
+    try:
+        nodes = [
+            {
+                "node_id": row["node_id"],
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+                "last_seen": row.get("last_seen"),
+            }
+            for row in get_database().nodes()
+            if row.get("latitude") is not None and row.get("longitude") is not None
+        ]
+        return jsonify(nodes)
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# ------------------ NODE HEALTH ------------------
+@api.route("/nodes/health", methods=["GET"])
+def get_nodes_health():
+    return jsonify(link_tracker.snapshot())
 
-    # Change language request
-    if "change language" in incoming_msg or incoming_msg == "language":
+
+# ------------------ SUMMARY ------------------
+def warm_summary_store(limit=1000):
+    """Seed the summary from recent rows (after a restart, or for readings
+    written to Supabase without going through the ingest endpoint)"""
+    rows = get_database().recent_readings(
+        "node_id, packet_no, ax, ay, az, gx, gy, gz, soil_raw, moisture, vibration, tilt, temperature, created_at",
+        limit=limit
+    )
+    summary_store.update_many(with_derived(rows))
+
+
+@api.route("/summary", methods=["GET"])
+def get_summary():
+    """Per-node latest values, deltas, risk and freshness, precomputed on ingest"""
+    summary = summary_store.snapshot()
+    CACHE_REQUESTS.inc(cache="summary", result="hit" if summary else "miss")
+    if not summary:
         try:
-            twilio_client.messages.create(
-                from_=FROM_WHATSAPP,
-                to=from_number,
-                body="Please enter your preferred language (English / Hindi / Marathi)."
-            )
+            warm_summary_store()
         except Exception as e:
-            print("Twilio send error (change language):", e)
             return jsonify({"status": "error", "message": str(e)}), 500
-        return jsonify({"status": "asked to change language"})
+        summary = summary_store.snapshot()
+    return jsonify(summary)
+
+
+# ------------------ HISTORY ------------------
+@api.route("/history", methods=["GET"])
+def get_history():
+    """Bucketed min/max/mean/count/last per node from the local archive:
+    ?start=&end=&bucket=<seconds>|points=<max buckets>&node_id=1,2
 
-    # Fallback
+    Answered from the coarsest rollup (1m/15m/1h) that divides the bucket.
+    """
+    archive = get_archive()
+    if archive is None:
+        return jsonify({"status": "error", "message": "Archive disabled"}), 503
+
+    start, end = request.args.get("start"), request.args.get("end")
+    if not start or not end:
+        return jsonify({"status": "error", "message": "start and end are required"}), 400
     try:
-        twilio_client.messages.create(
-            from_=FROM_WHATSAPP,
-            to=from_number,
-            body="I didn't understand that. Send 'sensor values' or type English / Hindi / Marathi to set your language."
-        )
+        node_ids = [int(n) for n in request.args.get("node_id", "").split(",") if n.strip()]
+        if "bucket" in request.args:
+            bucket = max(int(request.args["bucket"]), 1)
+        else:
+            span = (pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()
+            bucket = bucket_for_points(span, int(request.args.get("points", 500)))
+    except ValueError:
+        return jsonify({"status": "error", "message": "bucket, points and node_id must be integers"}), 400
+
+    try:
+        df, resolution = archive.aggregate(start, end, bucket, node_ids or None)
+        if not df.empty:
+            df["bucket"] = df["bucket"].map(lambda ts: ts.isoformat())
+        return jsonify({
+            "complete": archive.covers(start, resolution),
+            "bucket_seconds": bucket,
+            "resolution": resolution,
+            "rows": df.astype(object).where(df.notna(), None).to_dict(orient="records"),
+        })
     except Exception as e:
-        print("Twilio send error (fallback):", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
-    return jsonify({"status": "default reply"})
+
+# ------------------ EXPORT ------------------
+@api.route("/export", methods=["GET"])
+def export_readings():
+    """Stream readings as csv/ndjson/parquet: ?format=&node_id=1,2&start=&end="""
+    fmt = request.args.get("format", "csv").lower()
+    try:
+        node_ids = [int(n) for n in request.args.get("node_id", "").split(",") if n.strip()]
+        chunks = export_stream(
+            get_database(), fmt, node_ids or None,
+            request.args.get("start"), request.args.get("end")
+        )
+    except (ValueError, RuntimeError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    filename = f"terrashield_readings.{fmt}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
 
 # ------------------ MAIN ------------------
 if __name__ == "__main__":
-    app.run(debug=True)
+    from serve import main
+    main()
@@ -0,0 +1,583 @@
+# archive.py
+"""
+Local columnar archive of sensor readings.
+
+Ingested readings (calibrated, export columns) are buffered in memory and
+flushed every ARCHIVE_FLUSH_SECONDS, or after ARCHIVE_FLUSH_ROWS rows, as
+Parquet files partitioned by day and node:
+
+    ARCHIVE_DIR/date=2025-07-14/node=1/part-<pid>-<ns>.parquet
+
+Queries go through pyarrow datasets. Partition pruning (date, node) and
+row-group statistics (created_at) mean a range scan only reads the files and
+row groups it needs. Each hour, past days are compacted to one file per
+partition; today's partitions are compacted in place as soon as they pass
+ARCHIVE_COMPACT_FILES part files, so a busy day never piles up thousands of
+small files. latest() reads part files newest first, by their created_at
+statistics, and stops once no unread file can hold a newer reading. Rows
+still waiting in the buffer are included in query results. Readings without
+an integer node_id are left out and counted in archive_rows_skipped_total.
+
+Every stored batch also updates the 1m/15m/1h rollups (see rollups.py) kept
+under ARCHIVE_DIR/rollups/<resolution>/, with the same partitioning.
+Aggregate queries read the coarsest rollup whose resolution divides the
+requested bucket. Partitions older than their retention period are deleted
+hourly (RAW_RETENTION_DAYS, ROLLUP_*_RETENTION_DAYS).
+
+The archive is complete from its watermark (the first reading it stored, or
+the start of a backfill) onwards, but only for readings that went through
+ingest. Readings written to Supabase directly never reach it, so callers
+treat it as the whole history only with ARCHIVE_AUTHORITATIVE=1, set when
+ingest is the sole write path. Callers fall back to Supabase for anything
+older than the watermark. When several processes append to one ARCHIVE_DIR (shared = True, set
+for serve.py's pre-forked workers), each holds its own unflushed buffer, so
+only readings before settled_before() are known to be on disk; callers go to
+Supabase for the newer tail:
+
+    python archive.py backfill --start 2025-06-01
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from export import EXPORT_COLUMNS, iter_pages
+from calibration import parse_node_id
+from metrics import counter
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from export import parquet_schema, parquet_table
+    from rollups import (
+        SENSOR_FIELDS, RESOLUTIONS, RAW_RETENTION_DAYS, ROLLUP_RETENTION_DAYS,
+        rollup_schema, partial_rollup, merge_partials, finalize, candidate_resolutions,
+    )
+except ImportError:   # The archive is optional; without pyarrow everything reads Supabase
+    pa = None
+
+ARCHIVE_DIR = os.getenv(
+    "ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "1").lower() not in ("0", "false", "no")
+FLUSH_ROWS = int(os.getenv("ARCHIVE_FLUSH_ROWS", "500"))
+FLUSH_SECONDS = float(os.getenv("ARCHIVE_FLUSH_SECONDS", "10"))
+COMPACT_SECONDS = 3600
+COMPACT_FILES = int(os.getenv("ARCHIVE_COMPACT_FILES", "32"))   # part files before today's partition is merged
+# Every reading reaches Supabase through POST /sensor-data, so the archive holds them all
+AUTHORITATIVE = os.getenv("ARCHIVE_AUTHORITATIVE", "0").lower() in ("1", "true", "yes")
+
+RAW = "raw"
+
+SKIPPED = counter("archive_rows_skipped_total", "Readings left out of the archive", ("reason",))
+
+
+def to_timestamp(value):
+    """UTC pandas Timestamp from an ISO string, datetime or Timestamp"""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+class SensorArchive:
+    def __init__(self, root=ARCHIVE_DIR, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS,
+                 compact_files=COMPACT_FILES, authoritative=AUTHORITATIVE):
+        self.root = root
+        self.authoritative = authoritative
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.compact_files = compact_files
+        self.schema = parquet_schema()
+        partition_schema = pa.schema([("date", pa.string()), ("node", pa.int64())])
+        self.partitioning = ds.partitioning(partition_schema, flavor="hive")
+        self.dataset_schema = pa.schema(list(self.schema) + list(partition_schema))
+        self.rollup_schema = rollup_schema(SENSOR_FIELDS)
+        self.rollup_dataset_schema = pa.schema(list(self.rollup_schema) + list(partition_schema))
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+        self._last_compact = 0.0
+        self.maintenance = True   # compact and prune (one process per ARCHIVE_DIR)
+        self.shared = False       # other processes append to ARCHIVE_DIR too
+        os.makedirs(root, exist_ok=True)
+        self._meta_path = os.path.join(root, "_meta.json")
+        self.meta = self._load_meta()
+
+    # ---------- metadata ----------
+    def _load_meta(self):
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"complete_since": None}
+
+    def _save_meta(self):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._meta_path)
+
+    @property
+    def complete_since(self):
+        value = self.meta.get("complete_since")
+        return to_timestamp(value) if value else None
+
+    def _base(self, resolution=RAW):
+        return self.root if resolution == RAW else os.path.join(self.root, "rollups", resolution)
+
+    def _retention_days(self, resolution=RAW):
+        return RAW_RETENTION_DAYS if resolution == RAW else ROLLUP_RETENTION_DAYS[resolution]
+
+    def _retention_cutoff(self, resolution=RAW):
+        """Oldest date kept at this resolution (None when kept forever)"""
+        days = self._retention_days(resolution)
+        if not days:
+            return None
+        return (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d")
+
+    def available_since(self, resolution=RAW):
+        """Start of the complete history held at this resolution"""
+        since = self.complete_since
+        cutoff = self._retention_cutoff(resolution)
+        if since is None or cutoff is None:
+            return since
+        return max(since, to_timestamp(cutoff))
+
+    def covers(self, start, resolution=RAW):
+        """True when every reading at or after start is in the archive
+
+        Never true unless the archive is authoritative: readings written to
+        Supabase directly are not in it.
+        """
+        since = self.available_since(resolution)
+        return self.authoritative and since is not None and start is not None and to_timestamp(start) >= since
+
+    def settled_before(self):
+        """Readings older than this have been flushed by every writer, or None
+        when this process is the only one (its own buffer is always read)
+
+        A buffer is flushed within flush_seconds; twice that leaves room for a
+        slow flush.
+        """
+        if not self.shared:
+            return None
+        return pd.Timestamp.now(tz="UTC") - pd.Timedelta(seconds=2 * self.flush_seconds)
+
+    # ---------- writing ----------
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, name="archive-flush", daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+                if self.maintenance:
+                    self.compact_current()
+                if self.maintenance and time.time() - self._last_compact >= COMPACT_SECONDS:
+                    self.prune()
+                    self.compact()
+                    self._last_compact = time.time()
+            except Exception as e:
+                print("Archive flush error:", e)
+
+    def append(self, rows):
+        """Queue calibrated readings for the archive"""
+        now = datetime.now(timezone.utc).isoformat()
+        records = []
+        for row in rows:
+            node_id = parse_node_id(row.get("node_id"))
+            if node_id is None:
+                SKIPPED.inc(reason="node_id")
+                continue
+            records.append(
+                {column: row.get(column) for column in EXPORT_COLUMNS}
+                | {"node_id": node_id, "created_at": row.get("created_at") or now}
+            )
+        if not records:
+            return
+
+        with self._lock:
+            self._pending.extend(records)
+            pending = len(self._pending)
+            if self.meta.get("complete_since") is None:
+                self.meta["complete_since"] = min(to_timestamp(r["created_at"]) for r in records).isoformat()
+                self._save_meta()
+
+        self._ensure_thread()
+        if pending >= self.flush_rows:
+            self.flush()
+
+    def _write_partitions(self, table, base, time_column="created_at"):
+        """Write a table as one new file per (date, node) partition under base"""
+        dates = pc.strftime(table[time_column], format="%Y-%m-%d")
+        table = table.append_column("date", dates)
+        for date in pc.unique(dates).to_pylist():
+            day = table.filter(pc.equal(table["date"], date))
+            for node in pc.unique(day["node_id"]).to_pylist():
+                if node is None:
+                    # Backfilled rows with no node_id have no partition to go to
+                    SKIPPED.inc(pc.sum(pc.is_null(day["node_id"])).as_py(), reason="node_id")
+                    continue
+                part = day.filter(pc.equal(day["node_id"], node)).drop_columns(["date"])
+                part = part.sort_by(time_column)
+                directory = os.path.join(base, f"date={date}", f"node={node}")
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"part-{os.getpid()}-{time.time_ns()}.parquet")
+                pq.write_table(part, path + ".tmp", compression="zstd")
+                os.replace(path + ".tmp", path)
+
+    def _store(self, table):
+        """Write a batch of readings and its rollup partials"""
+        self._write_partitions(table, self.root)
+        readings = table.select(["node_id", "created_at", *SENSOR_FIELDS])
+        for resolution, seconds in RESOLUTIONS.items():
+            self._write_partitions(partial_rollup(readings, seconds), self._base(resolution), "bucket")
+
+    def flush(self):
+        """Write buffered readings to their partitions"""
+        with self._lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return
+        try:
+            self._store(parquet_table(records, self.schema))
+        except Exception:
+            with self._lock:
+                self._pending = records + self._pending
+            raise
+
+    def compact(self, before=None):
+        """Merge the part files of each partition older than `before` (default: today)
+
+        Rollup partitions are compacted too, combining the partial rows of
+        each bucket into one.
+        """
+        before = before or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        for resolution in (RAW, *RESOLUTIONS):
+            for directory in glob.glob(os.path.join(self._base(resolution), "date=*", "node=*")):
+                date = os.path.basename(os.path.dirname(directory))[len("date="):]
+                if date < before:
+                    self._compact(directory, resolution, min_parts=2)
+
+    def compact_current(self):
+        """Merge today's partitions in place once they reach compact_files part files"""
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        for resolution in (RAW, *RESOLUTIONS):
+            for directory in glob.glob(os.path.join(self._base(resolution), f"date={today}", "node=*")):
+                self._compact(directory, resolution, min_parts=max(self.compact_files, 2))
+
+    def _compact(self, directory, resolution, min_parts):
+        """Replace a partition's part files with one merged file (parts written meanwhile are kept)"""
+        schema = self.schema if resolution == RAW else self.rollup_schema
+        parts = sorted(glob.glob(os.path.join(directory, "part-*.parquet")))
+        if len(parts) < min_parts:
+            return
+        table = pa.concat_tables([pq.read_table(p, schema=schema) for p in parts])
+        if resolution == RAW:
+            table = table.sort_by("created_at")
+        else:
+            table = merge_partials(table, RESOLUTIONS[resolution]).sort_by("bucket")
+        path = os.path.join(directory, f"part-{os.getpid()}-{time.time_ns()}.parquet")
+        pq.write_table(table, path + ".tmp", compression="zstd", row_group_size=65536)
+        os.replace(path + ".tmp", path)
+        for p in parts:
+            os.remove(p)
+
+    def prune(self):
+        """Delete day partitions older than each resolution's retention period"""
+        for resolution in (RAW, *RESOLUTIONS):
+            cutoff = self._retention_cutoff(resolution)
+            if cutoff is None:
+                continue
+            for directory in glob.glob(os.path.join(self._base(resolution), "date=*")):
+                if os.path.basename(directory)[len("date="):] < cutoff:
+                    shutil.rmtree(directory, ignore_errors=True)
+
+    # ---------- reading ----------
+    def _dataset(self, dates=None, resolution=RAW):
+        base = self._base(resolution)
+        if dates is None:
+            files = glob.glob(os.path.join(base, "date=*", "node=*", "*.parquet"))
+        else:
+            files = [
+                f for date in dates
+                for f in glob.glob(os.path.join(base, f"date={date}", "node=*", "*.parquet"))
+            ]
+        if not files:
+            return None
+        return ds.dataset(
+            files, format="parquet", partitioning=self.partitioning, partition_base_dir=base,
+            schema=self.dataset_schema if resolution == RAW else self.rollup_dataset_schema,
+        )
+
+    def _to_table(self, dataset_factory, columns, expression):
+        """Scan a dataset, retrying once if compaction replaced its files mid-scan"""
+        for attempt in range(2):
+            dataset = dataset_factory()
+            if dataset is None:
+                return None
+            try:
+                return dataset.to_table(columns=columns, filter=expression)
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    def _pending_table(self):
+        with self._lock:
+            records = list(self._pending)
+        return parquet_table(records, self.schema) if records else None
+
+    def _dates(self):
+        return sorted(
+            os.path.basename(d)[len("date="):]
+            for d in glob.glob(os.path.join(self.root, "date=*"))
+        )
+
+    def scan(self, start=None, end=None, node_ids=None, columns=None, dates=None, include_pending=True):
+        """Readings in [start, end) for the given nodes as an Arrow table (unsorted)
+
+        dates limits the scan to those day partitions; include_pending adds
+        readings that have not been flushed yet.
+        """
+        start = to_timestamp(start) if start is not None else None
+        end = to_timestamp(end) if end is not None else None
+
+        expression = None
+        def both(a, b):
+            return b if a is None else a & b
+
+        if start is not None:
+            expression = both(expression, ds.field("created_at") >= pa.scalar(start, pa.timestamp("us", tz="UTC")))
+            expression = both(expression, ds.field("date") >= start.strftime("%Y-%m-%d"))
+        if end is not None:
+            expression = both(expression, ds.field("created_at") < pa.scalar(end, pa.timestamp("us", tz="UTC")))
+            expression = both(expression, ds.field("date") <= end.strftime("%Y-%m-%d"))
+        if node_ids:
+            expression = both(expression, ds.field("node").isin([int(n) for n in node_ids]))
+
+        table = self._to_table(lambda: self._dataset(dates), columns or list(EXPORT_COLUMNS), expression)
+        tables = [table] if table is not None else []
+
+        pending = self._pending_table() if include_pending else None
+        if pending is not None:
+            pending_expression = None
+            if start is not None:
+                pending_expression = both(pending_expression, pc.field("created_at") >= pa.scalar(start, pa.timestamp("us", tz="UTC")))
+            if end is not None:
+                pending_expression = both(pending_expression, pc.field("created_at") < pa.scalar(end, pa.timestamp("us", tz="UTC")))
+            if node_ids:
+                pending_expression = both(pending_expression, pc.field("node_id").isin([int(n) for n in node_ids]))
+            if pending_expression is not None:
+                pending = pending.filter(pending_expression)
+            tables.append(pending.select(columns or list(EXPORT_COLUMNS)))
+
+        if not tables:
+            return None
+        return pa.concat_tables(tables)
+
+    def since(self, start, limit, node_ids=None, end=None):
+        """Up to `limit` readings at or after start (and before end), oldest first (DataFrame)"""
+        table = self.scan(start=start, end=end, node_ids=node_ids)
+        if table is None:
+            return pd.DataFrame(columns=list(EXPORT_COLUMNS))
+        return table.sort_by("created_at").slice(0, limit).to_pandas()
+
+    def _newest_reading(self, path):
+        """Newest created_at in a part file from its row-group statistics (None if unknown)"""
+        metadata = pq.read_metadata(path)
+        column = metadata.schema.to_arrow_schema().get_field_index("created_at")
+        newest = None
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(column).statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            newest = stats.max if newest is None else max(newest, stats.max)
+        return to_timestamp(newest) if newest is not None else None
+
+    def _day_files(self, date, node_ids=None):
+        """Part files of one raw day, newest readings first, with their newest created_at"""
+        nodes = [int(n) for n in node_ids] if node_ids else ["*"]
+        files = [
+            f for node in nodes
+            for f in glob.glob(os.path.join(self.root, f"date={date}", f"node={node}", "*.parquet"))
+        ]
+        newest = {f: self._newest_reading(f) for f in files}
+        # Files without statistics sort first, so they are always read
+        files.sort(key=lambda f: float("inf") if newest[f] is None else newest[f].value, reverse=True)
+        return files, newest
+
+    def latest(self, limit, node_ids=None):
+        """The newest `limit` readings, newest first
+
+        Part files are read newest first by their created_at statistics, and
+        reading stops once `limit` rows are held and no unread file can hold
+        a newer one, so a request touches a handful of files, not whole days.
+        """
+        for attempt in range(2):
+            try:
+                return self._latest(limit, node_ids)
+            except FileNotFoundError:
+                if attempt:   # Compaction replaced the files twice in a row
+                    raise
+
+    def _latest(self, limit, node_ids):
+        columns = list(EXPORT_COLUMNS)
+        tables = []
+        pending = self.scan(node_ids=node_ids, dates=[])   # unflushed readings only
+        if pending is not None and pending.num_rows:
+            tables.append(pending)
+
+        def cutoff():
+            """created_at of the limit-th newest row held, or None with fewer rows"""
+            if sum(t.num_rows for t in tables) < limit:
+                return None
+            held = pa.concat_tables(tables).select(["created_at"])
+            top = held.take(pc.select_k_unstable(held, limit, [("created_at", "descending")]))
+            return to_timestamp(pc.min(top["created_at"]).as_py())
+
+        for date in reversed(self._dates()):
+            floor = cutoff()
+            if floor is not None and floor >= to_timestamp(date) + pd.Timedelta(days=1):
+                break   # Everything held is newer than this whole day
+            files, newest = self._day_files(date, node_ids)
+            for path in files:
+                floor = cutoff()
+                if floor is not None and newest[path] is not None and newest[path] < floor:
+                    break   # Files are newest first, so no later file can qualify
+                tables.append(pq.read_table(path, schema=self.schema).select(columns))
+
+        if not tables:
+            return pd.DataFrame(columns=columns)
+        table = pa.concat_tables(tables).sort_by([("created_at", "descending")]).slice(0, limit)
+        return table.to_pandas()
+
+    def scan_rollup(self, resolution, start=None, end=None, node_ids=None):
+        """Rollup partial rows for buckets in [start, end), including unflushed readings"""
+        seconds = RESOLUTIONS[resolution]
+        start = to_timestamp(start).floor(f"{seconds}s") if start is not None else None
+        end = to_timestamp(end) if end is not None else None
+
+        expression = None
+        def both(a, b):
+            return b if a is None else a & b
+
+        if start is not None:
+            expression = both(expression, ds.field("bucket") >= pa.scalar(start, pa.timestamp("us", tz="UTC")))
+            expression = both(expression, ds.field("date") >= start.strftime("%Y-%m-%d"))
+        if end is not None:
+            expression = both(expression, ds.field("bucket") < pa.scalar(end, pa.timestamp("us", tz="UTC")))
+            expression = both(expression, ds.field("date") <= end.strftime("%Y-%m-%d"))
+        if node_ids:
+            expression = both(expression, ds.field("node").isin([int(n) for n in node_ids]))
+
+        table = self._to_table(
+            lambda: self._dataset(resolution=resolution), list(self.rollup_schema.names), expression
+        )
+        tables = [table] if table is not None else []
+
+        pending = self.scan(start=start, end=end, node_ids=node_ids, dates=[],
+                            columns=["node_id", "created_at", *SENSOR_FIELDS])
+        if pending is not None and pending.num_rows:
+            tables.append(partial_rollup(pending, seconds))
+
+        return pa.concat_tables(tables) if tables else None
+
+    def resolution_for(self, bucket_seconds):
+        """Coarsest stored resolution able to answer buckets of this size"""
+        candidates = candidate_resolutions(bucket_seconds)
+        return candidates[0] if candidates else RAW
+
+    def aggregate(self, start, end, bucket_seconds, node_ids=None):
+        """Per node and time bucket: min/max/mean/count/last of each field
+
+        Returns (DataFrame, resolution). With a rollup resolution, the first
+        and last buckets snap to that resolution's bucket edges.
+        """
+        resolution = self.resolution_for(bucket_seconds)
+        if resolution == RAW:
+            table = self.scan(start=start, end=end, node_ids=node_ids,
+                              columns=["node_id", "created_at", *SENSOR_FIELDS])
+            partials = partial_rollup(table, bucket_seconds) if table is not None and table.num_rows else None
+        else:
+            table = self.scan_rollup(resolution, start, end, node_ids)
+            partials = merge_partials(table, bucket_seconds) if table is not None and table.num_rows else None
+
+        if partials is None:
+            return pd.DataFrame(), resolution
+        return finalize(partials).to_pandas(), resolution
+
+    # ---------- backfill ----------
+    def backfill(self, db, start, end=None):
+        """Copy [start, end) from Supabase (end defaults to the watermark)"""
+        start = to_timestamp(start)
+        end = to_timestamp(end) if end else self.complete_since or to_timestamp(datetime.now(timezone.utc))
+        self.flush()
+
+        copied = 0
+        for page in iter_pages(db, start=start.isoformat(), end=end.isoformat()):
+            self._store(parquet_table(page, self.schema))
+            copied += len(page)
+
+        with self._lock:
+            since = self.complete_since
+            if since is None or (end >= since and start < since):
+                self.meta["complete_since"] = start.isoformat()
+                self._save_meta()
+        return copied
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Process-wide archive, or None when disabled or pyarrow is missing"""
+    global _archive
+    if pa is None or not ARCHIVE_ENABLED:
+        return None
+    with _archive_lock:
+        if _archive is None:
+            _archive = SensorArchive()
+        return _archive
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TerraShield sensor archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="copy history from Supabase")
+    backfill.add_argument("--start", required=True, help="inclusive start (ISO date or timestamp)")
+    backfill.add_argument("--end", help="exclusive end (default: archive watermark)")
+    commands.add_parser("compact", help="merge part files of past days and busy partitions of today")
+    commands.add_parser("prune", help="delete partitions past their retention period")
+    args = parser.parse_args(argv)
+
+    archive = get_archive()
+    if archive is None:
+        sys.exit("Archive disabled (set ARCHIVE_ENABLED=1 and install pyarrow)")
+
+    if args.command == "backfill":
+        from data_access import get_database
+
+        print(f"Copied {archive.backfill(get_database(), args.start, args.end)} readings")
+    elif args.command == "prune":
+        archive.prune()
+    else:
+        archive.compact()
+        archive.compact_current()
+
+
+if __name__ == "__main__":
+    main()
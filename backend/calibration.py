@@ -0,0 +1,230 @@
+# calibration.py
+"""
+Per-node sensor calibration and unit conversion.
+
+Raw packets carry int16 IMU counts (ax..gz) and a 12-bit soil ADC value.
+Everything downstream (API, monitor, dashboard) should work with physical
+units, so the conversion happens here, once, on whole batches at a time.
+POST /sensor-data stores moisture, vibration and tilt with each reading.
+Readers take the stored values through with_derived(), which only
+calibrates rows stored before those columns were filled in.
+
+Calibration table (optional JSON file, path from CALIBRATION_FILE):
+
+    {
+      "default": {"accel_scale": 16384, "gyro_scale": 131},
+      "nodes": {
+        "1": {
+          "accel_offset": [120, -35, 210],
+          "gyro_offset": [-130, 750, -60],
+          "orientation": [[1, 0, 0], [0, -1, 0], [0, 0, -1]],
+          "soil_curve": [[4095, 0], [2600, 45], [1400, 100]]
+        }
+      }
+    }
+
+Node entries override the default entry key by key.
+"""
+
+import os
+import json
+import math
+import threading
+import numpy as np
+
+# MPU6050 at power-on ranges: +-2g and +-250 deg/s
+DEFAULT_CALIBRATION = {
+    "accel_offset": [0.0, 0.0, 0.0],   # counts
+    "accel_scale": 16384.0,            # counts per g (scalar or per axis)
+    "gyro_offset": [0.0, 0.0, 0.0],    # counts
+    "gyro_scale": 131.0,               # counts per deg/s (scalar or per axis)
+    "orientation": [[1, 0, 0], [0, 1, 0], [0, 0, 1]],  # sensor frame -> slope frame
+    "soil_curve": [[4095, 0.0], [1200, 100.0]],  # (soil_raw, moisture %) points
+}
+
+CALIBRATION_FILE = os.getenv(
+    "CALIBRATION_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration.json")
+)
+
+ACCEL_FIELDS = ("ax", "ay", "az")
+GYRO_FIELDS = ("gx", "gy", "gz")
+
+
+class NodeCalibration:
+    """Compiled calibration for one node, ready for array math"""
+
+    def __init__(self, params):
+        self.accel_offset = np.asarray(params["accel_offset"], dtype=float)
+        self.accel_scale = np.broadcast_to(np.asarray(params["accel_scale"], dtype=float), (3,))
+        self.gyro_offset = np.asarray(params["gyro_offset"], dtype=float)
+        self.gyro_scale = np.broadcast_to(np.asarray(params["gyro_scale"], dtype=float), (3,))
+
+        orientation = np.asarray(params["orientation"], dtype=float)
+        if orientation.shape != (3, 3):
+            raise ValueError("orientation must be a 3x3 matrix")
+        # Rows are (N, 3) so the transform is applied as v @ R.T
+        self.orientation_t = orientation.T
+
+        curve = sorted((float(raw), float(pct)) for raw, pct in params["soil_curve"])
+        if len(curve) < 2:
+            raise ValueError("soil_curve needs at least two points")
+        self.soil_raw_points = np.array([raw for raw, _ in curve])
+        self.soil_pct_points = np.array([pct for _, pct in curve])
+
+    def accel_g(self, raw):
+        """Convert (N, 3) raw accelerometer counts to g in the slope frame"""
+        return ((raw - self.accel_offset) / self.accel_scale) @ self.orientation_t
+
+    def gyro_dps(self, raw):
+        """Convert (N, 3) raw gyroscope counts to deg/s in the slope frame"""
+        return ((raw - self.gyro_offset) / self.gyro_scale) @ self.orientation_t
+
+    def moisture_pct(self, soil_raw):
+        """Map raw soil ADC values to moisture percent (clamped to the curve ends)"""
+        return np.interp(soil_raw, self.soil_raw_points, self.soil_pct_points)
+
+
+class CalibrationTable:
+    """Cached per-node calibration table, reloaded when the file changes"""
+
+    def __init__(self, path=CALIBRATION_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._default = NodeCalibration(DEFAULT_CALIBRATION)
+        self._nodes = {}
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+
+        if mtime == self._mtime:
+            return
+
+        with self._lock:
+            if mtime == self._mtime:
+                return
+
+            default_params = dict(DEFAULT_CALIBRATION)
+            node_params = {}
+            if mtime is not None:
+                try:
+                    with open(self.path, "r") as f:
+                        config = json.load(f)
+                    default_params.update(config.get("default", {}))
+                    node_params = config.get("nodes", {})
+                except Exception as e:
+                    print(f"⚠️ Could not load calibration file {self.path}: {e}")
+
+            nodes = {}
+            for node_id, params in node_params.items():
+                try:
+                    nodes[str(node_id)] = NodeCalibration({**default_params, **params})
+                except Exception as e:
+                    print(f"⚠️ Invalid calibration for node {node_id}: {e}")
+
+            self._default = NodeCalibration(default_params)
+            self._nodes = nodes
+            self._mtime = mtime
+
+    def for_node(self, node_id):
+        """Get the calibration for a node, falling back to the default entry"""
+        self._reload_if_changed()
+        return self._nodes.get(str(node_id), self._default)
+
+
+_table = None
+
+
+def get_calibration_table():
+    """Process-wide calibration table"""
+    global _table
+    if _table is None:
+        _table = CalibrationTable()
+    return _table
+
+
+def _column(rows, field):
+    return np.array([row.get(field) or 0 for row in rows], dtype=float)
+
+
+def parse_node_id(value):
+    """Integer node id ("7", 7 and 7.0 are all 7), or None when missing or not an integer"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        return None
+
+
+def calibrate_rows(rows, table=None):
+    """
+    Calibrate a batch of raw sensor_readings rows.
+
+    Returns new dicts (same order) with the raw fields plus:
+      ax_g..az_g    acceleration in g
+      gx_dps..gz_dps angular rate in deg/s
+      vibration     angular rate magnitude in deg/s
+      tilt          angle from vertical in degrees
+      moisture      percent, from soil_raw when present
+    """
+    table = table or get_calibration_table()
+    rows = list(rows)
+    out = [dict(row) for row in rows]
+    if not rows:
+        return out
+
+    # Group row indices by node so each node's transform is one array op
+    by_node = {}
+    for i, row in enumerate(rows):
+        by_node.setdefault(row.get("node_id"), []).append(i)
+
+    for node_id, idx in by_node.items():
+        cal = table.for_node(node_id)
+        node_rows = [rows[i] for i in idx]
+
+        accel = cal.accel_g(np.column_stack([_column(node_rows, f) for f in ACCEL_FIELDS]))
+        gyro = cal.gyro_dps(np.column_stack([_column(node_rows, f) for f in GYRO_FIELDS]))
+
+        vibration = np.linalg.norm(gyro, axis=1)
+        tilt = np.degrees(np.arctan2(np.hypot(accel[:, 0], accel[:, 1]), accel[:, 2]))
+
+        soil_raw = np.array(
+            [math.nan if row.get("soil_raw") is None else row["soil_raw"] for row in node_rows],
+            dtype=float
+        )
+        fallback = _column(node_rows, "moisture")
+        moisture = np.where(np.isnan(soil_raw), fallback, cal.moisture_pct(np.nan_to_num(soil_raw)))
+
+        for j, i in enumerate(idx):
+            row = out[i]
+            for k, field in enumerate(ACCEL_FIELDS):
+                row[f"{field}_g"] = round(float(accel[j, k]), 4)
+            for k, field in enumerate(GYRO_FIELDS):
+                row[f"{field}_dps"] = round(float(gyro[j, k]), 3)
+            row["vibration"] = round(float(vibration[j]), 2)
+            row["tilt"] = round(float(tilt[j]), 2)
+            row["moisture"] = round(float(moisture[j]), 2)
+
+    return out
+
+
+def with_derived(rows, table=None):
+    """
+    Rows with moisture, vibration and tilt, as stored at ingest.
+
+    Only rows missing vibration or tilt (stored before ingest computed them)
+    are calibrated here. Returns new dicts in the same order.
+    """
+    out = [dict(row) for row in rows]
+    missing = [i for i, row in enumerate(out) if row.get("vibration") is None or row.get("tilt") is None]
+    if missing:
+        for i, row in zip(missing, calibrate_rows([out[i] for i in missing], table=table)):
+            out[i] = row
+    return out
@@ -0,0 +1,394 @@
+# data_access.py
+"""
+Shared Supabase data access for the backend, monitor and tools.
+
+One Supabase client per process, on a pooled keep-alive httpx transport.
+Every query goes through Database.run(), which adds:
+
+  - a per-call deadline (DB_DEADLINE, or deadline=) that caps the HTTP
+    timeouts of each attempt and the time spent retrying
+  - retries with exponential backoff and jitter, for idempotent reads only
+  - a circuit breaker: after DB_BREAKER_THRESHOLD consecutive connection
+    failures (including PostgREST answering 5xx or a PGRST0xx connection
+    error because the database behind it is down), calls fail fast with DatabaseUnavailable for DB_BREAKER_RESET
+    seconds, after which one trial call is let through
+  - per-query latency and error metrics (Database.metrics.snapshot(), and
+    the supabase_query_duration_seconds histogram on /metrics)
+
+The helpers below cover the sensor_readings and user_prefs queries the code
+actually performs. Other tables go through run() with a query builder:
+
+    db.run("lease_release", lambda t: t("monitor_leases").update(...).eq(...))
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from typing import Iterable, List, Optional, TypedDict
+
+import httpx
+from dotenv import load_dotenv
+from postgrest.exceptions import APIError
+from supabase import create_client, ClientOptions
+
+from metrics import histogram
+
+load_dotenv()
+
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "5"))             # per HTTP attempt
+DB_DEADLINE = float(os.getenv("DB_DEADLINE", "10"))          # per call, retries included
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_RETRIES = int(os.getenv("DB_RETRIES", "2"))
+DB_BACKOFF = float(os.getenv("DB_BACKOFF", "0.2"))           # seconds, doubled per retry
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", "5"))
+DB_BREAKER_RESET = float(os.getenv("DB_BREAKER_RESET", "30"))
+
+# Error codes meaning the database, not the query, failed: PostgREST's
+# connection errors and the Postgres connection/resource/shutdown classes
+UNAVAILABLE_CODES = ("PGRST0", "08", "53", "57")
+
+READING_COLUMNS = (
+    "node_id, packet_no, ax, ay, az, gx, gy, gz, soil_raw, moisture, vibration, tilt, "
+    "temperature, latitude, longitude, created_at"
+)
+# Columns a reading may be stored with; any other key would make the insert fail
+READING_FIELDS = tuple(c.strip() for c in READING_COLUMNS.split(",")) + ("rssi", "snr")
+
+
+class SensorReading(TypedDict, total=False):
+    id: int
+    node_id: int
+    packet_no: int
+    ax: int
+    ay: int
+    az: int
+    gx: int
+    gy: int
+    gz: int
+    soil_raw: int
+    moisture: float
+    vibration: float   # deg/s, computed at ingest
+    tilt: float        # degrees, computed at ingest
+    temperature: float
+    latitude: float
+    longitude: float
+    rssi: float
+    snr: float
+    created_at: str
+
+
+class UserPref(TypedDict, total=False):
+    phone: str
+    language: Optional[str]
+    subscribed: bool
+
+
+class DatabaseError(Exception):
+    """A query failed after its retries"""
+
+
+class DatabaseUnavailable(DatabaseError):
+    """The circuit breaker is open; the query was not attempted"""
+
+
+class DeadlineExceeded(DatabaseError):
+    """The call ran out of time before (another) attempt could start"""
+
+
+def is_unavailable(error):
+    """True if a PostgREST APIError reports the database down rather than a bad query
+
+    An error body that is not JSON (a proxy's 502 page) carries the HTTP
+    status as an int code; SQLSTATE and PGRST codes are strings.
+    """
+    if not isinstance(error, APIError):
+        return False
+    if isinstance(error.code, int):
+        return error.code >= 500
+    return str(error.code or "").startswith(UNAVAILABLE_CODES)
+
+
+def is_rejected(error):
+    """True for a query error the database will give again on retry (bad column, bad value)"""
+    return isinstance(error, APIError) and not is_unavailable(error)
+
+
+def reading_record(packet):
+    """The part of a packet that is stored in sensor_readings"""
+    return {field: packet[field] for field in READING_FIELDS if field in packet}
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> half-open after `reset_seconds`"""
+
+    def __init__(self, threshold=DB_BREAKER_THRESHOLD, reset_seconds=DB_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True   # Let a single trial call through
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+
+SUPABASE_SECONDS = histogram(
+    "supabase_query_duration_seconds", "Supabase call latency per attempt", ("query", "outcome")
+)
+
+
+class QueryMetrics:
+    """Per-query call counts, errors and latency (ms) over recent calls
+
+    With `histogram` (labels name, outcome), every call is also observed there.
+    """
+
+    def __init__(self, window=512, histogram=None):
+        self.window = window
+        self.histogram = histogram
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, name, elapsed_ms, ok):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "recent": deque(maxlen=self.window),
+            })
+            stats["calls"] += 1
+            stats["errors"] += 0 if ok else 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["recent"].append(elapsed_ms)
+        if self.histogram is not None:
+            self.histogram.observe(elapsed_ms / 1000, **{
+                self.histogram.labelnames[0]: name, "outcome": "ok" if ok else "error"
+            })
+
+    def snapshot(self):
+        with self._lock:
+            items = [(name, dict(stats, recent=sorted(stats["recent"]))) for name, stats in self._stats.items()]
+
+        result = {}
+        for name, stats in items:
+            recent = stats.pop("recent")
+            def percentile(p):
+                return round(recent[min(int(p * len(recent)), len(recent) - 1)], 1) if recent else None
+            result[name] = {
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "mean_ms": round(stats["total_ms"] / stats["calls"], 1),
+                "p50_ms": percentile(0.50),
+                "p95_ms": percentile(0.95),
+                "max_ms": round(stats["max_ms"], 1),
+            }
+        return result
+
+
+class Database:
+    def __init__(self, url, key, timeout=DB_TIMEOUT, pool_size=DB_POOL_SIZE,
+                 retries=DB_RETRIES, backoff=DB_BACKOFF, breaker=None):
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = QueryMetrics(histogram=SUPABASE_SECONDS)
+        self._local = threading.local()
+
+        self.http = httpx.Client(
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 3.0)),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            event_hooks={"request": [self._apply_deadline]},
+        )
+        self.client = create_client(url, key, options=ClientOptions(
+            httpx_client=self.http, postgrest_client_timeout=timeout
+        ))
+
+    # ---------- core ----------
+    def _apply_deadline(self, request):
+        """Shrink this attempt's HTTP timeouts to the time left before the call's deadline"""
+        deadline = getattr(self._local, "deadline", None)
+        if deadline is None:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("deadline exceeded before request was sent")
+        timeouts = request.extensions.get("timeout") or {}
+        request.extensions["timeout"] = {
+            phase: remaining if value is None else min(value, remaining)
+            for phase, value in {**dict.fromkeys(("connect", "read", "write", "pool")), **timeouts}.items()
+        }
+
+    def run(self, name, build, idempotent=False, deadline=None):
+        """Execute build(table) -> query builder and return response.data
+
+        `name` labels the query in the metrics. Reads pass idempotent=True to
+        be retried on connection errors, timeouts and database-down answers.
+        Those raise DatabaseError once retries are spent; query errors are
+        raised as they are.
+        """
+        if not self.breaker.allow():
+            raise DatabaseUnavailable(f"{name}: database circuit open")
+
+        budget = DB_DEADLINE if deadline is None else deadline
+        end = time.monotonic() + budget
+        attempts = 1 + (self.retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            self._local.deadline = end
+            started = time.perf_counter()
+            try:
+                data = build(self.client.table).execute().data
+            except Exception as e:
+                self.metrics.record(name, (time.perf_counter() - started) * 1000, ok=False)
+                if not isinstance(e, (httpx.HTTPError, DeadlineExceeded)) and not is_unavailable(e):
+                    # Query errors (bad request, constraint) are the caller's, not the database's health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                if attempt + 1 == attempts or time.monotonic() + delay >= end or not self.breaker.allow():
+                    raise DatabaseError(f"{name} failed: {e}") from e
+                time.sleep(delay)
+                continue
+            finally:
+                self._local.deadline = None
+
+            self.metrics.record(name, (time.perf_counter() - started) * 1000, ok=True)
+            self.breaker.record_success()
+            return data
+
+    def rpc(self, name, function, params=None, deadline=None):
+        """Call a Postgres function (not retried)"""
+        return self.run(name, lambda _table: self.client.rpc(function, params or {}), deadline=deadline)
+
+    # ---------- sensor_readings ----------
+    def insert_readings(self, records: List[SensorReading]) -> List[SensorReading]:
+        return self.run("insert_readings", lambda t: t("sensor_readings").insert(records))
+
+    def upsert_readings(self, records: List[SensorReading],
+                        on_conflict: str = "node_id,packet_no,created_at") -> List[SensorReading]:
+        """Insert rows, skipping any already stored under the conflict key (safe to retry)
+
+        The default key survives a node reboot resetting packet_no; it needs the
+        sensor_readings_node_packet_time unique index from schema.sql.
+        """
+        return self.run("upsert_readings", lambda t: t("sensor_readings").upsert(
+            records, on_conflict=on_conflict, ignore_duplicates=True, returning="minimal"
+        ), idempotent=True)
+
+    def recent_readings(self, columns: str = READING_COLUMNS, limit: int = 50,
+                        since: Optional[str] = None, node_id: Optional[int] = None,
+                        deadline: Optional[float] = None) -> List[SensorReading]:
+        """Newest `limit` rows (newest first), or rows at/after `since` (oldest first)"""
+        def build(t):
+            query = t("sensor_readings").select(columns)
+            if since:
+                query = query.gte("created_at", since)
+            if node_id is not None:
+                query = query.eq("node_id", node_id)
+            return query.order("created_at", desc=not since).limit(limit)
+        return self.run("recent_readings", build, idempotent=True, deadline=deadline)
+
+    def latest_reading(self, columns: str = READING_COLUMNS, node_id: Optional[int] = None,
+                       deadline: Optional[float] = None) -> Optional[SensorReading]:
+        rows = self.recent_readings(columns, limit=1, node_id=node_id, deadline=deadline)
+        return rows[0] if rows else None
+
+    def nodes(self, deadline: Optional[float] = None) -> List[dict]:
+        """Every node with its newest position and last-seen time (sensor_nodes() in schema.sql)"""
+        return self.rpc("nodes", "sensor_nodes", deadline=deadline)
+
+    def readings_page(self, columns: str, node_ids: Optional[Iterable[int]] = None,
+                      start: Optional[str] = None, end: Optional[str] = None,
+                      after: Optional[tuple] = None, limit: int = 1000) -> List[SensorReading]:
+        """One page in (created_at, id) order; `after` is the last (created_at, id) seen"""
+        def build(t):
+            query = t("sensor_readings").select(columns)
+            if node_ids:
+                query = query.in_("node_id", list(node_ids))
+            if start:
+                query = query.gte("created_at", start)
+            if end:
+                query = query.lt("created_at", end)
+            if after:
+                created_at, row_id = after
+                query = query.or_(f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{row_id})')
+            return query.order("created_at").order("id").limit(limit)
+        return self.run("readings_page", build, idempotent=True, deadline=max(DB_DEADLINE, 30))
+
+    # ---------- user_prefs ----------
+    def get_user_pref(self, phone: str) -> Optional[UserPref]:
+        rows = self.run("get_user_pref", lambda t: t("user_prefs").select("*").eq("phone", phone), idempotent=True)
+        return rows[0] if rows else None
+
+    def create_user_pref(self, phone: str, language: Optional[str] = None, subscribed: bool = True) -> List[UserPref]:
+        return self.run("create_user_pref", lambda t: t("user_prefs").insert(
+            {"phone": phone, "language": language, "subscribed": subscribed}
+        ))
+
+    def set_user_language(self, phone: str, language: str) -> List[UserPref]:
+        return self.run("set_user_language", lambda t: t("user_prefs").update({"language": language}).eq("phone", phone))
+
+    def save_user_prefs(self, prefs: List[UserPref]) -> List[UserPref]:
+        """Insert or update rows keyed on phone (safe to retry)"""
+        return self.run("save_user_prefs", lambda t: t("user_prefs").upsert(
+            prefs, on_conflict="phone", returning="minimal"
+        ), idempotent=True)
+
+    def user_prefs(self) -> List[UserPref]:
+        return self.run("user_prefs", lambda t: t("user_prefs").select("phone, language, subscribed"), idempotent=True)
+
+    def subscribed_users(self) -> List[UserPref]:
+        return self.run(
+            "subscribed_users",
+            lambda t: t("user_prefs").select("phone, language, subscribed").eq("subscribed", True),
+            idempotent=True,
+        )
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """Process-wide Database built from SUPABASE_URL / SUPABASE_KEY"""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = Database(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        return _database
@@ -0,0 +1,176 @@
+# export.py
+"""
+Streaming bulk export of sensor_readings.
+
+Rows are read from Supabase one page at a time (keyset pagination on
+created_at, id) with the derived values stored at ingest, and encoded as they go, so memory use depends on
+the page size and not on the length of the range. The same generators back
+the GET /export endpoint and the command line:
+
+    python export.py --format parquet --node 1 --node 2 \
+        --start 2025-06-01 --end 2025-09-01 -o monsoon.parquet
+
+Formats: csv, ndjson, parquet (one row group per page; needs pyarrow).
+"""
+
+import io
+import csv
+import sys
+import json
+import argparse
+import pandas as pd
+
+from calibration import with_derived
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:   # Parquet export is optional
+    pa = pq = None
+
+PAGE_SIZE = 1000
+
+RAW_COLUMNS = (
+    "id", "node_id", "packet_no", "ax", "ay", "az", "gx", "gy", "gz",
+    "soil_raw", "moisture", "vibration", "tilt", "temperature", "latitude", "longitude", "created_at",
+)
+EXPORT_COLUMNS = (
+    "node_id", "packet_no", "created_at", "ax", "ay", "az", "gx", "gy", "gz",
+    "soil_raw", "temperature", "latitude", "longitude",
+    "moisture", "vibration", "tilt",   # derived: %, deg/s, degrees
+)
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def iter_pages(db, node_ids=None, start=None, end=None, page_size=PAGE_SIZE):
+    """Yield pages of export rows with derived values, oldest first"""
+    cursor = None   # (created_at, id) of the last row sent
+    while True:
+        rows = db.readings_page(", ".join(RAW_COLUMNS), node_ids, start, end, after=cursor, limit=page_size)
+        if not rows:
+            return
+
+        cursor = (rows[-1]["created_at"], rows[-1]["id"])
+        yield [{column: row.get(column) for column in EXPORT_COLUMNS} for row in with_derived(rows)]
+
+        if len(rows) < page_size:
+            return
+
+
+def encode_csv(pages):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_ndjson(pages):
+    for page in pages:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in page).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the caller in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def parquet_schema():
+    return pa.schema([
+        ("node_id", pa.int64()), ("packet_no", pa.int64()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("ax", pa.int64()), ("ay", pa.int64()), ("az", pa.int64()),
+        ("gx", pa.int64()), ("gy", pa.int64()), ("gz", pa.int64()),
+        ("soil_raw", pa.int64()), ("temperature", pa.float64()),
+        ("latitude", pa.float64()), ("longitude", pa.float64()),
+        ("moisture", pa.float64()), ("vibration", pa.float64()), ("tilt", pa.float64()),
+    ])
+
+
+def parquet_table(page, schema):
+    """Arrow table for one page of export rows"""
+    df = pd.DataFrame(page, columns=list(EXPORT_COLUMNS))
+    df["created_at"] = pd.to_datetime(df["created_at"], utc=True, format="ISO8601")
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").astype("Int64")
+        elif pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce")
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def encode_parquet(pages):
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for page in pages:
+            writer.write_table(parquet_table(page, schema))   # one row group per page
+            yield sink.drain()
+    yield sink.drain()   # footer
+
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson, "parquet": encode_parquet}
+
+
+def export_stream(db, fmt, node_ids=None, start=None, end=None, page_size=PAGE_SIZE):
+    """Byte chunks of the selected readings in the given format"""
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of {', '.join(ENCODERS)})")
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+    return ENCODERS[fmt](iter_pages(db, node_ids, start, end, page_size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export TerraShield sensor readings")
+    parser.add_argument("--format", choices=sorted(ENCODERS), default="csv")
+    parser.add_argument("--node", type=int, action="append", dest="node_ids", help="node id (repeatable)")
+    parser.add_argument("--start", help="inclusive start (ISO date or timestamp)")
+    parser.add_argument("--end", help="exclusive end (ISO date or timestamp)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from data_access import get_database
+
+    chunks = export_stream(get_database(), args.format, args.node_ids, args.start, args.end, args.page_size)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# gateway.py
+"""
+WhatsApp messaging gateway: one webhook, one command grammar.
+
+Incoming messages are normalised (case, punctuation, spacing) and looked up
+in a command table built once at start-up. Exact phrases, aliases and Hindi /
+Marathi keywords all live in the same dict. A message is matched on its
+whole text, then on its first two words, then on its first word. That is at
+most three dict lookups, however many commands there are.
+
+Handlers are plain functions registered with MessagingGateway.command():
+
+    @gateway.command("status", "status", "स्थिति")
+    def status(message):
+        return "All good"
+
+They receive a Message and return the reply text (None for no reply). Each
+command's latency and errors are tracked in MessagingGateway.metrics.
+
+"hi" is a greeting. Hindi is chosen with "hindi" / "हिंदी". Only "subscribe"
+(or "start" / "join") subscribes a number to alerts, and "stop" unsubscribes
+it. Messaging the bot never subscribes anyone by itself.
+
+The backend serves the gateway at POST /whatsapp. It can also run on its own:
+
+    python gateway.py      # GATEWAY_PORT, default 5001
+"""
+
+import os
+import time
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import Blueprint, request, jsonify
+
+from messages import translations, format_sensor_values
+from calibration import with_derived
+from data_access import QueryMetrics
+from metrics import histogram
+from language_prefs import LANGUAGES, DEFAULT_LANGUAGE, normalize_phone
+from webhook_guard import get_webhook_guard
+from twilio_client import send_message, FROM_WHATSAPP
+
+GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", "5001"))
+
+COMMAND_SECONDS = histogram(
+    "gateway_command_duration_seconds", "WhatsApp command handling time", ("command", "outcome")
+)
+
+LANGUAGE_KEYWORDS = {
+    "english": ("english", "en", "eng", "इंग्लिश", "अंग्रेज़ी", "अंग्रेजी", "इंग्रजी"),
+    "hindi": ("hindi", "हिंदी", "हिन्दी"),
+    "marathi": ("marathi", "mr", "मराठी"),
+}
+
+
+def normalize_text(text):
+    """Lower-case words separated by single spaces, without punctuation or emoji"""
+    text = (text or "").casefold()
+    # Punctuation (P*) and symbols/emoji (S*) become spaces; Devanagari marks (M*) stay
+    text = "".join(" " if unicodedata.category(c)[0] in "PS" else c for c in text)
+    return " ".join(text.split())
+
+
+def reply(key, language):
+    return translations[key].get(language, translations[key][DEFAULT_LANGUAGE])
+
+
+@dataclass
+class Message:
+    phone: str          # E.164
+    text: str           # normalised text
+    language: str       # sender's language (resolved in memory)
+    arg: Optional[str]  # value bound to the matched keyword, e.g. the chosen language
+    new_user: bool
+
+
+class CommandTable:
+    """Keyword -> (command, arg) lookup on normalised text"""
+
+    MAX_WORDS = 2   # longest keyword prefix tried after the full text
+
+    def __init__(self):
+        self._keywords = {}
+
+    def add(self, command, keywords, arg=None):
+        for keyword in keywords:
+            key = normalize_text(keyword)
+            if key in self._keywords and self._keywords[key][0] != command:
+                raise ValueError(f"Keyword '{keyword}' already bound to '{self._keywords[key][0]}'")
+            self._keywords[key] = (command, arg)
+
+    def match(self, text):
+        """(command, arg) for normalised text, or (None, None)"""
+        found = self._keywords.get(text)
+        if found:
+            return found
+        words = text.split(" ")
+        for n in range(min(self.MAX_WORDS, len(words) - 1), 0, -1):
+            found = self._keywords.get(" ".join(words[:n]))
+            if found:
+                return found
+        return None, None
+
+
+class MessagingGateway:
+    def __init__(self, prefs, send, latest_reading=None):
+        """`send(to, body)` delivers a reply; `latest_reading()` returns a calibrated row or None"""
+        self.prefs = prefs
+        self.send = send
+        self.latest_reading = latest_reading
+        self.table = CommandTable()
+        self.handlers = {}
+        self.metrics = QueryMetrics(histogram=COMMAND_SECONDS)
+        register_default_commands(self)
+
+    def command(self, name, *keywords, arg=None):
+        """Decorator registering a handler for `keywords` (call again to add keywords)"""
+        def register(handler):
+            self.table.add(name, keywords, arg)
+            self.handlers[name] = handler
+            return handler
+        return register
+
+    def dispatch(self, sender, body):
+        """Handle one message; returns (command, reply text)"""
+        phone = normalize_phone(sender)
+        text = normalize_text(body)
+        name, arg = self.table.match(text)
+        new_user = self.prefs.lookup(phone) is None   # Registered by another worker, maybe
+
+        if new_user and name not in ("subscribe", "set_language"):
+            name = "welcome"   # Explain how to subscribe; nothing is stored yet
+        elif name is None:
+            name = "unknown"
+
+        message = Message(phone, text, self.prefs.language(phone), arg, new_user)
+        started = time.perf_counter()
+        ok = False
+        try:
+            body = self.handlers[name](message)
+            ok = True
+        finally:
+            self.metrics.record(name, (time.perf_counter() - started) * 1000, ok=ok)
+        return name, body
+
+    def handle(self, sender, body):
+        """Dispatch and send the reply; raises if the reply could not be sent"""
+        name, text = self.dispatch(sender, body)
+        if text:
+            self.send(sender, text)
+        return name
+
+
+def register_default_commands(gateway):
+    @gateway.command("welcome")
+    def welcome(message):
+        return reply("welcome", message.language)
+
+    @gateway.command("subscribe", "subscribe", "start", "join", "सब्सक्राइब", "सदस्यता")
+    def subscribe(message):
+        gateway.prefs.set_subscribed(message.phone, True)
+        return reply("subscribed", message.language)
+
+    @gateway.command("unsubscribe", "unsubscribe", "stop", "रोकें", "थांबवा")
+    def unsubscribe(message):
+        gateway.prefs.set_subscribed(message.phone, False)
+        return reply("unsubscribed", message.language)
+
+    @gateway.command("greet", "hi", "hello", "hey", "namaste", "नमस्ते", "नमस्कार")
+    @gateway.command("change_language", "change language", "set language", "भाषा बदलें", "भाषा बदला")
+    def choose_language(message):
+        return reply("choose_language", message.language)
+
+    @gateway.command("current_language", "language", "lang", "current language", "भाषा")
+    def current_language(message):
+        return reply("current_language", message.language)
+
+    def set_language(message):
+        language = gateway.prefs.set_language(message.phone, message.arg)
+        return reply("language_set", language)
+    for language in LANGUAGES:
+        gateway.command("set_language", *LANGUAGE_KEYWORDS[language], arg=language)(set_language)
+
+    @gateway.command("sensor_values", "sensor values", "sensor", "values", "readings", "status",
+                     "सेंसर", "सेन्सर", "स्थिति", "स्थिती")
+    def sensor_values(message):
+        latest = gateway.latest_reading() if gateway.latest_reading else None
+        return format_sensor_values(latest, lang=message.language)
+
+    @gateway.command("help", "help", "commands", "menu", "मदद", "मदत")
+    def help_(message):
+        return reply("help", message.language)
+
+    @gateway.command("unknown")
+    def unknown(message):
+        return reply("unknown", message.language)
+
+
+def latest_reading_from(db):
+    """latest_reading callable reading the newest row from Supabase"""
+    def latest_reading():
+        row = db.latest_reading()
+        return with_derived([row])[0] if row else None
+    return latest_reading
+
+
+def create_blueprint(get_gateway, guard=None):
+    """POST /whatsapp (and /language-webhook for older Twilio configs), GET /gateway/metrics
+
+    `get_gateway()` returns the MessagingGateway, so it can be built on first use.
+    """
+    guard = guard or get_webhook_guard("gateway")
+    blueprint = Blueprint("gateway", __name__)
+
+    @blueprint.route("/whatsapp", methods=["POST"])
+    @blueprint.route("/language-webhook", methods=["POST"])
+    @guard.protect
+    def webhook():
+        sender = (request.values.get("From") or "").strip()
+        if not sender:
+            return jsonify({"status": "error", "message": "No sender number"}), 400
+        try:
+            command = get_gateway().handle(sender, request.values.get("Body", ""))
+        except Exception as e:
+            print("Gateway error:", e)
+            return jsonify({"status": "error", "message": str(e)}), 500
+        return jsonify({"status": "ok", "command": command})
+
+    @blueprint.route("/gateway/metrics", methods=["GET"])
+    def metrics():
+        return jsonify({
+            "commands": get_gateway().metrics.snapshot(),
+            "duplicates": guard.duplicates,
+            "rate_limited": guard.rate_limited,
+        })
+
+    return blueprint
+
+
+def twilio_sender(from_whatsapp=FROM_WHATSAPP):
+    """send(to, body) through the shared Twilio client (created on first send)"""
+    def send(to, body):
+        send_message(from_=from_whatsapp, to=to, body=body, operation="reply")
+    return send
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway(create=True):
+    """Process-wide gateway replying through Twilio (None if not built yet and create=False)"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None and create:
+            from data_access import get_database
+            from language_prefs import get_language_prefs
+
+            db = get_database()
+            _gateway = MessagingGateway(get_language_prefs(db), twilio_sender(), latest_reading_from(db))
+        return _gateway
+
+
+def main():
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.register_blueprint(create_blueprint(get_gateway))
+    print(f"🚀 Messaging gateway on port {GATEWAY_PORT} (POST /whatsapp)")
+    app.run(host="0.0.0.0", port=GATEWAY_PORT, debug=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# language_prefs.py
+"""
+Per-phone alert language preferences.
+
+Every process that sends or changes messages keeps the full phone -> language
+map in memory, so resolving a user's language never touches the disk or the
+network. Changes are applied in memory first and persisted write-behind by a
+background thread: upserted into the Supabase `user_prefs` table and mirrored
+to a local JSON file (LANGUAGE_PREFS_FILE), which stands in for the table when
+Supabase is not configured or unreachable. Writes that have not reached the
+table yet are marked pending in the file and retried after a restart.
+
+Only the fields a change touched are saved, so two processes changing
+different fields of one user (one subscribes, the other sets the language)
+do not overwrite each other's rows.
+
+Each change is also sent as a small UDP datagram to LANGUAGE_PREFS_PEERS
+(host:port, comma separated). The alert monitor listens on
+LANGUAGE_PREFS_LISTEN and applies updates as they arrive. Pre-forked backend
+workers (serve.py) each listen on LANGUAGE_PREFS_WORKER_PORT + their index
+and announce changes to each other as well. As a safety net for lost
+datagrams, a listener re-reads the table every LANGUAGE_PREFS_REFRESH
+seconds, and lookup() reads a phone missing from memory from the table.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+
+LANGUAGES = ("english", "hindi", "marathi")
+DEFAULT_LANGUAGE = "english"
+LANGUAGE_ALIASES = {"en": "english", "hi": "hindi", "mr": "marathi"}
+FIELDS = ("language", "subscribed")
+
+PREFS_FILE = os.getenv(
+    "LANGUAGE_PREFS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "user_prefs.json")
+)
+PREFS_PEERS = os.getenv("LANGUAGE_PREFS_PEERS", "127.0.0.1:5011")
+PREFS_LISTEN = os.getenv("LANGUAGE_PREFS_LISTEN", "127.0.0.1:5011")
+WORKER_PORT = int(os.getenv("LANGUAGE_PREFS_WORKER_PORT", "5020"))   # + worker index
+FLUSH_INTERVAL = float(os.getenv("LANGUAGE_PREFS_FLUSH", "1"))       # write-behind delay / retry
+REFRESH_INTERVAL = float(os.getenv("LANGUAGE_PREFS_REFRESH", "300"))
+
+
+def normalize_phone(number):
+    """E.164 number from a Twilio address ('whatsapp:+9198...' -> '+9198...')"""
+    number = (number or "").strip()
+    if number.lower().startswith("whatsapp:"):
+        number = number[len("whatsapp:"):]
+    return number.replace(" ", "")
+
+
+def parse_language(text):
+    """Canonical language name for 'Hindi', 'hi', ... or None"""
+    text = (text or "").strip().lower()
+    text = LANGUAGE_ALIASES.get(text, text)
+    return text if text in LANGUAGES else None
+
+
+def _parse_addresses(value):
+    addresses = []
+    for item in (value or "").split(","):
+        host, _, port = item.strip().rpartition(":")
+        if host and port:
+            addresses.append((host, int(port)))
+    return addresses
+
+
+class LanguagePreferences:
+    def __init__(self, db=None, path=PREFS_FILE, peers=PREFS_PEERS, flush_interval=FLUSH_INTERVAL):
+        self.db = db
+        self.path = path
+        self.peers = _parse_addresses(peers) if isinstance(peers, str) else list(peers or [])
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._prefs = {}       # phone -> {"phone", "language", "subscribed"}
+        self._pending = {}     # phone -> fields changed here and not yet in the table
+        self._touched = {}     # phone -> monotonic time of the last change seen
+        self._wake = threading.Event()
+        self._writer = None
+        self._listener = None
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    # ---------- warm-up ----------
+    def load(self):
+        """Fill the map from the local file, then from the table (pending local changes win)"""
+        local = self._read_file()
+        with self._lock:
+            for phone, pref in local["prefs"].items():
+                self._prefs[phone] = pref
+            self._pending.update((p, set(f)) for p, f in local["pending"].items() if p in self._prefs)
+        if self._pending:
+            self._start_writer()
+            self._wake.set()
+        self.refresh()
+        return self
+
+    def refresh(self, protect_seconds=0.0):
+        """Re-read the table; rows changed here or broadcast within protect_seconds are kept"""
+        if self.db is None:
+            return False
+        try:
+            rows = self.db.user_prefs()
+        except Exception as e:
+            print(f"⚠️ Could not load language preferences: {e}")
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            for row in rows:
+                phone = normalize_phone(row.get("phone"))
+                if not phone or phone in self._pending or now - self._touched.get(phone, -1e9) < protect_seconds:
+                    continue
+                self._prefs[phone] = _from_row(phone, row)
+        return True
+
+    def lookup(self, phone):
+        """get(), reading a phone missing from memory from the table (or the local file)
+
+        Another process may have registered the user moments ago; this keeps
+        that user from being treated as new here.
+        """
+        pref = self.get(phone)
+        if pref is not None:
+            return pref
+        phone = normalize_phone(phone)
+        row = None
+        if self.db is not None:
+            try:
+                row = self.db.get_user_pref(phone)
+            except Exception as e:
+                print(f"⚠️ Could not look up language preference for {phone}: {e}")
+        if row is None:
+            row = self._read_file()["prefs"].get(phone)   # Saved here by a process without the table
+        if row is not None:
+            with self._lock:
+                self._prefs.setdefault(phone, _from_row(phone, row))
+        return self.get(phone)
+
+    # ---------- reads (memory only) ----------
+    def get(self, phone):
+        pref = self._prefs.get(normalize_phone(phone))
+        return dict(pref) if pref else None
+
+    def language(self, phone, default=DEFAULT_LANGUAGE):
+        pref = self._prefs.get(normalize_phone(phone))
+        return (pref and pref["language"]) or default
+
+    def subscribers(self):
+        """Subscribed users as {"phone", "language"} with the language resolved"""
+        with self._lock:
+            prefs = list(self._prefs.values())
+        return [
+            {"phone": p["phone"], "language": p["language"] or DEFAULT_LANGUAGE}
+            for p in prefs if p["subscribed"]
+        ]
+
+    # ---------- writes ----------
+    def add(self, phone, language=None, subscribed=True):
+        """Register a user if unknown; returns True when it was created"""
+        phone = normalize_phone(phone)
+        with self._lock:
+            if phone in self._prefs:
+                return False
+        self._update(phone, {"language": parse_language(language), "subscribed": subscribed})
+        return True
+
+    def set_subscribed(self, phone, subscribed=True):
+        """Opt a user in to (or out of) alerts, registering them if unknown"""
+        self._update(normalize_phone(phone), {"subscribed": subscribed})
+
+    def set_language(self, phone, language):
+        """Change a user's language; returns the canonical name, or None if unknown
+
+        A new user is registered unsubscribed: choosing a language is not an opt-in.
+        """
+        language = parse_language(language)
+        if language is None:
+            return None
+        self._update(normalize_phone(phone), {"language": language})
+        return language
+
+    def _update(self, phone, changes):
+        with self._lock:
+            pref = dict(self._prefs.get(phone) or {"phone": phone, "language": None, "subscribed": False})
+            pref.update(changes)
+            self._prefs[phone] = pref
+            self._pending.setdefault(phone, set()).update(changes)
+            self._touched[phone] = time.monotonic()
+        self._broadcast(dict(pref, fields=sorted(changes)))
+        self._start_writer()
+        self._wake.set()
+
+    def apply(self, pref):
+        """Take a change made by another process (already being persisted there)
+
+        Only the fields it changed are taken for a phone known here.
+        """
+        phone = normalize_phone(pref.get("phone"))
+        if not phone:
+            return
+        incoming = _from_row(phone, pref)
+        fields = [f for f in pref.get("fields", FIELDS) if f in FIELDS]
+        with self._lock:
+            current = self._prefs.get(phone)
+            self._prefs[phone] = incoming if current is None else dict(current, **{f: incoming[f] for f in fields})
+            self._touched[phone] = time.monotonic()
+
+    # ---------- write-behind ----------
+    def _start_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name="language-prefs-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.flush_interval)   # Coalesce bursts of changes
+            self._wake.clear()
+            try:
+                if not self.flush():
+                    self._wake.set()   # Table unreachable; retry after the next interval
+            except Exception as e:
+                print(f"⚠️ Could not save language preferences: {e}")
+                self._wake.set()
+
+    def flush(self):
+        """Persist pending changes; returns False if some are still waiting for the table
+
+        Each row carries only the fields changed here, so the upsert leaves
+        the others as another process saved them. A user first seen here gets
+        the table's defaults for fields never set (schema.sql makes
+        `subscribed` default to false).
+        """
+        with self._lock:
+            batch = {
+                phone: {f: self._prefs[phone][f] for f in fields}
+                for phone, fields in self._pending.items()
+            }
+
+        saved = set()
+        if batch and self.db is not None:
+            groups = {}
+            for phone, values in sorted(batch.items()):
+                groups.setdefault(tuple(sorted(values)), []).append({"phone": phone, **values})
+            for rows in groups.values():   # Every row of one upsert has the same columns
+                try:
+                    self.db.save_user_prefs(rows)
+                    saved.update(row["phone"] for row in rows)
+                except Exception as e:
+                    print(f"⚠️ Language preferences kept locally until the database is back: {e}")
+
+        with self._lock:
+            for phone, values in batch.items():
+                if phone not in saved and self.db is not None:
+                    continue
+                # Fields changed again during the upsert stay pending
+                fields = self._pending.get(phone, set())
+                fields.difference_update(f for f, v in values.items() if self._prefs[phone].get(f) == v)
+                if not fields:
+                    self._pending.pop(phone, None)
+            pending = {p: sorted(f) for p, f in self._pending.items()}
+        self._write_file(batch, pending)
+        return not pending or self.db is None
+
+    def _read_file(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            pending = data.get("pending", {})
+            if isinstance(pending, list):   # Written before changes were tracked per field
+                pending = {phone: list(FIELDS) for phone in pending}
+            return {"prefs": data.get("prefs", {}), "pending": pending}
+        except FileNotFoundError:
+            return {"prefs": {}, "pending": {}}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable language preference file {self.path}: {e}")
+            return {"prefs": {}, "pending": {}}
+
+    def _write_file(self, changed, pending):
+        # Other writers (backend workers, messaging gateway) share the file:
+        # only touch the fields changed here
+        current = self._read_file()
+        prefs = current["prefs"]
+        for phone, values in changed.items():
+            prefs[phone] = {**prefs.get(phone, {"phone": phone, "language": None, "subscribed": False}), **values}
+        pending = {p: f for p, f in current["pending"].items() if p not in changed} | {
+            p: f for p, f in pending.items() if p in changed
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"prefs": prefs, "pending": pending}, f, ensure_ascii=False, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    # ---------- broadcast ----------
+    def _broadcast(self, pref):
+        payload = json.dumps(pref).encode("utf-8")
+        for address in self.peers:
+            try:
+                self._socket.sendto(payload, address)
+            except OSError as e:
+                print(f"⚠️ Could not notify {address[0]}:{address[1]} of language change: {e}")
+
+    def listen(self, address=PREFS_LISTEN, refresh_interval=REFRESH_INTERVAL):
+        """Apply changes broadcast by other processes (background thread)
+
+        The table is re-read every refresh_interval seconds either way; returns
+        False if the port is taken, in which case that refresh is all there is.
+        """
+        host, port = _parse_addresses(address)[0]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind((host, port))
+            sock.settimeout(refresh_interval)
+        except OSError as e:
+            print(f"⚠️ Language updates not received on {host}:{port}, refreshing every {refresh_interval:.0f}s: {e}")
+            sock.close()
+            sock = None
+
+        def loop():
+            while True:
+                if sock is None:
+                    time.sleep(refresh_interval)
+                    self.refresh(protect_seconds=refresh_interval)
+                    continue
+                try:
+                    payload, _ = sock.recvfrom(4096)
+                except socket.timeout:
+                    self.refresh(protect_seconds=refresh_interval)
+                    continue
+                try:
+                    self.apply(json.loads(payload))
+                except (ValueError, AttributeError) as e:
+                    print(f"⚠️ Ignoring malformed language update: {e}")
+
+        self._listener = threading.Thread(target=loop, name="language-prefs-listener", daemon=True)
+        self._listener.start()
+        return sock is not None
+
+
+def _from_row(phone, row):
+    return {
+        "phone": phone,
+        "language": parse_language(row.get("language")),
+        "subscribed": bool(row.get("subscribed", False)),
+    }
+
+
+_prefs = None
+_prefs_lock = threading.Lock()
+_worker = None   # (index, count, base port) under serve.py's pre-fork
+
+
+def use_worker_ports(index, count, base_port=WORKER_PORT):
+    """Called in each pre-forked worker: listen on base_port + index and announce to the others"""
+    global _worker
+    _worker = (index, count, base_port)
+
+
+def get_language_prefs(db=None):
+    """Process-wide preference store, warmed on first use"""
+    global _prefs
+    with _prefs_lock:
+        if _prefs is None:
+            if db is None:
+                try:
+                    from data_access import get_database
+                    db = get_database()
+                except ValueError:
+                    db = None   # Supabase not configured: the local file is the store
+            if _worker is None:
+                _prefs = LanguagePreferences(db).load()
+            else:
+                index, count, base_port = _worker
+                peers = _parse_addresses(PREFS_PEERS) + [
+                    ("127.0.0.1", base_port + i) for i in range(count) if i != index
+                ]
+                _prefs = LanguagePreferences(db, peers=peers).load()
+                _prefs.listen(f"127.0.0.1:{base_port + index}")
+        return _prefs
@@ -0,0 +1,197 @@
+# link_quality.py
+"""
+Per-node packet sequence tracking and radio link statistics.
+
+Each node keeps a sliding bitmap of the last WINDOW packet numbers
+(bit 0 = highest packet_no seen, bit i = highest - i). Loss, duplicates,
+reorders and gaps fall out of a couple of shifts and masks, and RSSI/SNR
+are kept as running sums over a fixed window, so every packet is O(1).
+"""
+
+import os
+import math
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+WINDOW = int(os.getenv("LINK_WINDOW", "256"))              # packets tracked in the bitmap
+SIGNAL_WINDOW = int(os.getenv("LINK_SIGNAL_WINDOW", "64"))  # packets in the RSSI/SNR window
+# A jump back further than this is treated as a node reboot / counter wrap
+RESET_THRESHOLD = int(os.getenv("LINK_RESET_THRESHOLD", "1024"))
+
+
+class RollingStat:
+    """Mean/stdev/last over the most recent N values in O(1) per value"""
+
+    def __init__(self, size=SIGNAL_WINDOW):
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, value):
+        if value is None:
+            return
+        value = float(value)
+        if len(self.values) == self.values.maxlen:
+            old = self.values[0]
+            self.total -= old
+            self.total_sq -= old * old
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+
+    def summary(self):
+        n = len(self.values)
+        if n == 0:
+            return None
+        mean = self.total / n
+        variance = max(self.total_sq / n - mean * mean, 0.0)
+        return {
+            "last": self.values[-1],
+            "mean": round(mean, 2),
+            "stdev": round(math.sqrt(variance), 2),
+            "samples": n,
+        }
+
+
+class NodeLinkStats:
+    """Sequence and signal statistics for a single node"""
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.highest = None
+        self.bitmap = 0
+        self.span = 0          # packet numbers covered by the bitmap
+        self.in_window = 0     # set bits in the bitmap
+        self.received = 0
+        self.duplicates = 0
+        self.reorders = 0
+        self.gaps = 0
+        self.missing = 0
+        self.resets = 0
+        self.last_seen = None
+        self.rssi = RollingStat()
+        self.snr = RollingStat()
+
+    def _restart(self, packet_no):
+        self.highest = packet_no
+        self.bitmap = 1
+        self.span = 1
+        self.in_window = 1
+
+    def record(self, packet_no, rssi=None, snr=None, seen_at=None):
+        """Record one packet; returns 'new', 'duplicate', 'reordered' or 'late'"""
+        self.last_seen = seen_at if seen_at is not None else time.time()
+        self.rssi.add(rssi)
+        self.snr.add(snr)
+
+        if self.highest is None:
+            self.received += 1
+            self._restart(packet_no)
+            return "new"
+
+        delta = packet_no - self.highest
+
+        if delta > 0:
+            if delta > 1:
+                self.gaps += 1
+                self.missing += delta - 1
+            if delta >= WINDOW:
+                dropped = self.in_window
+            else:
+                dropped = (self.bitmap >> (WINDOW - delta)).bit_count()
+            self.bitmap = ((self.bitmap << delta) | 1) & ((1 << WINDOW) - 1)
+            self.in_window = self.in_window - dropped + 1
+            self.span = min(self.span + delta, WINDOW)
+            self.highest = packet_no
+            self.received += 1
+            return "new"
+
+        if delta == 0:
+            self.duplicates += 1
+            return "duplicate"
+
+        offset = -delta
+        if offset > RESET_THRESHOLD:
+            self.resets += 1
+            self.received += 1
+            self._restart(packet_no)
+            return "new"
+        if offset >= WINDOW:
+            # Too old to tell a duplicate from a late arrival
+            self.received += 1
+            return "late"
+
+        bit = 1 << offset
+        if self.bitmap & bit:
+            self.duplicates += 1
+            return "duplicate"
+
+        self.bitmap |= bit
+        self.in_window += 1
+        self.reorders += 1
+        if offset < self.span:
+            self.missing = max(self.missing - 1, 0)   # Filled a gap counted earlier
+        else:
+            # Older than the first packet seen: the window now reaches back to
+            # it, and any numbers skipped in between are missing
+            holes = offset - self.span
+            if holes:
+                self.gaps += 1
+                self.missing += holes
+            self.span = offset + 1
+        self.received += 1
+        return "reordered"
+
+    def snapshot(self, now=None):
+        now = now if now is not None else time.time()
+        loss_rate = max(1.0 - self.in_window / self.span, 0.0) if self.span else 0.0
+        return {
+            "node_id": self.node_id,
+            "last_packet_no": self.highest,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "reorders": self.reorders,
+            "gaps": self.gaps,
+            "missing": self.missing,
+            "resets": self.resets,
+            "loss_rate": round(loss_rate, 4),
+            "window": self.span,
+            "last_seen": datetime.fromtimestamp(self.last_seen, timezone.utc).isoformat() if self.last_seen else None,
+            "seconds_since_seen": round(now - self.last_seen, 1) if self.last_seen else None,
+            "rssi": self.rssi.summary(),
+            "snr": self.snr.summary(),
+        }
+
+
+class LinkQualityTracker:
+    """Thread-safe collection of per-node link statistics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes = {}
+
+    def record(self, packet):
+        """Feed one stored packet (needs node_id and packet_no)"""
+        # Same integer node key as the archive, so "7" and 7 are one node
+        try:
+            node_id = int(packet.get("node_id"))
+            packet_no = int(packet.get("packet_no"))
+        except (TypeError, ValueError):
+            return None
+
+        with self._lock:
+            stats = self._nodes.get(node_id)
+            if stats is None:
+                stats = self._nodes[node_id] = NodeLinkStats(node_id)
+            return stats.record(packet_no, packet.get("rssi"), packet.get("snr"))
+
+    def snapshot(self):
+        """Current statistics for every node, keyed by node_id"""
+        now = time.time()
+        with self._lock:
+            return {str(node_id): stats.snapshot(now) for node_id, stats in self._nodes.items()}
+
+
+link_tracker = LinkQualityTracker()
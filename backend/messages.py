@@ -19,6 +19,41 @@ translations = {
         "english": "✅ Language set to English. Send 'sensor values' to get readings.",
         "hindi":   "✅ भाषा हिंदी पर सेट हो गई है। 'sensor values' भेजें readings पाने के लिए।",
         "marathi": "✅ भाषा मराठीवर सेट केली आहे. 'sensor values' पाठवा readings मिळवण्यासाठी."
+    },
+    "welcome": {
+        "english": "Welcome! 🙏\nSend 'subscribe' to receive landslide alerts, or enter your preferred language (English / Hindi / Marathi).",
+        "hindi":   "स्वागत है! 🙏\nभूस्खलन अलर्ट पाने के लिए 'subscribe' भेजें, या अपनी पसंदीदा भाषा लिखें (English / हिंदी / मराठी)।",
+        "marathi": "स्वागत आहे! 🙏\nभूस्खलन सूचना मिळवण्यासाठी 'subscribe' पाठवा, किंवा आपली आवडती भाषा लिहा (English / हिंदी / मराठी)."
+    },
+    "subscribed": {
+        "english": "✅ You will now receive TerraShield alerts.\nSend 'stop' to unsubscribe.",
+        "hindi":   "✅ अब आपको TerraShield अलर्ट मिलेंगे।\nबंद करने के लिए 'stop' भेजें।",
+        "marathi": "✅ आता तुम्हाला TerraShield सूचना मिळतील.\nबंद करण्यासाठी 'stop' पाठवा."
+    },
+    "unsubscribed": {
+        "english": "🔕 You will no longer receive TerraShield alerts.\nSend 'subscribe' to start again.",
+        "hindi":   "🔕 अब आपको TerraShield अलर्ट नहीं मिलेंगे।\nफिर से शुरू करने के लिए 'subscribe' भेजें।",
+        "marathi": "🔕 आता तुम्हाला TerraShield सूचना मिळणार नाहीत.\nपुन्हा सुरू करण्यासाठी 'subscribe' पाठवा."
+    },
+    "choose_language": {
+        "english": "Please enter your preferred language (English / Hindi / Marathi).",
+        "hindi":   "कृपया अपनी पसंदीदा भाषा लिखें (English / हिंदी / मराठी)।",
+        "marathi": "कृपया आपली आवडती भाषा लिहा (English / हिंदी / मराठी)."
+    },
+    "current_language": {
+        "english": "🌍 Current language: English\nSend 'change language' to change it.",
+        "hindi":   "🌍 वर्तमान भाषा: हिंदी\nबदलने के लिए 'change language' भेजें।",
+        "marathi": "🌍 सध्याची भाषा: मराठी\nबदलण्यासाठी 'change language' पाठवा."
+    },
+    "help": {
+        "english": "🤖 TerraShield commands:\n• subscribe / stop - start or stop alerts\n• sensor values - latest readings\n• english / hindi / marathi - set alert language\n• language - show your language\n• help - this message",
+        "hindi":   "🤖 TerraShield कमांड:\n• subscribe / stop - अलर्ट शुरू या बंद करें\n• sensor values - ताज़ा रीडिंग\n• english / hindi / marathi - अलर्ट भाषा चुनें\n• language - आपकी भाषा\n• help - यह संदेश",
+        "marathi": "🤖 TerraShield कमांड:\n• subscribe / stop - सूचना सुरू किंवा बंद करा\n• sensor values - ताजे वाचन\n• english / hindi / marathi - अलर्ट भाषा निवडा\n• language - तुमची भाषा\n• help - हा संदेश"
+    },
+    "unknown": {
+        "english": "I didn't understand that. Send 'sensor values' or type English / Hindi / Marathi to set your language.",
+        "hindi":   "मैं समझ नहीं पाया। 'sensor values' भेजें या भाषा चुनने के लिए English / हिंदी / मराठी लिखें।",
+        "marathi": "मला समजले नाही. 'sensor values' पाठवा किंवा भाषा निवडण्यासाठी English / हिंदी / मराठी लिहा."
     }
 }
 
@@ -27,15 +62,21 @@ def format_alert(moisture, vibration, tilt, lang="english"):
     return t.format(moisture=moisture, vibration=vibration, tilt=tilt)
 
 def format_sensor_values(s, lang="english"):
+    """Latest-values reply for one calibrated reading (dict)"""
     if not s:
         return translations["no_data"].get(lang, translations["no_data"]["english"])
     t = translations["sensor"].get(lang, translations["sensor"]["english"])
+
+    def value(key, fmt="{:.1f}"):
+        v = s.get(key)
+        return fmt.format(v) if isinstance(v, (int, float)) else "N/A"
+
     return t.format(
-        moisture=s.moisture,
-        vibration=s.vibration,
-        tilt=s.tilt,
-        battery=s.battery,
-        lat=s.latitude,
-        lon=s.longitude,
-        time=s.timestamp
+        moisture=value("moisture"),
+        vibration=value("vibration"),
+        tilt=value("tilt"),
+        battery=value("battery"),
+        lat=value("latitude", "{:.6f}"),
+        lon=value("longitude", "{:.6f}"),
+        time=s.get("created_at") or s.get("timestamp") or "N/A"
     )
@@ -0,0 +1,293 @@
+# metrics.py
+"""
+Prometheus-style metrics shared by the backend, the monitor and the dashboard.
+
+Counters, gauges and histograms are registered once per process on the
+module-level REGISTRY. Registering a name a second time returns the existing
+metric, so modules re-run by Streamlit do not duplicate them:
+
+    REQUESTS = counter("readings_ingested_total", "Readings accepted", ("outcome",))
+    REQUESTS.inc(len(records), outcome="stored")
+
+    LATENCY = histogram("supabase_query_duration_seconds", "...", ("query", "outcome"))
+    with LATENCY.time(query="latest_reading"):
+        ...
+
+Values that already live somewhere else (breaker state, spool size, node
+freshness) are read at scrape time by callbacks added with `collector()`.
+Such a callback returns (name, type, help, [(labels, value), ...]) tuples.
+
+render() produces the Prometheus text format. The backend serves it at
+GET /metrics. Processes without a web server (the monitor, the dashboard)
+call serve_metrics(port) to get /healthz, /readyz and /metrics from a small
+listener thread, on METRICS_HOST (127.0.0.1 unless set).
+
+Metrics are per process. Under serve.py's pre-fork, a scrape of the API port
+is answered by whichever worker takes the connection, so serve.py labels
+every sample with `worker` (constant_labels()) and also serves each worker's
+metrics on its own port, WEB_METRICS_PORT + worker index. Scrape those ports
+and sum over `worker`; each series then only goes up (until its worker
+restarts, as with any process).
+"""
+
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Seconds; covers in-memory lookups up to a slow Supabase or Twilio call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}   # label values tuple -> value
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(name suffix, labels, value) tuples"""
+        with self._lock:
+            items = list(self._values.items())
+        return [("", tuple(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block; adds outcome="ok"/"error" if that is a label"""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            if "outcome" in self.labelnames:
+                labels = dict(labels, outcome=outcome)
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, {**state, "counts": list(state["counts"])}) for key, state in self._values.items()]
+        samples = []
+        for key, state in items:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                samples.append(("_bucket", labels + (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_bucket", labels + (("le", "+Inf"),), state["count"]))
+            samples.append(("_sum", labels, state["sum"]))
+            samples.append(("_count", labels, state["count"]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = {}   # module.qualname -> callback
+        self.constant_labels = ()   # added to every sample, e.g. (("worker", "0"),)
+
+    def register(self, cls, name, help, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def collector(self, callback):
+        """Add a scrape-time callback; one re-defined by a re-run module replaces the old one"""
+        with self._lock:
+            self._collectors[f"{callback.__module__}.{callback.__qualname__}"] = callback
+        return callback
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        constant = self.constant_labels
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(constant + labels)} {_format_value(value)}")
+
+        for callback in collectors:
+            try:
+                families = list(callback())
+            except Exception as e:
+                lines.append(f"# collector {getattr(callback, '__name__', callback)} failed: {e}")
+                continue
+            for name, type_, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type_}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    labels = tuple(labels.items()) if isinstance(labels, dict) else tuple(labels)
+                    lines.append(f"{name}{_format_labels(constant + labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labelnames=()):
+    return REGISTRY.register(Counter, name, help, labelnames)
+
+
+def gauge(name, help, labelnames=()):
+    return REGISTRY.register(Gauge, name, help, labelnames)
+
+
+def histogram(name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def collector(callback):
+    return REGISTRY.collector(callback)
+
+
+def constant_labels(**labels):
+    """Label every sample this process renders (serve.py sets worker=<index>)"""
+    REGISTRY.constant_labels = tuple((name, str(value)) for name, value in labels.items())
+
+
+# Shared by every process that caches something in front of a slower source
+CACHE_REQUESTS = counter("cache_requests_total", "Cache lookups", ("cache", "result"))
+
+# Alerting, counted wherever alerts are evaluated and sent (backend and monitor)
+ALERTS_EVALUATED = counter("alerts_evaluated_total", "Readings checked against the alert thresholds")
+ALERTS_FIRED = counter("alerts_fired_total", "Readings that exceeded two or more thresholds")
+ALERTS_DELIVERED = counter("alerts_delivered_total", "Alert messages by delivery outcome", ("channel", "outcome"))
+
+
+# ---------- embedded listener ----------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._send(200, REGISTRY.render(), CONTENT_TYPE)
+        elif path == "/healthz":
+            self._send(200, json.dumps({"status": "ok"}), "application/json")
+        elif path == "/readyz":
+            ok, details = self.server.ready() if self.server.ready else (True, {})
+            body = json.dumps({"status": "ready" if ok else "not ready", **details}, default=str)
+            self._send(200 if ok else 503, body, "application/json")
+        elif path in self.server.routes:
+            self._send(200, json.dumps(self.server.routes[path](), default=str), "application/json")
+        else:
+            self._send(404, json.dumps({"status": "error", "message": "Not found"}), "application/json")
+
+    def _send(self, status, body, content_type):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass   # Scrapes every few seconds would drown the process's own output
+
+
+def serve_metrics(port, host=METRICS_HOST, ready=None, routes=None):
+    """Serve /healthz, /readyz and /metrics from a daemon thread
+
+    `ready()` returns (ok, details dict). `routes` maps extra GET paths to
+    callables returning JSON-serialisable data. Returns the server, or None
+    if port is 0 or already taken.
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, int(port)), _Handler)
+    except OSError as e:
+        print(f"⚠️ Metrics not served on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    server.ready = ready
+    server.routes = routes or {}
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,106 @@
+# node_summary.py
+"""
+Per-node summary precomputed as readings arrive.
+
+Each calibrated reading updates its node's entry (latest values, deltas,
+risk and triggering rule) once, so serving /summary is a dictionary copy
+plus a freshness calculation.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from risk import assess_risk
+
+SUMMARY_FIELDS = ("moisture", "temperature", "tilt", "vibration")
+DELTA_WINDOW = int(os.getenv("SUMMARY_DELTA_WINDOW", "3600"))   # seconds
+STALE_AFTER = int(os.getenv("SUMMARY_STALE_AFTER", "300"))       # seconds
+
+
+def _parse_timestamp(value):
+    if not value:
+        return time.time()
+    try:
+        ts = datetime.fromisoformat(str(value))
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.timestamp()
+    except ValueError:
+        return time.time()
+
+
+class NodeSummaryStore:
+    """Latest state per node, updated incrementally"""
+
+    def __init__(self, delta_window=DELTA_WINDOW):
+        self.delta_window = delta_window
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._history = {}   # node_id -> deque[(ts, values)] covering delta_window
+
+    def update(self, row):
+        """Fold one calibrated reading into its node's summary"""
+        node_id = row.get("node_id")
+        if node_id is None:
+            return
+
+        ts = _parse_timestamp(row.get("created_at"))
+        values = {field: row.get(field) for field in SUMMARY_FIELDS}
+
+        with self._lock:
+            current = self._summaries.get(node_id)
+            if current is not None and ts <= current["reading_ts"]:
+                return  # Older or repeated reading
+
+            history = self._history.setdefault(node_id, deque())
+            previous = history[-1][1] if history else None
+            history.append((ts, values))
+            while history and history[0][0] < ts - self.delta_window:
+                history.popleft()
+            oldest = history[0][1]
+
+            deltas = {}
+            for field in SUMMARY_FIELDS:
+                latest = values[field]
+                deltas[field] = {
+                    "previous": None if latest is None or previous is None or previous[field] is None
+                    else round(latest - previous[field], 2),
+                    "window": None if latest is None or oldest[field] is None
+                    else round(latest - oldest[field], 2),
+                }
+
+            self._summaries[node_id] = {
+                "node_id": node_id,
+                "latest": values,
+                "deltas": deltas,
+                "delta_window_seconds": self.delta_window,
+                "risk": assess_risk(values),
+                "packet_no": row.get("packet_no"),
+                "last_reading_at": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+                "reading_ts": ts,
+            }
+
+    def update_many(self, rows):
+        # Oldest first so deltas are built in time order
+        for row in sorted(rows, key=lambda r: _parse_timestamp(r.get("created_at"))):
+            self.update(row)
+
+    def snapshot(self):
+        """All node summaries with freshness computed now"""
+        now = time.time()
+        with self._lock:
+            summaries = [dict(s) for s in self._summaries.values()]
+
+        result = {}
+        for summary in summaries:
+            age = now - summary.pop("reading_ts")
+            summary["age_seconds"] = round(age, 1)
+            summary["stale"] = age > STALE_AFTER
+            result[str(summary["node_id"])] = summary
+        return result
+
+
+summary_store = NodeSummaryStore()
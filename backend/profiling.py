@@ -0,0 +1,273 @@
+# profiling.py
+"""
+Opt-in profiling of backend requests and monitor cycles.
+
+Off by default. While off, a hook costs one attribute check, so it can stay
+installed in production. A profile is captured for:
+
+  - a random PROFILE_RATE fraction of requests / cycles (0 = none)
+  - the next N, after profiler.arm(N): sent by SIGUSR2 (PROFILE_ON_DEMAND
+    captures) or POST /admin/profile on the backend
+
+Two modes (PROFILE_MODE):
+
+  sample    (default) a background thread samples the profiled thread's stack
+            every PROFILE_INTERVAL seconds. The profiled code itself runs
+            untouched, so concurrent requests can be profiled at once.
+            Output is folded stacks ("a;b;c <count>"), ready for
+            flamegraph.pl, speedscope or inferno.
+  cprofile  deterministic cProfile of the whole capture (one at a time;
+            captures overlapping a running one are skipped). Output is a
+            pstats .prof file (snakeviz, flameprof, `python -m pstats`).
+
+Every capture is written to PROFILE_DIR as <name>-<time>-<pid>-<n>.folded /
+.prof. Captures of the same name are also merged into
+<name>-<pid>.aggregate.folded / .prof, rewritten after each capture. Only the
+newest PROFILE_KEEP capture files are kept.
+"""
+
+import os
+import sys
+import time
+import glob
+import random
+import signal
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+)
+PROFILE_RATE = float(os.getenv("PROFILE_RATE", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))   # seconds between samples
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+PROFILE_ON_DEMAND = int(os.getenv("PROFILE_ON_DEMAND", "20"))
+
+MODES = ("sample", "cprofile")
+
+
+def _safe_name(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name).strip("_") or "profile"
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Capture:
+    __slots__ = ("name", "mode", "thread_id", "started", "samples", "profile")
+
+    def __init__(self, name, mode):
+        self.name = name
+        self.mode = mode
+        self.thread_id = threading.get_ident()
+        self.started = time.time()
+        self.samples = Counter()   # folded stack -> count (sample mode)
+        self.profile = None        # cProfile.Profile (cprofile mode)
+
+
+class Profiler:
+    def __init__(self, directory=PROFILE_DIR, rate=PROFILE_RATE, mode=PROFILE_MODE,
+                 interval=PROFILE_INTERVAL, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._active = {}             # id(capture) -> capture being sampled
+        self._sampler = None
+        self._wake = threading.Event()
+        self._cprofile_busy = threading.Lock()
+        self._aggregates = {}         # (name, mode) -> Counter | pstats.Stats
+        self._seq = 0
+        self._armed = 0
+        self.rate = 0.0
+        self.mode = "sample"
+        self.enabled = False          # rate > 0 or captures armed; the only check on the fast path
+        self.configure(rate=rate, mode=mode)
+
+    # ---------- control ----------
+    def configure(self, rate=None, mode=None):
+        """Change the sampling rate and/or mode at runtime"""
+        with self._lock:
+            if mode is not None:
+                if mode not in MODES:
+                    raise ValueError(f"mode must be one of {', '.join(MODES)}")
+                self.mode = mode
+            if rate is not None:
+                self.rate = min(max(float(rate), 0.0), 1.0)
+            self.enabled = self.rate > 0 or self._armed > 0
+
+    def arm(self, count=PROFILE_ON_DEMAND):
+        """Profile the next `count` requests / cycles regardless of the rate"""
+        with self._lock:
+            self._armed = max(int(count), 0)
+            self.enabled = self.rate > 0 or self._armed > 0
+
+    def install_signal(self, signum=getattr(signal, "SIGUSR2", None), count=PROFILE_ON_DEMAND):
+        """Arm `count` captures on `signum` (SIGUSR2; not available on Windows)"""
+        if signum is None:
+            return False
+
+        def on_signal(signum, frame):
+            # No lock: the interrupted code may hold it. Attribute stores are atomic.
+            self._armed = count
+            self.enabled = True
+            print(f"🔬 Profiling the next {count} requests / cycles")
+
+        signal.signal(signum, on_signal)
+        return True
+
+    def status(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "rate": self.rate,
+                "mode": self.mode,
+                "armed": self._armed,
+                "active": len(self._active),
+                "directory": self.directory,
+                "files": sorted(os.path.basename(p) for p in self._capture_files()),
+            }
+
+    # ---------- capture ----------
+    def start(self, name):
+        """Begin a capture if this call is selected; returns it (or None) for stop()"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._armed > 0:
+                self._armed -= 1
+                self.enabled = self.rate > 0 or self._armed > 0
+            elif random.random() >= self.rate:
+                return None
+            mode = self.mode
+
+        capture = Capture(_safe_name(name), mode)
+        if mode == "cprofile":
+            if not self._cprofile_busy.acquire(blocking=False):
+                return None   # Only one deterministic profiler can run at a time
+            capture.profile = cProfile.Profile()
+            capture.profile.enable()
+        else:
+            with self._lock:
+                self._active[id(capture)] = capture
+                self._ensure_sampler()
+            self._wake.set()
+        return capture
+
+    def stop(self, capture):
+        """End a capture from start() (None is ignored) and write it out"""
+        if capture is None:
+            return
+        if capture.mode == "cprofile":
+            capture.profile.disable()
+            self._cprofile_busy.release()
+        else:
+            with self._lock:
+                self._active.pop(id(capture), None)
+        try:
+            self._write(capture)
+        except Exception as e:
+            print(f"⚠️ Could not write profile {capture.name}: {e}")
+
+    @contextmanager
+    def profile(self, name):
+        capture = self.start(name)
+        try:
+            yield capture
+        finally:
+            self.stop(capture)
+
+    # ---------- sampling ----------
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            self._wake.clear()   # Before looking, so a capture started meanwhile wakes us
+            with self._lock:
+                captures = list(self._active.values())
+            if not captures:
+                self._wake.wait()
+                continue
+
+            frames = sys._current_frames()
+            stacks = []
+            for capture in captures:
+                frame = frames.get(capture.thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    stacks.append((capture, ";".join(reversed(stack))))
+            del frames
+            with self._lock:
+                for capture, stack in stacks:
+                    if id(capture) in self._active:   # Not stopped (and being written) meanwhile
+                        capture.samples[stack] += 1
+            time.sleep(self.interval)
+
+    # ---------- output ----------
+    def _capture_files(self):
+        return [p for p in glob.glob(os.path.join(self.directory, "*"))
+                if p.endswith((".folded", ".prof")) and ".aggregate." not in p]
+
+    def _write(self, capture):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._seq += 1
+            stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(capture.started))
+            base = os.path.join(self.directory, f"{capture.name}-{stamp}-{os.getpid()}-{self._seq}")
+            aggregate_path = os.path.join(self.directory, f"{capture.name}-{os.getpid()}.aggregate")
+
+            if capture.mode == "cprofile":
+                capture.profile.dump_stats(base + ".prof")
+                aggregate = self._aggregates.get((capture.name, "cprofile"))
+                if aggregate is None:
+                    aggregate = self._aggregates[(capture.name, "cprofile")] = pstats.Stats(capture.profile)
+                else:
+                    aggregate.add(capture.profile)
+                aggregate.dump_stats(aggregate_path + ".prof")
+            else:
+                if not capture.samples:
+                    return   # Finished before the first sample
+                self._write_folded(base + ".folded", capture.samples)
+                aggregate = self._aggregates.setdefault((capture.name, "sample"), Counter())
+                aggregate.update(capture.samples)
+                self._write_folded(aggregate_path + ".folded", aggregate)
+
+            self._prune()
+
+    @staticmethod
+    def _write_folded(path, samples):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp, path)
+
+    def _prune(self):
+        files = self._capture_files()
+        if len(files) <= self.keep:
+            return
+        def mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except FileNotFoundError:
+                return 0
+        for path in sorted(files, key=mtime)[:len(files) - self.keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass   # Pruned by another process
+
+
+profiler = Profiler()
@@ -0,0 +1,63 @@
+# risk.py
+"""
+Landslide thresholds and risk rules shared by the backend, the alert monitor
+and the dashboard.
+
+A reading exceeds a threshold when its calibrated value is above it
+(moisture %, vibration deg/s, tilt degrees). Two or more exceeded thresholds
+trigger an alert and are CRITICAL; one is a WARNING. check_thresholds() and
+assess_risk() agree by construction, so a reading the monitor alerts on is
+CRITICAL on the dashboard and in /summary.
+"""
+
+import os
+
+MOISTURE_THRESHOLD = float(os.getenv("MOISTURE_THRESHOLD", "80"))
+VIBRATION_THRESHOLD = float(os.getenv("VIBRATION_THRESHOLD", "10"))
+TILT_THRESHOLD = float(os.getenv("TILT_THRESHOLD", "10"))
+
+THRESHOLDS = {
+    "moisture": MOISTURE_THRESHOLD,
+    "vibration": VIBRATION_THRESHOLD,
+    "tilt": TILT_THRESHOLD,
+}
+ALERT_MIN_EXCEEDED = 2
+
+NORMAL = ("NORMAL", None, "All sensors within safe range")
+
+
+def exceeded(values):
+    """{field: True if the value is above its threshold}"""
+    return {field: (values.get(field) or 0) > limit for field, limit in THRESHOLDS.items()}
+
+
+def check_thresholds(values):
+    """Alert decision for calibrated sensor values
+
+    Returns should_alert, exceeded_count, and <field>_exceeded /
+    <field>_value for moisture, vibration and tilt.
+    """
+    over = exceeded(values)
+    result = {
+        "should_alert": sum(over.values()) >= ALERT_MIN_EXCEEDED,
+        "exceeded_count": sum(over.values()),
+    }
+    for field in THRESHOLDS:
+        result[f"{field}_exceeded"] = over[field]
+        result[f"{field}_value"] = values.get(field) or 0
+    return result
+
+
+def assess_risk(values):
+    """Return {"level", "rule", "description"} for calibrated sensor values
+
+    The rule names the exceeded thresholds, e.g. "moisture+tilt".
+    """
+    over = [field for field, hit in exceeded(values).items() if hit]
+    if len(over) >= ALERT_MIN_EXCEEDED:
+        return {"level": "CRITICAL", "rule": "+".join(over),
+                "description": f"High {' + '.join(over)} detected"}
+    if over:
+        return {"level": "WARNING", "rule": over[0], "description": f"Elevated {over[0]}"}
+    level, rule, description = NORMAL
+    return {"level": level, "rule": rule, "description": description}
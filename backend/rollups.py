@@ -0,0 +1,123 @@
+# rollups.py
+"""
+Multi-resolution rollups of sensor readings (1 minute, 15 minutes, 1 hour).
+
+A rollup row holds mergeable partial aggregates for one node and bucket:
+min, max, sum, count and last (with the time of the last reading) per field.
+The archive writes partial rows for every batch it stores, so rollups stay
+current as data arrives. Rows for the same bucket are combined at read time
+and by compaction. Any bucket that is a multiple of a rollup resolution can
+be answered from that rollup instead of the raw readings.
+"""
+
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:   # Only the bucket helpers work without pyarrow
+    pa = pc = None
+
+SENSOR_FIELDS = ("moisture", "temperature", "tilt", "vibration")
+
+# name -> bucket seconds, finest first
+RESOLUTIONS = {"1m": 60, "15m": 900, "1h": 3600}
+
+# Days kept per resolution (0 keeps forever)
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "90"))
+ROLLUP_RETENTION_DAYS = {
+    "1m": int(os.getenv("ROLLUP_1M_RETENTION_DAYS", "365")),
+    "15m": int(os.getenv("ROLLUP_15M_RETENTION_DAYS", "1825")),
+    "1h": int(os.getenv("ROLLUP_1H_RETENTION_DAYS", "0")),
+}
+
+PARTIAL_OPS = ("min", "max", "sum", "count")
+TIMESTAMP = pa.timestamp("us", tz="UTC") if pa else None
+
+
+def rollup_schema(fields=SENSOR_FIELDS):
+    columns = [("node_id", pa.int64()), ("bucket", TIMESTAMP), ("last_at", TIMESTAMP)]
+    for field in fields:
+        columns += [
+            (f"{field}_min", pa.float64()), (f"{field}_max", pa.float64()),
+            (f"{field}_sum", pa.float64()), (f"{field}_count", pa.int64()),
+            (f"{field}_last", pa.float64()),
+        ]
+    return pa.schema(columns)
+
+
+def _bucket_column(times, seconds):
+    bucket_us = seconds * 1_000_000
+    epoch_us = pc.cast(times, pa.int64())
+    return pc.cast(pc.multiply(pc.divide(epoch_us, bucket_us), bucket_us), TIMESTAMP)
+
+
+def partial_rollup(table, seconds, fields=SENSOR_FIELDS):
+    """Partial aggregates of raw readings (node_id, created_at, fields) per node and bucket"""
+    table = table.append_column("bucket", _bucket_column(table["created_at"], seconds))
+    table = table.sort_by("created_at")
+    aggregations = [("created_at", "max")]
+    for field in fields:
+        aggregations += [(field, op) for op in PARTIAL_OPS] + [(field, "last")]
+    result = table.group_by(["node_id", "bucket"], use_threads=False).aggregate(aggregations)
+    result = result.rename_columns([
+        "last_at" if name == "created_at_max" else name for name in result.column_names
+    ])
+    return result.select(rollup_schema(fields).names).cast(rollup_schema(fields))
+
+
+def merge_partials(table, seconds, fields=SENSOR_FIELDS):
+    """Combine partial rows into buckets of `seconds` (a multiple of their resolution)"""
+    table = table.set_column(
+        table.schema.get_field_index("bucket"), "bucket", _bucket_column(table["bucket"], seconds)
+    )
+    table = table.sort_by("last_at")
+    aggregations = [("last_at", "max")]
+    for field in fields:
+        aggregations += [
+            (f"{field}_min", "min"), (f"{field}_max", "max"),
+            (f"{field}_sum", "sum"), (f"{field}_count", "sum"),
+            (f"{field}_last", "last"),
+        ]
+    result = table.group_by(["node_id", "bucket"], use_threads=False).aggregate(aggregations)
+    result = result.rename_columns([
+        name.rsplit("_", 1)[0] if name != "node_id" and name != "bucket" else name
+        for name in result.column_names
+    ])
+    return result.select(rollup_schema(fields).names).cast(rollup_schema(fields))
+
+
+def finalize(table, fields=SENSOR_FIELDS):
+    """min/max/mean/count/last columns from partial aggregates"""
+    columns = {"node_id": table["node_id"], "bucket": table["bucket"]}
+    for field in fields:
+        count = table[f"{field}_count"]
+        columns[f"{field}_min"] = table[f"{field}_min"]
+        columns[f"{field}_max"] = table[f"{field}_max"]
+        columns[f"{field}_mean"] = pc.divide(
+            table[f"{field}_sum"], pc.if_else(pc.equal(count, 0), None, pc.cast(count, pa.float64()))
+        )
+        columns[f"{field}_count"] = count
+        columns[f"{field}_last"] = table[f"{field}_last"]
+    return pa.table(columns).sort_by([("node_id", "ascending"), ("bucket", "ascending")])
+
+
+def bucket_for_points(span_seconds, points):
+    """Smallest bucket giving at most `points` buckets over the span, rounded
+    up to a rollup resolution (or whole hours) once it reaches one minute"""
+    bucket = max(-(-int(span_seconds) // max(int(points), 1)), 1)
+    if bucket < RESOLUTIONS["1m"]:
+        return bucket
+    for seconds in RESOLUTIONS.values():
+        if bucket <= seconds:
+            return seconds
+    hour = RESOLUTIONS["1h"]
+    return -(-bucket // hour) * hour
+
+
+def candidate_resolutions(bucket_seconds):
+    """Rollups able to answer buckets of this size, coarsest first"""
+    return [
+        name for name, seconds in reversed(RESOLUTIONS.items())
+        if bucket_seconds % seconds == 0
+    ]
@@ -0,0 +1,41 @@
+-- schema.sql
+-- Run in the Supabase SQL editor; every statement is safe to re-run.
+
+-- Derived values, computed once at ingest (POST /sensor-data).
+-- Readers calibrate rows that predate these columns (calibration.with_derived).
+alter table sensor_readings add column if not exists vibration real;   -- deg/s
+alter table sensor_readings add column if not exists tilt real;        -- degrees
+
+-- Language preferences are saved one changed field at a time
+-- (language_prefs.py), so a user who only chose a language is inserted with
+-- this default: nobody is subscribed without sending "subscribe".
+alter table user_prefs alter column subscribed set default false;
+-- Radio link quality, stored when the gateway reports it
+alter table sensor_readings add column if not exists rssi real;        -- dBm
+alter table sensor_readings add column if not exists snr real;         -- dB
+
+-- Every node that has ever reported, with its newest position (GET /nodes and
+-- monitor node discovery). The index keeps it one short scan per node.
+create index if not exists sensor_readings_node_created on sensor_readings (node_id, created_at desc);
+
+create or replace function sensor_nodes()
+returns table (
+    node_id sensor_readings.node_id%type,
+    latitude sensor_readings.latitude%type,
+    longitude sensor_readings.longitude%type,
+    last_seen sensor_readings.created_at%type
+)
+language sql stable as $$
+    select distinct on (r.node_id) r.node_id, r.latitude, r.longitude, r.created_at
+    from sensor_readings r
+    where r.node_id is not null
+    order by r.node_id, r.created_at desc
+$$;
+
+-- Conflict key for spool replay (Database.upsert_readings). packet_no restarts
+-- when a node reboots, so the reading's timestamp is part of the key. Ingest
+-- stamps created_at before a reading is stored or spooled, so a replayed row
+-- matches its earlier copy exactly. Any existing exact duplicates have to be
+-- removed before this index can be built.
+create unique index if not exists sensor_readings_node_packet_time
+    on sensor_readings (node_id, packet_no, created_at);
@@ -0,0 +1,242 @@
+# serve.py
+"""
+Production server for the backend API.
+
+    python serve.py --workers 4 --threads 8 --port 5000
+
+WEB_WORKERS processes (pre-forked, sharing one listening socket) each serve
+requests on a pool of WEB_THREADS threads. With one worker (the default, and
+the only option on Windows) no process is forked. Every worker builds its own
+app, so each has its own Supabase and Twilio clients. Every worker replays
+the offline spool (see spool.py). Worker 0 also maintains the archive. A
+worker that dies is restarted.
+
+With several workers, /metrics on the API port is answered by any one of
+them. Every sample carries a `worker` label, and worker i also serves
+/healthz, /readyz and /metrics on WEB_METRICS_PORT + i (127.0.0.1 unless
+METRICS_HOST is set), so Prometheus can scrape each worker and sum over
+`worker`. WEB_METRICS_PORT=0 turns those listeners off.
+
+SIGUSR2 (forwarded to every worker) profiles the next requests; see
+profiling.py.
+
+On SIGTERM or Ctrl+C, workers stop accepting connections and let in-flight
+requests finish (up to WEB_DRAIN_TIMEOUT seconds). They then flush the archive
+and unsaved language preferences, and exit.
+
+Some state is still kept per worker. /summary and /nodes/health show only
+the readings that worker received, so with several workers they differ from
+request to request. Each worker holds its own copy of the language
+preferences. Workers announce changes to each other over UDP
+(LANGUAGE_PREFS_WORKER_PORT + index) and look up a phone they do not know
+in the table, so a copy can lag by a moment, but saves only touch the fields
+a worker changed. Each worker also buffers archive writes for up to
+ARCHIVE_FLUSH_SECONDS, so GET /sensor-data only answers from the archive for
+readings older than twice that, and asks Supabase for anything newer. The webhook dedupe ids and rate limits are shared through
+a SQLite file (see webhook_guard.py). With WEBHOOK_DEDUPE_DIR=off they are
+per worker too: a Twilio retry that reaches another worker is processed
+twice, and each sender's rate limit is multiplied by the number of workers.
+"""
+
+import os
+import time
+import signal
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+WEB_HOST = os.getenv("WEB_HOST", "127.0.0.1")
+WEB_PORT = int(os.getenv("WEB_PORT", "5000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+WEB_DRAIN_TIMEOUT = float(os.getenv("WEB_DRAIN_TIMEOUT", "30"))
+WEB_METRICS_PORT = int(os.getenv("WEB_METRICS_PORT", "9110"))   # + worker index
+RESTART_DELAY = 1.0
+
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection, so idle keep-alive clients never hold a thread
+    protocol_version = "HTTP/1.0"
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server handling requests on a fixed pool of threads"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=WEB_THREADS, fd=None, multiprocess=False):
+        self.multiprocess = multiprocess
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self._slots = threading.BoundedSemaphore(threads)
+        self.socket.setblocking(False)   # Workers race for connections; losers go back to select()
+
+    def _handle_request_noblock(self):
+        # Take a connection only while a thread is free, so a busy worker leaves it to an idle one
+        if not self._slots.acquire(timeout=0.05):
+            return
+        try:
+            request, client_address = self.get_request()
+        except OSError:
+            self._slots.release()   # Accepted by another worker
+            return
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def drain(self, timeout=WEB_DRAIN_TIMEOUT):
+        """Stop accepting, then wait for in-flight requests; False if some were cut off"""
+        self.shutdown()   # Returns once serve_forever() has stopped
+        deadline = time.monotonic() + timeout
+        for _ in range(self.threads):
+            if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                return False
+        self._pool.shutdown(wait=False)
+        return True
+
+
+def run_worker(index, host, port, threads, drain_timeout, fd=None, multiprocess=False, workers=1):
+    """Serve until SIGTERM/SIGINT, then drain and flush"""
+    import app as backend
+    from metrics import constant_labels, serve_metrics
+    from language_prefs import use_worker_ports
+
+    if multiprocess:
+        constant_labels(worker=index)   # Series from different workers stay apart
+        use_worker_ports(index, workers)   # Preference changes reach the other workers
+    application = backend.create_app({"PRIMARY_WORKER": index == 0, "WORKERS": workers})
+    if multiprocess and WEB_METRICS_PORT:
+        serve_metrics(WEB_METRICS_PORT + index)
+    server = PooledWSGIServer(host, port, application, threads, fd=fd, multiprocess=multiprocess)
+    drained = threading.Event()
+
+    def drain():
+        if not server.drain(drain_timeout):
+            print(f"Worker {index}: drain timed out, in-flight requests cut off")
+        drained.set()
+
+    def on_signal(signum, frame):
+        if not getattr(on_signal, "called", False):
+            on_signal.called = True
+            threading.Thread(target=drain, name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    from profiling import profiler
+    profiler.install_signal()
+
+    print(f"Worker {index} (pid {os.getpid()}) serving on http://{host}:{port} with {threads} threads")
+    server.serve_forever()
+    drained.wait()
+    try:
+        backend.shutdown()
+    finally:
+        server.server_close()
+    print(f"Worker {index} stopped")
+
+
+def run_prefork(host, port, workers, threads, drain_timeout):
+    """Fork `workers` processes on one listening socket and keep them running"""
+    listener = socket.create_server((host, port), backlog=128)
+    listener.set_inheritable(True)
+    children = {}   # pid -> worker index
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(index, host, port, threads, drain_timeout, fd=listener.fileno(),
+                           multiprocess=True, workers=workers)
+            except BaseException as e:
+                print(f"Worker {index} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def on_signal(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def forward(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGUSR2, forward)   # Profile the next requests in every worker
+
+    print(f"Serving on http://{host}:{port} with {workers} workers x {threads} threads")
+    for index in range(workers):
+        spawn(index)
+
+    deadline = None
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping:
+                deadline = deadline or time.monotonic() + drain_timeout + 5
+                if time.monotonic() > deadline:
+                    for pid in list(children):
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+            time.sleep(0.2)
+            continue
+
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(RESTART_DELAY)
+            spawn(index)
+
+    listener.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the TerraShield backend API")
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS, help="processes (pre-forked)")
+    parser.add_argument("--threads", type=int, default=WEB_THREADS, help="request threads per process")
+    parser.add_argument("--drain-timeout", type=float, default=WEB_DRAIN_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    workers = max(args.workers, 1)
+    if workers > 1 and not hasattr(os, "fork"):
+        print("Several workers need os.fork(); serving with one worker")
+        workers = 1
+
+    # Load the app's modules once, before forking (no clients are created yet)
+    import app
+
+    if workers == 1:
+        run_worker(0, args.host, args.port, max(args.threads, 1), args.drain_timeout)
+    else:
+        run_prefork(args.host, args.port, workers, max(args.threads, 1), args.drain_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,305 @@
 # simulate.py
-import requests
-import random
+"""
+Load generator: thousands of virtual sensor nodes posting to the backend.
+
+Every node is an asyncio task sending packets in the real sensor_readings
+schema (node_id, packet_no, raw ax..gz counts, soil_raw, temperature,
+position, rssi, snr, created_at) to POST /sensor-data every --interval
+seconds. Start times and jitter are randomised, so the load is spread out.
+
+    python simulate.py --nodes 2000 --interval 5 --duration 120
+    python simulate.py --nodes 50 --scenario rain,creep --affected 0.2 --loss 0.05 --reorder 0.02
+
+Scenarios apply to a seeded --affected fraction of nodes:
+  rain    soil moisture ramps from dry to saturated over --ramp seconds
+  creep   the slope tilts steadily, up to 25 degrees after --ramp seconds
+  tremor  bursts of strong gyroscope activity lasting a few packets
+Link impairments apply to every node:
+  --loss     fraction of packets never sent (packet_no still advances)
+  --reorder  fraction of packets held back and sent after the next one
+
+The same --seed gives the same nodes, scenarios and packet stream.
+
+Every --report seconds, and at the end, the generator prints:
+  - target and achieved packets/s
+  - ingest errors by kind
+  - packets the backend spooled
+  - response latency percentiles
+  - send lag: how far behind schedule packets got a connection, and how
+    many are still queued for one
+At most --concurrency requests are open at once. If lag and the queue grow
+while latency stays flat, the generator is the limit: raise --concurrency,
+or run several generators with different --first-node values. If latency
+grows with them, the backend is the limit.
+"""
+
+import os
+import math
 import time
-from datetime import datetime
-
-# URL of your backend endpoint
-URL = "http://127.0.0.1:5000/sensor-data"
-
-while True:
-    # Generate random readings
-    data = {
-        "moisture": random.uniform(0, 100),
-        "vibration": random.uniform(0, 10),
-        "tilt": random.uniform(0, 30),
-        "battery": random.uniform(70, 100),
-        "latitude": 28.6139,   # fixed location
-        "longitude": 77.2090,
-        "timestamp": datetime.now().isoformat()
-    }
+import random
+import asyncio
+import argparse
+from collections import Counter
+from datetime import datetime, timezone
 
-    try:
-        resp = requests.post(URL, json=data)
-        if resp.status_code == 200:
-            print("✅ Simulated data sent successfully:", data)
+import httpx
+
+SIM_URL = os.getenv("SIM_URL", "http://127.0.0.1:5000/sensor-data")
+BASE_LAT, BASE_LON = 19.198088, 72.827102
+SCENARIOS = ("rain", "creep", "tremor")
+
+ACCEL_COUNTS_PER_G = 16384   # MPU6050 +-2g (calibration defaults)
+GYRO_COUNTS_PER_DPS = 131    # MPU6050 +-250 deg/s
+SOIL_DRY, SOIL_WET = 3300, 1350
+MAX_CREEP_DEG = 25.0
+LATENCY_SAMPLE = 100000      # latencies kept for the final percentiles
+
+
+class VirtualNode:
+    """One sensor node's state; packet() advances it by one transmission"""
+
+    def __init__(self, node_id, rng, scenarios, ramp_seconds):
+        self.node_id = node_id
+        self.rng = rng
+        self.scenarios = scenarios
+        self.ramp_seconds = ramp_seconds
+        self.packet_no = 0
+        self.latitude = BASE_LAT + rng.uniform(-0.05, 0.05)
+        self.longitude = BASE_LON + rng.uniform(-0.05, 0.05)
+        self.soil_base = rng.uniform(2900, SOIL_DRY)
+        self.temperature = rng.uniform(22, 32)
+        self.tilt_base = rng.uniform(0, 3)          # degrees, as installed
+        self.azimuth = rng.uniform(0, 2 * math.pi)  # direction the slope leans
+        self.rssi = rng.uniform(-110, -70)
+        self.tremor_left = 0                        # packets left in a tremor burst
+
+    def packet(self, elapsed):
+        rng = self.rng
+        self.packet_no += 1
+        progress = min(elapsed / self.ramp_seconds, 1.0) if self.ramp_seconds > 0 else 1.0
+
+        soil = self.soil_base
+        if "rain" in self.scenarios:
+            soil -= (self.soil_base - SOIL_WET) * progress
+
+        tilt = self.tilt_base + (MAX_CREEP_DEG * progress if "creep" in self.scenarios else 0.0)
+        theta = math.radians(tilt)
+        horizontal = math.sin(theta) * ACCEL_COUNTS_PER_G
+
+        gyro_dps = 0.3
+        if "tremor" in self.scenarios:
+            if self.tremor_left == 0 and rng.random() < 0.05:
+                self.tremor_left = rng.randint(2, 6)
+            if self.tremor_left:
+                self.tremor_left -= 1
+                gyro_dps = rng.uniform(15, 60)
+
+        def noise(counts):
+            return int(round(counts + rng.gauss(0, 40)))
+
+        return {
+            "node_id": self.node_id,
+            "packet_no": self.packet_no,
+            "ax": noise(horizontal * math.cos(self.azimuth)),
+            "ay": noise(horizontal * math.sin(self.azimuth)),
+            "az": noise(math.cos(theta) * ACCEL_COUNTS_PER_G),
+            "gx": noise(rng.gauss(0, gyro_dps) * GYRO_COUNTS_PER_DPS),
+            "gy": noise(rng.gauss(0, gyro_dps) * GYRO_COUNTS_PER_DPS),
+            "gz": noise(rng.gauss(0, gyro_dps) * GYRO_COUNTS_PER_DPS),
+            "soil_raw": int(min(max(soil + rng.gauss(0, 25), 0), 4095)),
+            "temperature": round(self.temperature + rng.gauss(0, 0.3), 2),
+            "latitude": round(self.latitude, 6),
+            "longitude": round(self.longitude, 6),
+            "rssi": round(self.rssi + rng.gauss(0, 3), 1),
+            "snr": round(rng.gauss(7, 2.5), 1),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+
+class Stats:
+    def __init__(self, seed):
+        self.started = time.monotonic()
+        self.rng = random.Random(seed)
+        self.totals = Counter()
+        self.window = Counter()
+        self.window_latencies = []
+        self.latencies = []   # reservoir sample over the whole run
+        self.seen = 0
+        self.lag = 0.0
+        self.window_lag = 0.0
+        self.queued = 0       # packets waiting for a free connection
+
+    def record(self, outcome, latency=None, lag=0.0):
+        self.totals[outcome] += 1
+        self.window[outcome] += 1
+        self.window_lag = max(self.window_lag, lag)
+        self.lag = max(self.lag, lag)
+        if latency is None:
+            return
+        self.window_latencies.append(latency)
+        self.seen += 1
+        if len(self.latencies) < LATENCY_SAMPLE:
+            self.latencies.append(latency)
         else:
-            print("⚠️ Error sending data:", resp.status_code, resp.text)
-    except Exception as e:
-        print("❌ Exception while sending data:", e)
+            index = self.rng.randrange(self.seen)
+            if index < LATENCY_SAMPLE:
+                self.latencies[index] = latency
+
+    @staticmethod
+    def _percentiles(latencies):
+        if not latencies:
+            return "-"
+        ordered = sorted(latencies)
+        pick = lambda p: ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000
+        return f"p50 {pick(0.5):.0f}ms p95 {pick(0.95):.0f}ms p99 {pick(0.99):.0f}ms"
+
+    def _line(self, counts, seconds, target, latencies, lag):
+        sent = sum(v for k, v in counts.items() if k != "dropped")
+        errors = sum(v for k, v in counts.items() if k not in ("ok", "spooled", "dropped"))
+        kinds = ", ".join(f"{k} {v}" for k, v in sorted(counts.items()) if k not in ("ok", "spooled", "dropped"))
+        return (
+            f"{sent / seconds:8.1f} pkt/s (target {target:.1f}) | "
+            f"errors {errors / sent * 100 if sent else 0:.2f}%{f' ({kinds})' if kinds else ''} | "
+            f"spooled {counts['spooled']} | dropped {counts['dropped']} | "
+            f"{self._percentiles(latencies)} | max lag {lag:.2f}s | queued {self.queued}"
+        )
+
+    def report(self, seconds, target):
+        line = self._line(self.window, seconds, target, self.window_latencies, self.window_lag)
+        self.window = Counter()
+        self.window_latencies = []
+        self.window_lag = 0.0
+        return line
+
+    def summary(self, target):
+        return self._line(self.totals, time.monotonic() - self.started, target, self.latencies, self.lag)
+
+
+async def send(client, url, packet, stats, gate, scheduled):
+    loop = asyncio.get_running_loop()
+    stats.queued += 1
+    async with gate:
+        stats.queued -= 1
+        lag = loop.time() - scheduled
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, json=packet)
+        except httpx.TimeoutException:
+            stats.record("timeout", lag=lag)
+            return
+        except httpx.HTTPError as e:
+            stats.record(type(e).__name__, lag=lag)
+            return
+    latency = time.perf_counter() - started
+    if response.status_code != 200:
+        stats.record(f"http_{response.status_code}", latency, lag)
+        return
+    try:
+        spooled = bool(response.json().get("spooled"))
+    except ValueError:
+        spooled = False
+    stats.record("spooled" if spooled else "ok", latency, lag)
+
+
+async def run_node(node, args, client, stats, gate, deadline):
+    rng = node.rng
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    next_at = started + rng.uniform(0, args.interval)   # Spread the first packets out
+    held = None                                          # packet held back for reordering
+    in_flight = set()
+
+    while next_at < deadline:
+        await asyncio.sleep(max(next_at - loop.time(), 0))
+        scheduled = next_at
+        packet = node.packet(loop.time() - started)
+        next_at += args.interval * rng.uniform(0.9, 1.1)
+
+        if rng.random() < args.loss:
+            stats.record("dropped")
+            continue
+        if held is None and rng.random() < args.reorder:
+            held = packet
+            continue
+
+        for outgoing in (packet, held) if held is not None else (packet,):
+            task = asyncio.create_task(send(client, args.url, outgoing, stats, gate, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        held = None
+
+    if held is not None:
+        await send(client, args.url, held, stats, gate, loop.time())
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+async def run(args):
+    scenarios = {s.strip() for s in args.scenario.split(",") if s.strip()}
+    unknown = scenarios - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(sorted(unknown))} (choose from {', '.join(SCENARIOS)})")
+
+    nodes = []
+    for node_id in range(args.first_node, args.first_node + args.nodes):
+        rng = random.Random(f"{args.seed}:{node_id}")
+        affected = scenarios if rng.random() < args.affected else set()
+        nodes.append(VirtualNode(node_id, rng, affected, args.ramp))
+
+    target = args.nodes / args.interval
+    affected_count = sum(1 for n in nodes if n.scenarios)
+    print(f"🚀 {args.nodes} nodes -> {args.url}, ~{target:.1f} pkt/s for {args.duration:.0f}s "
+          f"(scenarios: {', '.join(sorted(scenarios)) or 'none'} on {affected_count} nodes, "
+          f"loss {args.loss:.0%}, reorder {args.reorder:.0%}, seed {args.seed})")
+
+    stats = Stats(args.seed)
+    # Requests wait on the semaphore rather than inside httpx's pool, which
+    # slows down badly with thousands of waiters
+    gate = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        deadline = asyncio.get_running_loop().time() + args.duration
+        tasks = [asyncio.create_task(run_node(node, args, client, stats, gate, deadline)) for node in nodes]
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(args.report)
+                print(f"[{time.strftime('%H:%M:%S')}] {stats.report(args.report, target)}")
+
+        report_task = asyncio.create_task(reporter())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            report_task.cancel()
+            print(f"📊 Total: {stats.summary(target)}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many TerraShield sensor nodes")
+    parser.add_argument("--url", default=SIM_URL, help="POST /sensor-data endpoint")
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--first-node", type=int, default=1, help="node_id of the first virtual node")
+    parser.add_argument("--interval", type=float, default=30.0, help="seconds between packets per node")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to run")
+    parser.add_argument("--scenario", default="", help=f"comma separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--affected", type=float, default=0.1, help="fraction of nodes in the scenarios")
+    parser.add_argument("--ramp", type=float, default=600.0, help="seconds for rain / creep to peak")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of packets lost")
+    parser.add_argument("--reorder", type=float, default=0.0, help="fraction of packets delivered late")
+    parser.add_argument("--seed", default="terrashield")
+    parser.add_argument("--concurrency", type=int, default=200, help="max open connections")
+    parser.add_argument("--timeout", type=float, default=10.0, help="request timeout (seconds)")
+    parser.add_argument("--report", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    if args.nodes < 1 or args.interval <= 0:
+        parser.error("--nodes must be at least 1 and --interval positive")
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped")
+
 
-    # Wait 30 seconds before sending next data
-    time.sleep(30)
+if __name__ == "__main__":
+    main()
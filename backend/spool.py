@@ -0,0 +1,351 @@
+# spool.py
+"""
+Local spool for readings that could not be written to Supabase.
+
+When an insert fails, ingest appends the records here instead of dropping
+them. Once the database answers again, the spool is replayed in bulk.
+
+On disk, SPOOL_DIR holds numbered segment files, each a sequence of frames:
+
+    <u32 payload length> <u32 crc32 of payload> <payload: JSON list of records>
+
+One frame is written per append. Concurrent appends share fsyncs (group
+commit), and each append returns only after its frame is durable. A
+segment is sealed at SPOOL_SEGMENT_BYTES, or SPOOL_SEAL_SECONDS after it was
+opened, and a new one started. Readers stop at a short or corrupt last frame,
+so a torn write after a crash costs only that frame. A checksum mismatch with
+more data after it is corruption, not a torn tail: replay sends the frames
+before it and moves the segment to SPOOL_DIR/quarantine/ as <name>.corrupt,
+keeping the frames after it for inspection.
+
+Each process writes its own segments (the writer's pid is part of the name)
+and holds a shared lock on its active segment. Replay skips segments locked
+by a live writer, so several backend workers can share SPOOL_DIR. Every
+worker runs a replayer. It seals its own idle segment on the timer, even
+when nothing more is appended, and replays it along with any unlocked
+segment. A replayer takes an exclusive lock on each segment before sending
+it, so no segment is sent by two workers at once.
+
+Replay sends segments oldest first, in batches of SPOOL_REPLAY_BATCH rows
+read from disk as they are sent. At most SPOOL_REPLAY_CONCURRENCY uploads
+are in flight. They are acknowledged in spool order, and nothing new is
+sent after a failure. A segment is deleted only after all of its batches
+are acknowledged. Uploads are upserts that ignore rows already present on
+(node_id, packet_no, created_at), so a segment sent twice (after a crash or
+a partial failure) is not duplicated. A node that reboots and restarts
+packet_no still gets its new readings stored. The unique index this needs is
+in schema.sql.
+
+A segment the database rejects outright (is_rejected(error) is true, e.g. a
+400 for an unknown column) would fail the same way on every retry and block
+every segment after it. It is moved to the quarantine as <name>.rejected and
+replay goes on with the next segment. spool_segments_quarantined_total counts
+both cases.
+"""
+
+import os
+import json
+import zlib
+import glob
+import time
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import counter
+
+try:
+    import fcntl
+except ImportError:   # Windows: a single backend process owns the spool
+    fcntl = None
+
+SPOOL_DIR = os.getenv(
+    "SPOOL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "spool")
+)
+SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+REPLAY_BATCH = int(os.getenv("SPOOL_REPLAY_BATCH", "500"))
+REPLAY_CONCURRENCY = int(os.getenv("SPOOL_REPLAY_CONCURRENCY", "4"))
+REPLAY_INTERVAL = float(os.getenv("SPOOL_REPLAY_INTERVAL", "15"))
+SEAL_SECONDS = float(os.getenv("SPOOL_SEAL_SECONDS", "60"))
+
+HEADER = struct.Struct("<II")
+
+QUARANTINED = counter("spool_segments_quarantined_total", "Spool segments set aside instead of replayed", ("reason",))
+
+
+class CorruptSegment(Exception):
+    """A frame failed its checksum with more data after it"""
+
+
+def read_frames(path):
+    """Yield the record lists stored in one segment, stopping at a torn last frame
+
+    Raises CorruptSegment for a bad frame that is not the last one.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length, checksum = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return   # Torn tail
+            if zlib.crc32(payload) != checksum:
+                if f.tell() < size:
+                    raise CorruptSegment(f"{os.path.basename(path)}: bad frame at byte {f.tell() - length - HEADER.size}")
+                return   # Torn tail
+            yield json.loads(payload)
+
+
+class Spool:
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=SEGMENT_BYTES, seal_seconds=SEAL_SECONDS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.seal_seconds = seal_seconds
+        self._lock = threading.Lock()        # file writes and rotation
+        self._sync_lock = threading.Lock()   # one fsync at a time; waiters piggyback
+        self._replay_lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+        self._written = 0   # frames written
+        self._synced = 0    # frames known durable
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    # ---------- segments ----------
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, "*.seg")))
+
+    def _next_segment_path(self):
+        segments = self.segments()
+        last = int(os.path.basename(segments[-1]).split(".")[0].split("-")[0]) if segments else 0
+        return os.path.join(self.directory, f"{last + 1:012d}-{os.getpid()}.seg")
+
+    def _open_segment(self):
+        self._file = open(self._next_segment_path(), "ab")
+        self._opened_at = time.monotonic()
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_SH)   # Released when the segment is sealed
+
+    def _seal(self):
+        """Close the active segment (lock held); later appends start a new one"""
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._synced = self._written
+
+    def seal_expired(self):
+        """Seal the active segment once it is seal_seconds old; True if it was sealed"""
+        with self._lock:
+            if self._file is None or time.monotonic() - self._opened_at < self.seal_seconds:
+                return False
+            self._seal()
+            return True
+
+    def pending(self):
+        return bool(self.segments())
+
+    def backlog(self):
+        """(segments, bytes) waiting to be replayed"""
+        segments = self.segments()
+        size = 0
+        for path in segments:
+            try:
+                size += os.path.getsize(path)
+            except FileNotFoundError:
+                pass   # Replayed meanwhile
+        return len(segments), size
+
+    # ---------- writing ----------
+    def append(self, records):
+        """Durably append a batch of records (returns after fsync)"""
+        if not records:
+            return
+        payload = json.dumps(records, separators=(",", ":"), default=str).encode("utf-8")
+        frame = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._file is None:
+                self._open_segment()
+            self._file.write(frame)
+            self._written += 1
+            target = self._written
+            if self._file.tell() >= self.segment_bytes or time.monotonic() - self._opened_at >= self.seal_seconds:
+                self._seal()
+
+        self._sync(target)
+
+    def _sync(self, target):
+        with self._sync_lock:
+            if self._synced >= target:
+                return   # Covered by another writer's fsync
+            with self._lock:
+                if self._file is None:
+                    return   # Sealed (and synced) meanwhile
+                self._file.flush()
+                upto = self._written
+                fd = self._file.fileno()
+                os.fsync(fd)
+                self._synced = upto
+
+    # ---------- reading ----------
+    def records(self):
+        """All spooled records, oldest first"""
+        for path in self.segments():
+            try:
+                for records in read_frames(path):
+                    yield from records
+            except FileNotFoundError:
+                continue   # Replayed and removed while reading
+            except CorruptSegment as e:
+                print(f"⚠️ Spool segment unreadable past a corrupt frame: {e}")
+
+    def latest(self, node_id=None):
+        """Most recent spooled record (optionally for one node), or None"""
+        latest = None
+        for record in self.records():
+            if node_id is not None and record.get("node_id") != node_id:
+                continue
+            if latest is None or str(record.get("created_at")) >= str(latest.get("created_at")):
+                latest = record
+        return latest
+
+    def node_ids(self):
+        seen = []
+        for record in self.records():
+            node_id = record.get("node_id")
+            if node_id is not None and node_id not in seen:
+                seen.append(node_id)
+        return seen
+
+    # ---------- replay ----------
+    def replay(self, send_batch, batch_size=REPLAY_BATCH, concurrency=REPLAY_CONCURRENCY,
+               is_rejected=lambda error: False):
+        """Send every spooled record through send_batch(records); returns rows sent
+
+        Stops at the first failed segment (it stays on disk for the next run),
+        unless is_rejected(error) says retrying cannot help: that segment is
+        quarantined and replay continues.
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return 0   # Already replaying
+        try:
+            with self._lock:
+                self._seal()   # Include the active segment
+            sent = 0
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="spool-replay") as executor:
+                for path in self.segments():
+                    try:
+                        segment = open(path, "rb")
+                    except FileNotFoundError:
+                        continue   # Replayed by another process
+                    with segment:
+                        if fcntl is not None:
+                            try:
+                                fcntl.flock(segment.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            except BlockingIOError:
+                                continue   # Still being written by another process
+                            if not os.path.exists(path):
+                                continue   # Replayed by another process meanwhile
+                        try:
+                            sent += self._replay_segment(path, executor, send_batch, batch_size, concurrency)
+                        except Exception as e:
+                            if not is_rejected(e):
+                                raise
+                            self._quarantine(path, "rejected", e)
+            return sent
+        finally:
+            self._replay_lock.release()
+
+    def _batches(self, path, batch_size):
+        """Records of one segment in spool order, batch_size at a time"""
+        batch = []
+        try:
+            for records in read_frames(path):
+                for record in records:
+                    batch.append(record)
+                    if len(batch) >= batch_size:
+                        yield batch
+                        batch = []
+        except CorruptSegment:
+            if batch:
+                yield batch   # Frames before the bad one still go out
+            raise
+        if batch:
+            yield batch
+
+    def _replay_segment(self, path, executor, send_batch, batch_size, concurrency):
+        def send(batch):
+            send_batch(batch)
+            return len(batch)
+
+        # A window of at most `concurrency` uploads, acknowledged oldest first;
+        # the segment is read only as fast as the database takes it
+        window, sent, corrupt = deque(), 0, None
+        try:
+            try:
+                for batch in self._batches(path, batch_size):
+                    if len(window) >= concurrency:
+                        sent += window.popleft().result()   # Raises on failure; segment is kept
+                    window.append(executor.submit(send, batch))
+            except CorruptSegment as e:
+                corrupt = e   # Frames before it are still sent
+            while window:
+                sent += window.popleft().result()
+        finally:
+            for future in window:
+                future.cancel()   # Not sent yet: nothing new goes out after a failure
+
+        if corrupt is not None:
+            self._quarantine(path, "corrupt", corrupt)
+        else:
+            os.remove(path)
+        return sent
+
+    def _quarantine(self, path, reason, error):
+        """Move a segment out of the replay queue to quarantine/<name>.<reason>"""
+        directory = os.path.join(self.directory, "quarantine")
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, f"{os.path.basename(path)}.{reason}")
+        os.replace(path, target)
+        QUARANTINED.inc(reason=reason)
+        print(f"⚠️ Spool segment moved to {target}: {error}")
+
+    def start_replayer(self, send_batch, can_send=lambda: True, interval=REPLAY_INTERVAL,
+                       is_rejected=lambda error: False):
+        """Background thread that replays the spool whenever can_send() allows"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.seal_expired()   # A quiet worker's segment still becomes replayable
+                if not self.pending() or not can_send():
+                    continue
+                try:
+                    sent = self.replay(send_batch, is_rejected=is_rejected)
+                    if sent:
+                        print(f"Spool replay: sent {sent} readings")
+                except Exception as e:
+                    print("Spool replay failed, will retry:", e)
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=loop, name="spool-replayer", daemon=True)
+            self._thread.start()
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    """Process-wide spool in SPOOL_DIR"""
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = Spool()
+        return _spool
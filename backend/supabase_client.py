@@ -1,13 +1,6 @@
-from supabase import create_client
-import os
-from dotenv import load_dotenv
+from data_access import get_database
 
-load_dotenv()
-
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-
-supabase = create_client(url, key)
+db = get_database()
 
 # insert raw packet
 payload = {
@@ -29,8 +22,8 @@ payload = {
 }
 
 
-supabase.table("sensor_readings").insert(payload).execute()
+db.insert_readings([payload])
 
 # query processed table
-data = supabase.table("sensor_readings").select("*").execute()
-print(data.data)
+data = db.recent_readings("*", limit=50)
+print(data)
@@ -0,0 +1,150 @@
+# tracing.py
+"""
+End-to-end latency traces for readings and alerts.
+
+A Trace starts at the packet's created_at (the time the reading was taken)
+and collects wall-clock marks as the reading moves through the pipeline:
+
+    ingest (backend)   received -> stored | spooled
+    reading (monitor)  fetched -> evaluated
+    alert (monitor)    fetched -> evaluated -> queued -> sent -> acknowledged | failed
+
+Each mark's stage time is measured from the previous mark, and the first one
+from created_at. So `fetched` covers ingest, storage and the monitor's
+polling delay, and `acknowledged` is the Twilio API call returning. Finishing
+a trace records its stages in trace_stage_seconds and its total in
+trace_total_seconds (histograms on /metrics). The trace is also offered to
+the slowest-trace log. That log keeps the TRACE_KEEP slowest traces per
+pipeline from the current and previous TRACE_WINDOW seconds (GET /traces).
+
+Traces are plain objects with a list of marks, so they travel inside
+sensor_data dicts, including through the sharded monitor's process queues.
+Stage times use wall clocks from different processes and hosts. Clock skew
+can make a stage slightly negative; histograms count it as 0.
+"""
+
+import os
+import time
+import heapq
+import threading
+from datetime import datetime, timezone
+
+from metrics import histogram
+
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "20"))
+TRACE_WINDOW = float(os.getenv("TRACE_WINDOW", "3600"))
+
+# Readings wait up to a monitor interval before they are even fetched
+TRACE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+STAGE_SECONDS = histogram("trace_stage_seconds", "Time spent reaching each pipeline stage",
+                          ("pipeline", "stage"), buckets=TRACE_BUCKETS)
+TOTAL_SECONDS = histogram("trace_total_seconds", "Packet created_at to the trace's last stage",
+                          ("pipeline", "outcome"), buckets=TRACE_BUCKETS)
+
+
+def parse_timestamp(value):
+    """Epoch seconds for an ISO-8601 timestamp (naive means UTC), or None"""
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class Trace:
+    __slots__ = ("trace_id", "origin", "marks")
+
+    def __init__(self, trace_id, origin=None):
+        self.trace_id = str(trace_id)
+        self.origin = origin if origin is not None else time.time()
+        self.marks = []   # (stage, epoch seconds)
+
+    def mark(self, stage, at=None):
+        self.marks.append((stage, time.time() if at is None else at))
+        return self
+
+    def branch(self, suffix):
+        """Copy continuing separately, e.g. one per alert recipient"""
+        trace = Trace(f"{self.trace_id}/{suffix}", self.origin)
+        trace.marks = list(self.marks)
+        return trace
+
+    def stages(self):
+        """[(stage, seconds since the previous mark)]"""
+        previous = self.origin
+        result = []
+        for stage, at in self.marks:
+            result.append((stage, at - previous))
+            previous = at
+        return result
+
+    def total(self):
+        return (self.marks[-1][1] if self.marks else self.origin) - self.origin
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "created_at": datetime.fromtimestamp(self.origin, timezone.utc).isoformat(),
+            "total_seconds": round(self.total(), 3),
+            "stages": [{"stage": stage, "seconds": round(seconds, 3)} for stage, seconds in self.stages()],
+        }
+
+
+class Tracer:
+    """Records finished traces and keeps the slowest per pipeline"""
+
+    def __init__(self, keep=TRACE_KEEP, window=TRACE_WINDOW):
+        self.keep = keep
+        self.window = window
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._current = {}    # pipeline -> min-heap of (total, seq, trace dict)
+        self._previous = {}
+        self._seq = 0
+
+    def finish(self, trace, pipeline, outcome="ok"):
+        """Record a trace's stages and total as they are now"""
+        if trace is None:
+            return
+        for stage, seconds in trace.stages():
+            STAGE_SECONDS.observe(max(seconds, 0.0), pipeline=pipeline, stage=stage)
+        total = trace.total()
+        TOTAL_SECONDS.observe(max(total, 0.0), pipeline=pipeline, outcome=outcome)
+
+        with self._lock:
+            self._rotate()
+            heap = self._current.setdefault(pipeline, [])
+            if len(heap) >= self.keep and total <= heap[0][0]:
+                return
+            self._seq += 1
+            entry = (total, self._seq, dict(trace.to_dict(), pipeline=pipeline, outcome=outcome))
+            if len(heap) < self.keep:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heapreplace(heap, entry)
+
+    def _rotate(self):
+        if time.monotonic() - self._window_start >= self.window:
+            self._previous, self._current = self._current, {}
+            self._window_start = time.monotonic()
+
+    def slowest(self, pipeline=None, limit=None):
+        """Slowest recent traces, slowest first"""
+        with self._lock:
+            self._rotate()
+            entries = [
+                entry
+                for windows in (self._current, self._previous)
+                for name, heap in windows.items() if pipeline in (None, name)
+                for entry in heap
+            ]
+        entries.sort(key=lambda e: e[0], reverse=True)
+        return [entry[2] for entry in entries[:limit or self.keep]]
+
+
+tracer = Tracer()
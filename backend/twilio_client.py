@@ -0,0 +1,45 @@
+# twilio_client.py
+"""
+Shared Twilio client, created on first use (after fork, in each worker).
+
+Messages sent through send_message() are timed in the
+twilio_request_duration_seconds histogram.
+"""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from metrics import histogram
+
+load_dotenv()
+
+FROM_WHATSAPP = os.getenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
+
+TWILIO_SECONDS = histogram(
+    "twilio_request_duration_seconds", "Twilio message API latency", ("operation", "outcome")
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_twilio_client():
+    """Process-wide Twilio client from TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from twilio.rest import Client
+
+            _client = Client(
+                os.getenv("TWILIO_ACCOUNT_SID") or os.getenv("TWILIO_SID"),
+                os.getenv("TWILIO_AUTH_TOKEN") or os.getenv("TWILIO_TOKEN"),
+            )
+        return _client
+
+
+def send_message(from_, to, body, operation="message", client=None):
+    """Send one message (through `client`, default the shared one) and time it"""
+    with TWILIO_SECONDS.time(operation=operation):
+        return (client or get_twilio_client()).messages.create(from_=from_, to=to, body=body)
@@ -0,0 +1,208 @@
+# weather.py
+"""
+Shared weather data service for the dashboards and rainfall risk logic.
+
+Readers only ever touch an in-process cache. A background thread refreshes
+each (kind, location) entry when its TTL runs out, keeps serving the last
+good payload if the provider errors, and is woken immediately when a new
+location is requested. The cache lives at module level, so every Streamlit
+session in the same server process shares it.
+
+Providers:
+  openweather  - OpenWeatherMap /weather and /forecast (needs OPENWEATHER_API_KEY)
+  fixture      - JSON files from WEATHER_FIXTURE_DIR (weather.json, forecast.json)
+"""
+
+import os
+import json
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from metrics import CACHE_REQUESTS
+
+load_dotenv()
+
+DEFAULT_LAT, DEFAULT_LON = 19.198088, 72.827102
+
+# OpenWeatherMap refreshes current conditions about every 10 minutes and
+# the 3-hourly forecast a few times a day
+CURRENT_TTL = int(os.getenv("WEATHER_CURRENT_TTL", "600"))
+FORECAST_TTL = int(os.getenv("WEATHER_FORECAST_TTL", "1800"))
+RETRY_SECONDS = int(os.getenv("WEATHER_RETRY_SECONDS", "60"))
+REQUEST_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5"))
+
+# Rainfall (mm per 3h forecast step) thresholds used for the prediction alerts
+HEAVY_RAIN_MM = 50
+MODERATE_RAIN_MM = 30
+
+
+class OpenWeatherProvider:
+    BASE_URL = "https://api.openweathermap.org/data/2.5"
+
+    def __init__(self, api_key):
+        if not api_key:
+            raise ValueError("OPENWEATHER_API_KEY must be set in environment variables")
+        self.api_key = api_key
+        self.session = requests.Session()
+
+    def _get(self, endpoint, lat, lon):
+        response = self.session.get(
+            f"{self.BASE_URL}/{endpoint}",
+            params={"lat": lat, "lon": lon, "appid": self.api_key, "units": "metric"},
+            timeout=REQUEST_TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def current(self, lat, lon):
+        return self._get("weather", lat, lon)
+
+    def forecast(self, lat, lon):
+        return self._get("forecast", lat, lon)
+
+
+class FixtureProvider:
+    """Serves canned OpenWeatherMap responses for offline testing"""
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+
+    def _load(self, name):
+        with open(os.path.join(self.fixture_dir, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def current(self, lat, lon):
+        return self._load("weather.json")
+
+    def forecast(self, lat, lon):
+        return self._load("forecast.json")
+
+
+class WeatherService:
+    """TTL cache in front of a provider, refreshed by a background thread"""
+
+    TTLS = {"current": CURRENT_TTL, "forecast": FORECAST_TTL}
+
+    def __init__(self, provider):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._entries = {}   # (kind, lat, lon) -> entry dict
+        self._thread = None
+        # Due entries (e.g. current + forecast) are fetched concurrently
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather-fetch")
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._refresh_loop, name="weather-refresh", daemon=True)
+            self._thread.start()
+
+    def _refresh(self, key):
+        kind, lat, lon = key
+        try:
+            data = getattr(self.provider, kind)(lat, lon)
+            with self._lock:
+                entry = self._entries[key]
+                entry.update(data=data, fetched_at=time.time(), error=None)
+                entry["next_refresh"] = entry["fetched_at"] + self.TTLS[kind]
+        except Exception as e:
+            with self._lock:
+                entry = self._entries[key]
+                entry["error"] = str(e)
+                entry["next_refresh"] = time.time() + RETRY_SECONDS
+            print(f"⚠️ Weather {kind} refresh failed, serving cached data: {e}")
+
+    def _refresh_loop(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            with self._lock:
+                due = [key for key, entry in self._entries.items() if entry["next_refresh"] <= now]
+                upcoming = [entry["next_refresh"] for entry in self._entries.values()]
+
+            if due:
+                list(self._executor.map(self._refresh, due))
+
+            if not due:
+                timeout = max(min(upcoming) - now, 0.5) if upcoming else None
+                self._wakeup.wait(timeout)
+
+    def _get(self, kind, lat, lon):
+        key = (kind, round(float(lat), 4), round(float(lon), 4))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    "data": None, "fetched_at": None, "error": None, "next_refresh": 0
+                }
+                self._wakeup.set()
+            snapshot = dict(entry)
+
+        self._ensure_thread()
+
+        age = time.time() - snapshot["fetched_at"] if snapshot["fetched_at"] else None
+        stale = age is None or age > self.TTLS[kind] or snapshot["error"] is not None
+        CACHE_REQUESTS.inc(cache=f"weather_{kind}", result="miss" if snapshot["data"] is None else "stale" if stale else "hit")
+        return {
+            "data": snapshot["data"],
+            "fetched_at": snapshot["fetched_at"],
+            "age_seconds": age,
+            "stale": stale,
+            "error": snapshot["error"],
+        }
+
+    def current(self, lat=DEFAULT_LAT, lon=DEFAULT_LON):
+        """Cached current conditions; data is None until the first fetch lands"""
+        return self._get("current", lat, lon)
+
+    def forecast(self, lat=DEFAULT_LAT, lon=DEFAULT_LON):
+        """Cached 5-day / 3-hour forecast; data is None until the first fetch lands"""
+        return self._get("forecast", lat, lon)
+
+
+def summarize_current(weather):
+    """Pull the fields the dashboards display out of a /weather payload"""
+    weather = weather or {}
+    return {
+        "city": weather.get("name", "Unknown"),
+        "temp": weather.get("main", {}).get("temp", "N/A"),
+        "description": (weather.get("weather") or [{}])[0].get("description", "N/A").title(),
+        "humidity": weather.get("main", {}).get("humidity", "N/A"),
+        "wind": weather.get("wind", {}).get("speed", "N/A"),
+        "rainfall": weather.get("rain", {}).get("1h", 0),
+    }
+
+
+def rainfall_alerts(forecast):
+    """Return (first heavy-rain time, first moderate-rain time) from a /forecast payload"""
+    high_alert = None
+    moderate_alert = None
+    for step in (forecast or {}).get("list", []):
+        rain = step.get("rain", {}).get("3h", 0)
+        when = step.get("dt_txt")
+        if rain >= HEAVY_RAIN_MM:
+            high_alert = when
+            break
+        elif rain >= MODERATE_RAIN_MM and moderate_alert is None:
+            moderate_alert = when
+    return high_alert, moderate_alert
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_weather_service():
+    """Process-wide weather service built from the environment"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            if os.getenv("WEATHER_PROVIDER", "openweather").lower() == "fixture":
+                provider = FixtureProvider(os.getenv("WEATHER_FIXTURE_DIR", "weather_fixtures"))
+            else:
+                provider = OpenWeatherProvider(os.getenv("OPENWEATHER_API_KEY"))
+            _service = WeatherService(provider)
+        return _service
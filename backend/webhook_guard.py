@@ -0,0 +1,300 @@
+# webhook_guard.py
+"""
+Replay and flood protection for the Twilio webhooks.
+
+Twilio retries a webhook when the response is slow, so the same message can
+arrive more than once. Each handler is wrapped with WebhookGuard.protect:
+
+  - a message whose MessageSid was already handled within WEBHOOK_DEDUPE_TTL
+    seconds gets a 200 reply and is not processed again
+  - each sender has a token bucket (WEBHOOK_RATE messages per second, bursts
+    up to WEBHOOK_BURST). Messages beyond it are answered with 429 and dropped,
+    so floods do not reach the database or the outbound quota
+  - if the handler fails (5xx), its MessageSid is forgotten so Twilio's retry
+    is processed
+
+Backend workers share this state through a SQLite file,
+<WEBHOOK_DEDUPE_DIR>/webhooks.db (backend/webhook_state by default). A retry
+is caught whichever worker takes it, each sender's rate is counted once
+however many workers there are, and handled ids survive restarts. Ids expire
+after the TTL, and at most WEBHOOK_DEDUPE_SIZE are kept per webhook.
+
+With WEBHOOK_DEDUPE_DIR=off (or empty) the state is kept in memory. Each
+worker then has its own copy, so with several workers a retry that reaches
+another worker is processed again, and a sender may send up to the rate
+limit to each worker.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import functools
+from collections import OrderedDict
+
+from flask import request, jsonify, make_response
+
+from metrics import counter
+
+DEDUPE_TTL = float(os.getenv("WEBHOOK_DEDUPE_TTL", "3600"))
+DEDUPE_SIZE = int(os.getenv("WEBHOOK_DEDUPE_SIZE", "10000"))
+DEDUPE_DIR = os.getenv(
+    "WEBHOOK_DEDUPE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "webhook_state")
+)
+RATE = float(os.getenv("WEBHOOK_RATE", "0.5"))     # messages per second per sender
+BURST = float(os.getenv("WEBHOOK_BURST", "5"))
+
+PURGE_EVERY = 100   # writes between sweeps of expired rows
+
+REJECTED = counter("webhook_rejected_total", "Webhook calls not processed", ("webhook", "reason"))
+
+
+class DedupeCache:
+    """Bounded set of recently seen ids that expire after `ttl` seconds"""
+
+    def __init__(self, ttl=DEDUPE_TTL, max_entries=DEDUPE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._expiry = OrderedDict()   # id -> expiry, in insertion order
+
+    def seen(self, key):
+        """True if `key` was recorded and has not expired; otherwise record it"""
+        now = time.time()
+        with self._lock:
+            expires_at = self._expiry.get(key)
+            if expires_at is not None and expires_at > now:
+                return True
+            self._expiry.pop(key, None)
+            self._expiry[key] = now + self.ttl
+            self._evict(now)
+        return False
+
+    def forget(self, key):
+        with self._lock:
+            self._expiry.pop(key, None)
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def _evict(self, now):
+        # Entries are in expiry order (fixed ttl), so expired ones are at the front
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now and len(self._expiry) <= self.max_entries:
+                break
+            self._expiry.popitem(last=False)
+
+
+class RateLimiter:
+    """Token bucket per key; idle buckets are dropped once more than `max_keys` exist"""
+
+    def __init__(self, rate=RATE, burst=BURST, max_keys=DEDUPE_SIZE):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # key -> (tokens, last refill), least recently used first
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed
+
+
+class SharedState:
+    """SQLite file holding dedupe ids and rate buckets for every worker"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()   # one connection, shared by request threads
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_seen ("
+            "webhook TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "PRIMARY KEY (webhook, key))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS webhook_seen_expiry ON webhook_seen (webhook, expires_at)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_buckets ("
+            "webhook TEXT NOT NULL, key TEXT NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL, "
+            "PRIMARY KEY (webhook, key))"
+        )
+
+    def transaction(self, work):
+        """Run work(cursor) in one write transaction; returns its result"""
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(cur)
+                cur.execute("COMMIT")
+                return result
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+
+class SharedDedupeCache:
+    """DedupeCache stored in SharedState, so every worker sees every id"""
+
+    def __init__(self, state, name, ttl=DEDUPE_TTL, max_entries=DEDUPE_SIZE):
+        self.state = state
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inserts = 0
+
+    def seen(self, key):
+        """True if `key` was recorded and has not expired; otherwise record it"""
+        now = time.time()
+
+        def work(cur):
+            cur.execute(
+                "INSERT INTO webhook_seen (webhook, key, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (webhook, key) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE webhook_seen.expires_at <= ?",
+                (self.name, key, now + self.ttl, now)
+            )
+            if cur.rowcount == 0:
+                return True
+            self._inserts += 1
+            if self._inserts % PURGE_EVERY == 0:
+                # Expired ids, then the oldest beyond max_entries
+                cur.execute("DELETE FROM webhook_seen WHERE webhook = ? AND expires_at <= ?", (self.name, now))
+                cur.execute(
+                    "DELETE FROM webhook_seen WHERE webhook = ? AND key IN ("
+                    "SELECT key FROM webhook_seen WHERE webhook = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.name, self.name, self.max_entries)
+                )
+            return False
+
+        try:
+            return self.state.transaction(work)
+        except sqlite3.Error as e:
+            print(f"⚠️ Webhook dedupe unavailable, processing {key}: {e}")
+            return False
+
+    def forget(self, key):
+        try:
+            self.state.transaction(lambda cur: cur.execute(
+                "DELETE FROM webhook_seen WHERE webhook = ? AND key = ?", (self.name, key)
+            ))
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not forget webhook id {key}: {e}")
+
+    def __len__(self):
+        with self.state._lock:
+            row = self.state.conn.execute(
+                "SELECT COUNT(*) FROM webhook_seen WHERE webhook = ? AND expires_at > ?", (self.name, time.time())
+            ).fetchone()
+        return row[0]
+
+
+class SharedRateLimiter:
+    """RateLimiter whose buckets live in SharedState, so the limit holds across workers"""
+
+    def __init__(self, state, name, rate=RATE, burst=BURST):
+        self.state = state
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self._writes = 0
+
+    def allow(self, key):
+        now = time.time()   # Wall clock: buckets are compared across processes
+
+        def work(cur):
+            row = cur.execute(
+                "SELECT tokens, updated FROM webhook_buckets WHERE webhook = ? AND key = ?", (self.name, key)
+            ).fetchone()
+            tokens, updated = row if row else (self.burst, now)
+            tokens = min(self.burst, tokens + max(now - updated, 0) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            cur.execute(
+                "INSERT OR REPLACE INTO webhook_buckets (webhook, key, tokens, updated) VALUES (?, ?, ?, ?)",
+                (self.name, key, tokens, now)
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0 and self.rate > 0:
+                # A bucket idle long enough to be full again is the same as no bucket
+                cur.execute(
+                    "DELETE FROM webhook_buckets WHERE webhook = ? AND updated < ?",
+                    (self.name, now - self.burst / self.rate)
+                )
+            return allowed
+
+        try:
+            return self.state.transaction(work)
+        except sqlite3.Error as e:
+            print(f"⚠️ Webhook rate limit unavailable, allowing {key}: {e}")
+            return True
+
+
+class WebhookGuard:
+    def __init__(self, dedupe=None, limiter=None, name="webhook"):
+        self.name = name
+        self.dedupe = DedupeCache() if dedupe is None else dedupe
+        self.limiter = RateLimiter() if limiter is None else limiter
+        self.duplicates = 0
+        self.rate_limited = 0
+
+    def protect(self, view):
+        """Decorator for a Flask view handling Twilio message webhooks"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            sid = (request.values.get("MessageSid") or "").strip()
+            sender = (request.values.get("From") or "").strip().lower()
+
+            if sid and self.dedupe.seen(sid):
+                self.duplicates += 1
+                REJECTED.inc(webhook=self.name, reason="duplicate")
+                return jsonify({"status": "duplicate"})
+
+            if sender and not self.limiter.allow(sender):
+                self.rate_limited += 1
+                REJECTED.inc(webhook=self.name, reason="rate_limited")
+                print(f"⚠️ Rate limited webhook from {sender}")
+                return jsonify({"status": "rate limited"}), 429
+
+            response = make_response(view(*args, **kwargs))
+            if sid and response.status_code >= 500:
+                self.dedupe.forget(sid)   # Let Twilio's retry through
+            return response
+        return wrapper
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state():
+    """Process-wide connection to <WEBHOOK_DEDUPE_DIR>/webhooks.db, or None when disabled"""
+    global _state
+    if not DEDUPE_DIR or DEDUPE_DIR.lower() == "off":
+        return None
+    with _state_lock:
+        if _state is None:
+            _state = SharedState(os.path.join(DEDUPE_DIR, "webhooks.db"))
+        return _state
+
+
+def get_webhook_guard(name):
+    """Guard for one webhook endpoint, shared by all workers unless WEBHOOK_DEDUPE_DIR=off"""
+    state = get_shared_state()
+    if state is None:
+        return WebhookGuard(name=name)
+    return WebhookGuard(SharedDedupeCache(state, name), SharedRateLimiter(state, name), name=name)
@@ -1,9 +1,16 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
-import requests
 import plotly.express as px
 from streamlit_autorefresh import st_autorefresh
 
+# Add backend directory to path to import shared modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from weather import get_weather_service, summarize_current, rainfall_alerts
+from panel_fetch import PanelFetcher
+
 st.set_page_config(
     page_title="TerraShield",
     page_icon="./images/title.png",
@@ -11,12 +18,22 @@ st.set_page_config(
 )
 
 st_autorefresh(interval=60000, key="datarefresh")
+
+@st.cache_resource
+def get_panel_fetcher():
+    """Pooled keep-alive HTTP client shared by all sessions"""
+    return PanelFetcher()
+
 st.title("🌄 Landslide Dashboard")
 
 # ------------------ SENSOR DATA ------------------
 try:
-    response = requests.get("http://127.0.0.1:5000/sensor-data")
-    data = response.json()
+    result = get_panel_fetcher().fetch("sensor-data", "http://127.0.0.1:5000/sensor-data", timeout=3.0)
+    if result["error"]:
+        if result["data"] is None:
+            raise RuntimeError(result["error"])
+        st.caption(f"⚠️ Backend unavailable, showing cached data ({result['error']})")
+    data = result["data"]
 
     # Ensure always a list
     if isinstance(data, dict):
@@ -71,19 +88,19 @@ except Exception as e:
     st.error(f"Error fetching data: {e}")
 
 # ------------------ WEATHER + FORECAST ------------------
-API_KEY = "65d728ae876e82a76b4414eab00a4560"
-lat, lon = 19.198088, 72.827102
+rainfall = 0
 col4, col5, col6 = st.columns([1,1,1])
 
 with col4:
     try:
-        weather = requests.get(f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric").json()
-        city = weather.get("name", "Unknown")
-        temp = weather.get("main", {}).get("temp", "N/A")
-        desc = weather.get("weather", [{}])[0].get("description", "N/A").title()
-        humidity = weather.get("main", {}).get("humidity", "N/A")
-        wind = weather.get("wind", {}).get("speed", "N/A")
-        rainfall = weather.get("rain", {}).get("1h", 0)
+        weather = get_weather_service().current()
+        summary = summarize_current(weather["data"])
+        city = summary["city"]
+        temp = summary["temp"]
+        desc = summary["description"]
+        humidity = summary["humidity"]
+        wind = summary["wind"]
+        rainfall = summary["rainfall"]
 
         st.subheader("🌤 Weather Forecast")
         st.markdown(f"""
@@ -128,17 +145,13 @@ with col5:
 
 with col6:
     try:
-        forecast = requests.get(f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={API_KEY}&units=metric").json()
-        forecast_list = forecast.get("list", [])
-        high_alert = None; moderate_alert = None
-        for f in forecast_list:
-            rain = f.get("rain", {}).get("3h", 0)
-            t = f.get("dt_txt")
-            if rain >= 50: high_alert = t; break
-            elif rain >= 30 and moderate_alert is None: moderate_alert = t
+        forecast = get_weather_service().forecast()
+        high_alert, moderate_alert = rainfall_alerts(forecast["data"])
 
         st.subheader("🌧 Rainfall Risk Prediction")
-        if high_alert:
+        if forecast["data"] is None:
+            st.info("⏳ Loading forecast...")
+        elif high_alert:
             st.error(f"🚨 Heavy rainfall expected on **{high_alert}**")
         elif moderate_alert:
             st.warning(f"⚠️ Rainfall likely on **{moderate_alert}**")
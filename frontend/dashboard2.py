@@ -1,12 +1,23 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
-import requests
-import plotly.express as px
-from streamlit_autorefresh import st_autorefresh
 from streamlit_folium import st_folium
-import folium
 
-st_autorefresh(interval=5000, key="datarefresh")
+# Add backend directory to path to import shared modules
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from weather import get_weather_service, summarize_current, rainfall_alerts
+from risk import MOISTURE_THRESHOLD, VIBRATION_THRESHOLD, TILT_THRESHOLD, assess_risk as evaluate_risk
+from sensor_buffer import SensorBuffer
+from panel_fetch import PanelFetcher
+from panel_data import load_panel_data
+from sensor_charts import build_sensor_figure
+from node_map import DEFAULT_CENTER, build_base_map, build_node_layer
+from metrics import collector, serve_metrics
+
+BACKEND_URL = os.getenv("TERRASHIELD_BACKEND_URL", "http://127.0.0.1:5000")
+METRICS_PORT = int(os.getenv("DASHBOARD_METRICS_PORT", "9102"))
 
 st.set_page_config(
     page_title="TerraShield",
@@ -99,256 +110,382 @@ st.markdown("""
 
 
 # ------------------ SENSOR DATA ------------------
-try:
-    # Add cache busting to ensure fresh data
-    import time
-    response = requests.get(f"http://127.0.0.1:5000/sensor-data?t={int(time.time())}")
-    data = response.json()
-
-    # Ensure always a list
-    if isinstance(data, dict):
-        data = [data]
-
-    df = pd.DataFrame(data)
-
-    # Add missing columns
-    if "tilt" not in df.columns:
-        df["tilt"] = 0
-    if "timestamp" not in df.columns:
-        st.warning("⚠️ Backend did not return 'timestamp'. Using index instead.")
-        df["timestamp"] = pd.date_range(end=pd.Timestamp.now(), periods=len(df))
-
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    # Sort by timestamp to ensure latest data is first for metrics, but chronological for charts
-    df_latest = df.sort_values("timestamp", ascending=False).reset_index(drop=True)
-    df_charts = df.sort_values("timestamp", ascending=True).reset_index(drop=True)
-    df_latest["time_only"] = df_latest["timestamp"].dt.strftime("%H:%M:%S")
-    df_charts["time_only"] = df_charts["timestamp"].dt.strftime("%H:%M:%S")
-    
-    # Debug: Show data info
-    st.sidebar.write(f"📊 Data Points: {len(df)}")
-    if not df.empty:
-        st.sidebar.write(f"🕐 Latest: {df_latest['timestamp'].iloc[0] if 'timestamp' in df_latest.columns else 'N/A'}")
-
-    # --- Main Layout: Left Panel (30%) + Map (70%) ---
-    left_col, right_col = st.columns([3, 7])
-
-    with left_col:
-        # Real-time Alert Panel
-        st.markdown("### 🚨 Real-Time Alerts")
-        try:
-            latest_moisture = df_latest["moisture"].iloc[0] if "moisture" in df_latest.columns and not df_latest.empty else 0
-            latest_tilt = df_latest["tilt"].iloc[0] if "tilt" in df_latest.columns and not df_latest.empty else 0
-            latest_vibration = df_latest["vibration"].iloc[0] if "vibration" in df_latest.columns and not df_latest.empty else 0
-            
-            # Risk assessment based on sensor data
-            if latest_moisture > 80 and latest_tilt > 15:
-                risk_level = "CRITICAL"
-                risk_desc = "High moisture + tilt detected"
-                bg_color = "#ff4757"; text_color = "#ffffff"; border_color = "#ff3742"
-                icon = "🚨"
-            elif latest_moisture > 70 or latest_tilt > 10:
-                risk_level = "WARNING"
-                risk_desc = "Elevated sensor readings"
-                bg_color = "#ffa502"; text_color = "#ffffff"; border_color = "#ff9500"
-                icon = "⚠️"
-            elif latest_vibration > 1000:
-                risk_level = "WARNING"
-                risk_desc = "High vibration detected"
-                bg_color = "#ffa502"; text_color = "#ffffff"; border_color = "#ff9500"
-                icon = "⚠️"
-            else:
-                risk_level = "NORMAL"
-                risk_desc = "All sensors within safe range"
-                bg_color = "#2ed573"; text_color = "#ffffff"; border_color = "#26d367"
-                icon = "✅"
+# The header and CSS above render once per full script run. Each panel below is a
+# fragment that reruns on its own cadence, so a metrics tick no longer rebuilds
+# the map, the weather panels or the charts.
+LIVE_REFRESH = "5s"      # risk panel + metric cards
+CHART_REFRESH = "5s"     # charts/table (figures only rebuilt when new rows arrive)
+MAP_REFRESH = "15s"      # node markers only; the base map is never reloaded
+SLOW_REFRESH = "60s"     # forecast and weather
+SENSOR_TIMEOUT = 3.0     # seconds before a panel falls back to buffered data
+
+@st.cache_resource
+def get_sensor_buffer():
+    """Sensor buffer shared by every session on this server"""
+    return SensorBuffer(max_rows=50000)
+
+@st.cache_resource
+def get_panel_fetcher():
+    """Pooled keep-alive HTTP client shared by all panels and sessions"""
+    return PanelFetcher()
+
+@st.cache_resource
+def start_metrics_listener():
+    """/healthz, /readyz and /metrics for this Streamlit server (started once)"""
+    @collector
+    def dashboard_state():
+        df = get_sensor_buffer().df
+        now = pd.Timestamp.now(tz="UTC")
+        ages = [] if df.empty else [
+            ({"node_id": node_id}, round((now - ts).total_seconds(), 1))
+            for node_id, ts in df.groupby("node_id")["timestamp"].max().items()
+        ]
+        yield ("node_reading_age_seconds", "gauge", "Age of the node's newest reading in the dashboard buffer", ages)
+        yield ("dashboard_buffer_rows", "gauge", "Sensor rows held in the dashboard buffer", [({}, len(df))])
+
+    def ready():
+        # Ready while the backend answers; panels fall back to cached data otherwise
+        result = get_panel_fetcher().fetch("healthz", f"{BACKEND_URL}/healthz", timeout=1.0)
+        return result["error"] is None, {"backend": result["error"] or "ok"}
+
+    return serve_metrics(METRICS_PORT, ready=ready)
+
+start_metrics_listener()
+
+@st.cache_data(ttl=2, show_spinner=False)
+def fetch_panel_data():
+    """/summary and new sensor rows in one concurrent fetch_all; panels refreshing
+    together share a single round, and the rows land in the shared buffer"""
+    return load_panel_data(get_panel_fetcher(), get_sensor_buffer(), BACKEND_URL, SENSOR_TIMEOUT)
+
+def load_sensor_frame():
+    """Buffered sensor rows, as (df, error)
+
+    On a slow or failing backend the rows already held are returned with the
+    error, so each panel can degrade on its own.
+    """
+    error = fetch_panel_data()["rows_error"]
+    return get_sensor_buffer().df, error
+
+def stale_notice(error):
+    st.caption(f"⚠️ Backend unavailable, showing cached data ({error})")
+
+def latest_values(df):
+    """Latest moisture/temperature/tilt/vibration from the ascending buffer"""
+    if df.empty:
+        return {"moisture": 0, "temperature": 0, "tilt": 0, "vibration": 0, "timestamp": None}
+    last = df.iloc[-1]
+    return {
+        "moisture": last.get("moisture", 0) or 0,
+        "temperature": last.get("temperature", 0) or 0,
+        "tilt": last.get("tilt", 0) or 0,
+        "vibration": last.get("vibration", 0) or 0,
+        "timestamp": last.get("timestamp"),
+    }
 
+RISK_STYLES = {
+    "CRITICAL": ("#ff4757", "#ffffff", "#ff3742", "🚨"),
+    "WARNING": ("#ffa502", "#ffffff", "#ff9500", "⚠️"),
+    "NORMAL": ("#2ed573", "#ffffff", "#26d367", "✅"),
+}
+RISK_ORDER = {"NORMAL": 0, "WARNING": 1, "CRITICAL": 2}
+
+def assess_risk(latest):
+    """Map the latest readings to (level, description, bg, text, border, icon)"""
+    risk = evaluate_risk(latest)
+    return (risk["level"], risk["description"]) + RISK_STYLES[risk["level"]]
+
+def load_summary():
+    """Per-node summaries precomputed by the backend, as (summary, error)
+
+    The live panels read this small response instead of the sensor buffer.
+    An empty summary means the panels should fall back to buffered rows.
+    """
+    data = fetch_panel_data()
+    return data["summary"], data["summary_error"]
+
+def summary_latest(node):
+    """latest_values()-shaped dict from one node summary"""
+    latest = {k: v or 0 for k, v in node["latest"].items()}
+    latest["timestamp"] = node["last_reading_at"]
+    return latest
+
+@st.fragment(run_every=LIVE_REFRESH)
+def realtime_alert_panel():
+    # Real-time Alert Panel
+    st.markdown("### 🚨 Real-Time Alerts")
+    try:
+        summary, error = load_summary()
+        if summary:
+            # Worst current risk across nodes, with the node and rule that triggered it
+            node = max(summary.values(), key=lambda n: (RISK_ORDER[n["risk"]["level"]], n["last_reading_at"]))
+            risk_level, risk_desc = node["risk"]["level"], node["risk"]["description"]
+            if node["risk"]["rule"] and len(summary) > 1:
+                risk_desc = f"{risk_desc} · Node {node['node_id']}"
+            bg_color, text_color, border_color, icon = RISK_STYLES[risk_level]
+        else:
+            df, error = load_sensor_frame()
+            latest = latest_values(df)
+            risk_level, risk_desc, bg_color, text_color, border_color, icon = assess_risk(latest)
+        if error:
+            stale_notice(error)
+
+        st.markdown(f"""
+        <div class="alert-panel" style="
+            background: linear-gradient(135deg, {bg_color}80 0%, {border_color}80 100%);
+            border-color: {border_color};
+            text-align: center;
+            animation: pulse 2s infinite;
+        ">
+            <div style="font-size: 2.5rem; margin-bottom: 0.5rem;">{icon}</div>
+            <h2 style="color: {text_color}; margin: 0; font-size: 1.8rem; font-weight: bold;">{risk_level}</h2>
+            <p style="color: {text_color}; margin: 0.5rem 0 0 0; font-size: 1.2rem; opacity: 0.9;">{risk_desc}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    except Exception as e:
+        st.error(f"Real-time alert calculation failed: {e}")
+
+@st.fragment(run_every=SLOW_REFRESH)
+def prediction_panel():
+    # Prediction Alert Panel
+    st.markdown("### 🔮 Prediction Alerts")
+    try:
+        # Get weather data for prediction (shared cache, never blocks on the provider)
+        forecast = get_weather_service().forecast()
+        high_alert, moderate_alert = rainfall_alerts(forecast["data"])
+
+        if forecast["data"] is None:
+            st.info("⏳ Loading forecast...")
+        elif high_alert:
             st.markdown(f"""
             <div class="alert-panel" style="
-                background: linear-gradient(135deg, {bg_color}80 0%, {border_color}80 100%);
-                border-color: {border_color};
+                background: linear-gradient(135deg, #ff475780 0%, #ff374280 100%);
+                border-color: #ff3742;
                 text-align: center;
-                animation: pulse 2s infinite;
             ">
-                <div style="font-size: 2.5rem; margin-bottom: 0.5rem;">{icon}</div>
-                <h2 style="color: {text_color}; margin: 0; font-size: 1.8rem; font-weight: bold;">{risk_level}</h2>
-                <p style="color: {text_color}; margin: 0.5rem 0 0 0; font-size: 1.2rem; opacity: 0.9;">{risk_desc}</p>
+                <div style="font-size: 2rem; margin-bottom: 0.5rem;">🚨</div>
+                <h4 style="color: white; margin: 0; font-size: 1.5rem;">Heavy rainfall expected</h4>
+                <p style="color: white; margin: 5px 0 0 0; opacity: 0.9; font-size: 1.1rem;">{high_alert}</p>
             </div>
             """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Real-time alert calculation failed: {e}")
-
-        # Prediction Alert Panel
-        st.markdown("### 🔮 Prediction Alerts")
-        try:
-            # Get weather data for prediction
-            API_KEY = "65d728ae876e82a76b4414eab00a4560"
-            lat, lon = 19.198088, 72.827102
-            forecast = requests.get(f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={API_KEY}&units=metric").json()
-            forecast_list = forecast.get("list", [])
-            
-            high_alert = None; moderate_alert = None
-            for f in forecast_list:
-                rain = f.get("rain", {}).get("3h", 0)
-                t = f.get("dt_txt")
-                if rain >= 50: 
-                    high_alert = t
-                    break
-                elif rain >= 30 and moderate_alert is None: 
-                    moderate_alert = t
-
-            if high_alert:
-                st.markdown(f"""
-                <div class="alert-panel" style="
-                    background: linear-gradient(135deg, #ff475780 0%, #ff374280 100%);
-                    border-color: #ff3742;
-                    text-align: center;
-                ">
-                    <div style="font-size: 2rem; margin-bottom: 0.5rem;">🚨</div>
-                    <h4 style="color: white; margin: 0; font-size: 1.5rem;">Heavy rainfall expected</h4>
-                    <p style="color: white; margin: 5px 0 0 0; opacity: 0.9; font-size: 1.1rem;">{high_alert}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            elif moderate_alert:
-                st.markdown(f"""
-                <div class="alert-panel" style="
-                    background: linear-gradient(135deg, #ffa50280 0%, #ff950080 100%);
-                    border-color: #ff9500;
-                    text-align: center;
-                ">
-                    <div style="font-size: 2rem; margin-bottom: 0.5rem;">⚠️</div>
-                    <h4 style="color: white; margin: 0; font-size: 1.5rem;">Rainfall likely</h4>
-                    <p style="color: white; margin: 5px 0 0 0; opacity: 0.9; font-size: 1.1rem;">{moderate_alert}</p>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="alert-panel" style="
-                    background: linear-gradient(135deg, #2ed57380 0%, #26d36780 100%);
-                    border-color: #26d367;
-                    text-align: center;
-                ">
-                    <div style="font-size: 2rem; margin-bottom: 0.5rem;">✅</div>
-                    <h4 style="color: white; margin: 0; font-size: 1.5rem;">No rainfall alerts</h4>
-                    <p style="color: white; margin: 5px 0 0 0; opacity: 0.9; font-size: 1.1rem;">Next 5 days clear</p>
-                </div>
-                """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Prediction alert calculation failed: {e}")
-
-        # Weather Forecast Panel
-        st.markdown("### 🌤 Weather Forecast")
-        try:
-            API_KEY = "65d728ae876e82a76b4414eab00a4560"
-            lat, lon = 19.198088, 72.827102
-            weather = requests.get(f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric").json()
-            city = weather.get("name", "Unknown")
-            temp = weather.get("main", {}).get("temp", "N/A")
-            desc = weather.get("weather", [{}])[0].get("description", "N/A").title()
-            humidity = weather.get("main", {}).get("humidity", "N/A")
-            wind = weather.get("wind", {}).get("speed", "N/A")
-            rainfall = weather.get("rain", {}).get("1h", 0)
-
+        elif moderate_alert:
+            st.markdown(f"""
+            <div class="alert-panel" style="
+                background: linear-gradient(135deg, #ffa50280 0%, #ff950080 100%);
+                border-color: #ff9500;
+                text-align: center;
+            ">
+                <div style="font-size: 2rem; margin-bottom: 0.5rem;">⚠️</div>
+                <h4 style="color: white; margin: 0; font-size: 1.5rem;">Rainfall likely</h4>
+                <p style="color: white; margin: 5px 0 0 0; opacity: 0.9; font-size: 1.1rem;">{moderate_alert}</p>
+            </div>
+            """, unsafe_allow_html=True)
+        else:
             st.markdown(f"""
-            <div class="metric-card" style="
-                background: linear-gradient(135deg, #74b9ff 0%, #0984e3 100%);
-                color: white;
-                border-left: 5px solid #0984e3;
+            <div class="alert-panel" style="
+                background: linear-gradient(135deg, #2ed57380 0%, #26d36780 100%);
+                border-color: #26d367;
+                text-align: center;
             ">
-                <div style="display: flex; align-items: center; margin-bottom: 1rem;">
-                    <span style="font-size: 2rem; margin-right: 0.5rem;">🌤️</span>
-                    <h4 style="margin: 0; color: white;">{city}</h4>
-                </div>
-                <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 0.5rem;">
-                    <div><strong>🌡️ Temp:</strong> {temp}°C</div>
-                    <div><strong>💧 Humidity:</strong> {humidity}%</div>
-                    <div><strong>🌬️ Wind:</strong> {wind} m/s</div>
-                    <div><strong>🌧️ Rain:</strong> {rainfall} mm</div>
-                </div>
-                <div style="margin-top: 0.5rem; font-style: italic; opacity: 0.9;">{desc}</div>
+                <div style="font-size: 2rem; margin-bottom: 0.5rem;">✅</div>
+                <h4 style="color: white; margin: 0; font-size: 1.5rem;">No rainfall alerts</h4>
+                <p style="color: white; margin: 5px 0 0 0; opacity: 0.9; font-size: 1.1rem;">Next 5 days clear</p>
             </div>
             """, unsafe_allow_html=True)
-        except Exception as e:
-            st.error(f"Could not load weather data: {e}")
-
-    with right_col:
-        # Key Metrics Cards
-        st.markdown("### 📊 Key Metrics")
-        metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
-        
-        with metric_col1:
-            latest_moisture = df_latest["moisture"].iloc[0] if "moisture" in df_latest.columns and not df_latest.empty else 0
-            st.metric("💧 Moisture", f"{latest_moisture:.1f}%", "Normal" if latest_moisture < 50 else "High")
-        
-        with metric_col2:
-            latest_temp = df_latest["temperature"].iloc[0] if "temperature" in df_latest.columns and not df_latest.empty else 0
-            st.metric("🌡️ Temperature", f"{latest_temp:.1f}°C", "Normal")
-        
-        with metric_col3:
-            latest_tilt = df_latest["tilt"].iloc[0] if "tilt" in df_latest.columns and not df_latest.empty else 0
-            st.metric("📐 Tilt", f"{latest_tilt:.1f}°", "Normal" if latest_tilt < 7 else "High")
-        
-        with metric_col4:
-            latest_vibration = df_latest["vibration"].iloc[0] if "vibration" in df_latest.columns and not df_latest.empty else 0
-            st.metric("📳 Vibration", f"{latest_vibration:.1f}g", "Normal" if latest_vibration < 1200 else "High")
-
-        st.markdown("### 📍 Node Location")
-
-        # Hardcoded single node coordinates
-        node_lat = 19.198088
-        node_lon = 72.827102
-
-        # Create base map without default tiles
-        m = folium.Map(location=[node_lat, node_lon], zoom_start=15, control_scale=True, tiles=None)
-
-        # --- Base Layers ---
-        # Street Map (OpenStreetMap)
-        folium.TileLayer(
-            tiles="OpenStreetMap",
-            name="Street Map",
-            attr="© OpenStreetMap contributors"
-        ).add_to(m)
-
-        # Satellite
-        folium.TileLayer(
-            tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
-            name="Satellite",
-            attr="Tiles © Esri — Source: Esri, Maxar, Earthstar Geographics, and the GIS User Community"
-        ).add_to(m)
-
-        # Add marker with enhanced styling
-        latest_moisture = df_latest["moisture"].iloc[0] if "moisture" in df_latest.columns and not df_latest.empty else 0
-        latest_temp = df_latest["temperature"].iloc[0] if "temperature" in df_latest.columns and not df_latest.empty else 0
-        latest_tilt = df_latest["tilt"].iloc[0] if "tilt" in df_latest.columns and not df_latest.empty else 0
-        latest_vibration = df_latest["vibration"].iloc[0] if "vibration" in df_latest.columns and not df_latest.empty else 0
-        
-        popup_text = f"""
-        <div style="font-family: Arial, sans-serif; width: 200px;">
-            <h3 style="color: #2a5298; margin: 0 0 10px 0;">🌄 TerraShield Node</h3>
-            <p style="margin: 5px 0;"><strong>📍 Location:</strong> {node_lat}, {node_lon}</p>
-            <p style="margin: 5px 0;"><strong>💧 Moisture:</strong> {latest_moisture:.1f}%</p>
-            <p style="margin: 5px 0;"><strong>🌡️ Temperature:</strong> {latest_temp:.1f}°C</p>
-            <p style="margin: 5px 0;"><strong>📐 Tilt:</strong> {latest_tilt:.1f}°</p>
-            <p style="margin: 5px 0;"><strong>📳 Vibration:</strong> {latest_vibration:.1f}g</p>
+    except Exception as e:
+        st.error(f"Prediction alert calculation failed: {e}")
+
+@st.fragment(run_every=SLOW_REFRESH)
+def weather_panel():
+    # Weather Forecast Panel
+    st.markdown("### 🌤 Weather Forecast")
+    try:
+        weather = get_weather_service().current()
+        if weather["error"]:
+            st.caption(f"⚠️ Showing cached weather ({weather['error']})")
+        summary = summarize_current(weather["data"])
+        city = summary["city"]
+        temp = summary["temp"]
+        desc = summary["description"]
+        humidity = summary["humidity"]
+        wind = summary["wind"]
+        rainfall = summary["rainfall"]
+
+        st.markdown(f"""
+        <div class="metric-card" style="
+            background: linear-gradient(135deg, #74b9ff 0%, #0984e3 100%);
+            color: white;
+            border-left: 5px solid #0984e3;
+        ">
+            <div style="display: flex; align-items: center; margin-bottom: 1rem;">
+                <span style="font-size: 2rem; margin-right: 0.5rem;">🌤️</span>
+                <h4 style="margin: 0; color: white;">{city}</h4>
+            </div>
+            <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 0.5rem;">
+                <div><strong>🌡️ Temp:</strong> {temp}°C</div>
+                <div><strong>💧 Humidity:</strong> {humidity}%</div>
+                <div><strong>🌬️ Wind:</strong> {wind} m/s</div>
+                <div><strong>🌧️ Rain:</strong> {rainfall} mm</div>
+            </div>
+            <div style="margin-top: 0.5rem; font-style: italic; opacity: 0.9;">{desc}</div>
         </div>
-        """
-        folium.Marker(
-            [node_lat, node_lon],
-            popup=folium.Popup(popup_text, max_width=250),
-            icon=folium.Icon(color="red", icon="info-sign", prefix="fa")
-        ).add_to(m)
+        """, unsafe_allow_html=True)
+    except Exception as e:
+        st.error(f"Could not load weather data: {e}")
+
+@st.fragment(run_every=LIVE_REFRESH)
+def metrics_panel():
+    # Key Metrics Cards
+    st.markdown("### 📊 Key Metrics")
+    summary, error = load_summary()
+    deltas = None
+    if summary:
+        # Most recently reporting node
+        node = max(summary.values(), key=lambda n: n["last_reading_at"])
+        latest = summary_latest(node)
+        deltas = node["deltas"]
+        data_caption = f"📡 Node {node['node_id']} of {len(summary)}" + (" · ⏳ stale" if node["stale"] else "")
+    else:
+        df, error = load_sensor_frame()
+        latest = latest_values(df)
+        data_caption = f"📊 Data Points: {len(df)}"
+    if error:
+        stale_notice(error)
+
+    metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
+
+    with metric_col1:
+        st.metric("💧 Moisture", f"{latest['moisture']:.1f}%", "Normal" if latest["moisture"] <= MOISTURE_THRESHOLD else "High")
+
+    with metric_col2:
+        st.metric("🌡️ Temperature", f"{latest['temperature']:.1f}°C", "Normal")
+
+    with metric_col3:
+        st.metric("📐 Tilt", f"{latest['tilt']:.1f}°", "Normal" if latest["tilt"] <= TILT_THRESHOLD else "High")
+
+    with metric_col4:
+        st.metric("📳 Vibration", f"{latest['vibration']:.1f}°/s", "Normal" if latest["vibration"] <= VIBRATION_THRESHOLD else "High")
+
+    st.caption(f"{data_caption} · 🕐 Latest: {latest['timestamp'] if latest['timestamp'] is not None else 'N/A'}")
+    if deltas:
+        window = node["delta_window_seconds"] // 60
+        changes = " · ".join(
+            f"{field} {deltas[field]['window']:+.1f}"
+            for field in ("moisture", "temperature", "tilt", "vibration")
+            if deltas[field]["window"] is not None
+        )
+        st.caption(f"📈 Change over {window} min: {changes}")
+
+@st.cache_data(ttl=600, show_spinner=False)
+def load_node_metadata():
+    """Node positions from the backend, cached for 10 minutes"""
+    result = get_panel_fetcher().fetch("nodes", f"{BACKEND_URL}/nodes", timeout=SENSOR_TIMEOUT)
+    if result["error"] or not isinstance(result["data"], list):
+        raise RuntimeError(result["error"] or "unexpected /nodes response")
+    return result["data"]
+
+def node_states(df):
+    """{node_id: (risk_level, latest_values)} from the backend summary, or the
+    newest buffered row per node when the summary is unavailable"""
+    summary, _ = load_summary()
+    if summary:
+        return {node["node_id"]: (node["risk"]["level"], summary_latest(node)) for node in summary.values()}
+    if df.empty or "node_id" not in df.columns:
+        return {}
+    states = {}
+    for node_id, node_df in df.groupby("node_id", sort=False):
+        latest = latest_values(node_df)
+        states[node_id] = (assess_risk(latest)[0], latest)
+    return states
+
+@st.fragment(run_every=MAP_REFRESH)
+def map_panel():
+    st.markdown("### 📍 Node Locations")
+
+    df, error = load_sensor_frame()
+    if error:
+        stale_notice(error)
+    states = node_states(df)
+    try:
+        nodes = load_node_metadata()
+    except Exception as e:
+        # Fall back to the single hardcoded node location
+        st.caption(f"⚠️ Node metadata unavailable ({e})")
+        latest = latest_values(df)
+        nodes = [{"node_id": "TerraShield", "latitude": DEFAULT_CENTER[0], "longitude": DEFAULT_CENTER[1]}]
+        states = {"TerraShield": (assess_risk(latest)[0], latest)}
+
+    # Same base map every time, so st_folium keeps the viewport and only swaps the node layer
+    base_map = build_base_map(DEFAULT_CENTER)
+    node_layer = build_node_layer(nodes, states)
+
+    # Render map in Streamlit with enhanced container
+    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+    st_folium(
+        base_map,
+        key="node_map",
+        feature_group_to_add=node_layer,
+        returned_objects=[],
+        width="stretch",
+        height=500
+    )
+    st.markdown('</div>', unsafe_allow_html=True)
+
+CHART_SPECS = [
+    ("moisture", "💧 Moisture", '#1f77b4', "Moisture (%)"),
+    ("temperature", "🌡️ Temperature", '#ff7f0e', "Temperature (°C)"),
+    ("tilt", "📐 Tilt", '#2ca02c', "Tilt (degrees)"),
+    ("vibration", "📳 Vibration", '#d62728', "Vibration (°/s)"),
+]
+
+def build_chart(df_charts):
+    """Linked sensor figure for the current buffer, rebuilt only when the buffer version changes"""
+    version = get_sensor_buffer().version
+    cached = st.session_state.get("sensor_figure")
+    if cached and cached[0] == version:
+        return cached[1]
+
+    figure = build_sensor_figure(df_charts, CHART_SPECS)
+    st.session_state["sensor_figure"] = (version, figure)
+    return figure
+
+@st.fragment(run_every=CHART_REFRESH)
+def charts_panel():
+    df, error = load_sensor_frame()
+    if error:
+        stale_notice(error)
+    figure = build_chart(df)
 
-        # Layer control
-        folium.LayerControl(position="topright", collapsed=False).add_to(m)
+    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+    if figure is not None:
+        st.plotly_chart(figure, width="stretch", key="sensor_chart")
+    else:
+        st.info("No sensor data to chart")
+    st.markdown('</div>', unsafe_allow_html=True)
 
-        # Render map in Streamlit with enhanced container
+@st.fragment(run_every=CHART_REFRESH)
+def table_panel():
+    df_charts, _ = load_sensor_frame()
+    available_cols = [c for c in ["moisture","temperature","tilt","vibration","timestamp"] if c in df_charts.columns]
+    if available_cols and not df_charts.empty:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-        st_folium(m, width="stretch", height=500)
+        st.dataframe(df_charts[available_cols], width="stretch", height=400)
         st.markdown('</div>', unsafe_allow_html=True)
+    else:
+        st.info("No sensor data available.")
 
 
-except Exception as e:
-    st.error(f"Error fetching data: {e}")
+# --- Main Layout: Left Panel (30%) + Map (70%) ---
+left_col, right_col = st.columns([3, 7])
+
+with left_col:
+    realtime_alert_panel()
+    prediction_panel()
+    weather_panel()
+
+with right_col:
+    metrics_panel()
+    map_panel()
 
 # ------------------ ENHANCED SENSOR CHARTS SECTION ------------------
 st.markdown("---")
@@ -359,92 +496,7 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Create separate charts for each sensor in a single row
-sensor_col1, sensor_col2, sensor_col3, sensor_col4 = st.columns([1, 1, 1, 1])
-
-# Moisture Chart
-with sensor_col1:
-    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-    st.markdown("### 💧 Moisture")
-    if "moisture" in df_charts.columns:
-        fig_moisture = px.line(df_charts, x="time_only", y="moisture", markers=True, 
-                              color_discrete_sequence=['#1f77b4'])
-        fig_moisture.update_layout(
-            xaxis_title="Time",
-            yaxis_title="Moisture (%)",
-            height=300,
-            showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12)
-        )
-        st.plotly_chart(fig_moisture, use_container_width=True)
-    else:
-        st.info("No moisture data")
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# Temperature Chart
-with sensor_col2:
-    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-    st.markdown("### 🌡️ Temperature")
-    if "temperature" in df_charts.columns:
-        fig_temp = px.line(df_charts, x="time_only", y="temperature", markers=True, 
-                          color_discrete_sequence=['#ff7f0e'])
-        fig_temp.update_layout(
-            xaxis_title="Time",
-            yaxis_title="Temperature (°C)",
-            height=300,
-            showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12)
-        )
-        st.plotly_chart(fig_temp, use_container_width=True)
-    else:
-        st.info("No temperature data")
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# Tilt Chart
-with sensor_col3:
-    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-    st.markdown("### 📐 Tilt")
-    if "tilt" in df_charts.columns:
-        fig_tilt = px.line(df_charts, x="time_only", y="tilt", markers=True, 
-                          color_discrete_sequence=['#2ca02c'])
-        fig_tilt.update_layout(
-            xaxis_title="Time",
-            yaxis_title="Tilt (degrees)",
-            height=300,
-            showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12)
-        )
-        st.plotly_chart(fig_tilt, use_container_width=True)
-    else:
-        st.info("No tilt data")
-    st.markdown('</div>', unsafe_allow_html=True)
-
-# Vibration Chart
-with sensor_col4:
-    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-    st.markdown("### 📳 Vibration")
-    if "vibration" in df_charts.columns:
-        fig_vibration = px.line(df_charts, x="time_only", y="vibration", markers=True, 
-                               color_discrete_sequence=['#d62728'])
-        fig_vibration.update_layout(
-            xaxis_title="Time",
-            yaxis_title="Vibration (g)",
-            height=300,
-            showlegend=False,
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12)
-        )
-        st.plotly_chart(fig_vibration, use_container_width=True)
-    else:
-        st.info("No vibration data")
-    st.markdown('</div>', unsafe_allow_html=True)
+charts_panel()
 
 # Enhanced Sensor Readings Table
 st.markdown("---")
@@ -455,10 +507,4 @@ st.markdown("""
         </div>
         """, unsafe_allow_html=True)
 
-available_cols = [c for c in ["moisture","temperature","tilt","vibration","timestamp"] if c in df_charts.columns]
-if available_cols:
-    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-    st.dataframe(df_charts[available_cols], width="stretch", height=400)
-    st.markdown('</div>', unsafe_allow_html=True)
-else:
-    st.info("No sensor data available.")
+table_panel()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+TerraShield Monitor Leader Lease
+Lease-based leader election so only one of several redundant monitors sends alerts
+
+The active monitor renews its lease several times per TTL. A standby polls the
+lease on the same cadence and takes over as soon as the lease expires (or is
+released on shutdown), so failover happens within one TTL.
+
+Backends:
+  sqlite    - lease row in a local SQLite file (monitors on the same host/share)
+  supabase  - lease row in the `monitor_leases` table (monitors on different hosts)
+              columns: name text primary key, holder text, expires_at float8
+"""
+
+import os
+import time
+import uuid
+import socket
+import sqlite3
+
+DEFAULT_LEASE_NAME = "sensor-alert-monitor"
+
+class Lease:
+    """Base class: acquire() takes or renews the lease, is_held() is a local check"""
+
+    def __init__(self, name=DEFAULT_LEASE_NAME, ttl_seconds=30.0, holder_id=None):
+        self.name = name
+        self.ttl_seconds = float(ttl_seconds)
+        self.holder_id = holder_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._expires_at = 0.0
+
+    def _try_acquire(self, now, expires_at):
+        raise NotImplementedError
+
+    def _release(self):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.__class__.__name__
+
+    def acquire(self):
+        """Take the lease if free/expired, or renew it if we hold it"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        try:
+            held = self._try_acquire(now, expires_at)
+        except Exception as e:
+            print(f"⚠️ Lease check failed: {e}")
+            held = False
+
+        self._expires_at = expires_at if held else 0.0
+        return held
+
+    def is_held(self, margin_seconds=1.0):
+        """True while our last successful acquire/renew is still comfortably valid"""
+        return time.time() + margin_seconds < self._expires_at
+
+    def release(self):
+        """Give the lease up so a standby can take over immediately"""
+        if not self._expires_at:
+            return
+        self._expires_at = 0.0
+        try:
+            self._release()
+        except Exception as e:
+            print(f"⚠️ Could not release lease: {e}")
+
+class SQLiteLease(Lease):
+    """Lease stored in a local SQLite file"""
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            "name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def describe(self):
+        return f"sqlite:{self.path}"
+
+    def _try_acquire(self, now, expires_at):
+        cur = self.conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            cur.execute(
+                "INSERT OR IGNORE INTO leases (name, holder, expires_at) VALUES (?, '', 0)",
+                (self.name,)
+            )
+            cur.execute(
+                "UPDATE leases SET holder = ?, expires_at = ? "
+                "WHERE name = ? AND (holder = ? OR expires_at < ?)",
+                (self.holder_id, expires_at, self.name, self.holder_id, now)
+            )
+            held = cur.rowcount == 1
+            cur.execute("COMMIT")
+            return held
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+
+    def _release(self):
+        self.conn.execute(
+            "UPDATE leases SET expires_at = 0 WHERE name = ? AND holder = ?",
+            (self.name, self.holder_id)
+        )
+
+class SupabaseLease(Lease):
+    """Lease stored as a row in Supabase, taken with a conditional update"""
+
+    TABLE = "monitor_leases"
+
+    def __init__(self, db, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self._row_ready = False
+
+    def describe(self):
+        return f"supabase:{self.TABLE}"
+
+    def _ensure_row(self):
+        if self._row_ready:
+            return
+        try:
+            self.db.run("lease_create", lambda t: t(self.TABLE).insert(
+                {"name": self.name, "holder": "", "expires_at": 0}
+            ))
+        except Exception:
+            pass  # Row already exists
+        self._row_ready = True
+
+    def _try_acquire(self, now, expires_at):
+        self._ensure_row()
+        # Short deadline: a slow renewal must not outlive the lease itself
+        rows = self.db.run("lease_acquire", lambda t: (
+            t(self.TABLE)
+            .update({"holder": self.holder_id, "expires_at": expires_at})
+            .eq("name", self.name)
+            .or_(f"holder.eq.{self.holder_id},expires_at.lt.{now}")
+        ), deadline=self.ttl_seconds / 3)
+        return bool(rows)
+
+    def _release(self):
+        self.db.run("lease_release", lambda t: (
+            t(self.TABLE)
+            .update({"expires_at": 0})
+            .eq("name", self.name)
+            .eq("holder", self.holder_id)
+        ))
+
+def create_lease(db=None, interval_seconds=60):
+    """Build the lease configured in the environment (None when disabled)"""
+    backend = os.getenv("MONITOR_LEASE_BACKEND", "sqlite").lower()
+    # Short enough that a standby takes over within one monitoring interval
+    ttl = float(os.getenv("MONITOR_LEASE_TTL", max(min(interval_seconds * 0.5, 30), 2)))
+    name = os.getenv("MONITOR_LEASE_NAME", DEFAULT_LEASE_NAME)
+
+    if backend == "none":
+        return None
+    if backend == "supabase":
+        if db is None:
+            raise ValueError("Supabase lease backend needs a database (data_access.get_database())")
+        return SupabaseLease(db, name=name, ttl_seconds=ttl)
+    if backend == "sqlite":
+        path = os.getenv(
+            "MONITOR_LEASE_PATH",
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitor_lease.db")
+        )
+        return SQLiteLease(path, name=name, ttl_seconds=ttl)
+
+    raise ValueError(f"Unknown MONITOR_LEASE_BACKEND: {backend}")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+TerraShield Sharded Monitor Supervisor
+Runs N monitor worker processes, assigns nodes to them by consistent hashing
+and sends alerts centrally from the aggregated results
+
+Alerts are only sent while the supervisor holds the monitor lease
+(monitor_lease.py), so it can run alongside redundant monitors or another
+supervisor; without the lease a cycle still evaluates every node.
+
+/healthz, /readyz, /metrics and /traces are served on MONITOR_METRICS_PORT
+(0 disables); traces come back from the workers inside their results.
+Cycles can be profiled with PROFILE_RATE or on demand with SIGUSR2.
+"""
+
+import os
+import sys
+import time
+import queue
+import bisect
+import hashlib
+import multiprocessing as mp
+from datetime import datetime
+
+from sensor_alert_monitor import SensorAlertMonitor, IS_LEADER
+from monitor_lease import create_lease
+from metrics import ALERTS_EVALUATED
+from tracing import tracer
+from profiling import profiler
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, replicas=64):
+        self.replicas = replicas
+        self._keys = []
+        self._owners = {}
+
+    @staticmethod
+    def _hash(value):
+        return int(hashlib.md5(str(value).encode("utf-8")).hexdigest()[:16], 16)
+
+    def add(self, member):
+        for i in range(self.replicas):
+            key = self._hash(f"{member}#{i}")
+            self._owners[key] = member
+            bisect.insort(self._keys, key)
+
+    def remove(self, member):
+        for i in range(self.replicas):
+            key = self._hash(f"{member}#{i}")
+            if self._owners.pop(key, None) is not None:
+                self._keys.remove(key)
+
+    def members(self):
+        return set(self._owners.values())
+
+    def get(self, item):
+        """Member responsible for an item (None if the ring is empty)"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, self._hash(item)) % len(self._keys)
+        return self._owners[self._keys[index]]
+
+def worker_main(worker_id, task_queue, result_queue):
+    """Worker process: evaluate every node in each task and report outcomes"""
+    try:
+        monitor = SensorAlertMonitor()
+    except Exception as e:
+        print(f"❌ Worker {worker_id} failed to start: {e}")
+        return
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        cycle_id, node_ids = task
+        for node_id in node_ids:
+            try:
+                sensor_data = monitor.fetch_latest_sensor_data(node_id)
+                alert_info = monitor.check_alert_conditions(sensor_data) if sensor_data else None
+                result_queue.put((cycle_id, worker_id, node_id, sensor_data, alert_info, None))
+            except Exception as e:
+                result_queue.put((cycle_id, worker_id, node_id, None, None, str(e)))
+
+class MonitorSupervisor:
+    def __init__(self, num_workers=None, interval_seconds=60):
+        """Initialize the supervisor (worker processes start in run())"""
+        self.num_workers = num_workers or os.cpu_count() or 2
+        self.interval_seconds = interval_seconds
+        self.ctx = mp.get_context("spawn")
+        self.result_queue = self.ctx.Queue()
+        self.workers = {}
+        self.ring = HashRing()
+        self.cycle_id = 0
+
+        # Used for node discovery and for sending alerts centrally
+        self.monitor = SensorAlertMonitor()
+        self.lease = create_lease(self.monitor.db, interval_seconds)
+        self.is_leader = self.lease is None
+
+        print(f"✅ Monitor supervisor initialized with {self.num_workers} workers")
+
+    def start_worker(self, worker_id):
+        """Start (or restart) one worker process and add it to the ring"""
+        task_queue = self.ctx.Queue()
+        process = self.ctx.Process(
+            target=worker_main,
+            args=(worker_id, task_queue, self.result_queue),
+            name=f"terrashield-monitor-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self.workers[worker_id] = (process, task_queue)
+        self.ring.add(worker_id)
+        print(f"👷 Worker {worker_id} started (pid {process.pid})")
+
+    def reap_dead_workers(self):
+        """Drop dead workers from the ring so their nodes rebalance to the survivors"""
+        dead = []
+        for worker_id, (process, _) in list(self.workers.items()):
+            if process.is_alive():
+                continue
+            print(f"⚠️ Worker {worker_id} died (exit code {process.exitcode}), rebalancing its nodes")
+            self.ring.remove(worker_id)
+            del self.workers[worker_id]
+            dead.append(worker_id)
+        return dead
+
+    def respawn_workers(self):
+        """Start replacements for any missing workers"""
+        for worker_id in range(self.num_workers):
+            if worker_id not in self.workers:
+                self.start_worker(worker_id)
+
+    def dispatch(self, node_ids):
+        """Send node IDs to their owning workers; returns the assignment"""
+        assignment = self.assign_nodes(node_ids)
+        for worker_id, nodes in assignment.items():
+            self.workers[worker_id][1].put((self.cycle_id, nodes))
+        return assignment
+
+    def assign_nodes(self, node_ids):
+        """Group node IDs by the worker that owns them on the ring"""
+        assignment = {}
+        for node_id in node_ids:
+            worker_id = self.ring.get(node_id)
+            if worker_id is not None:
+                assignment.setdefault(worker_id, []).append(node_id)
+        return assignment
+
+    def acquire_lease(self):
+        """Take or renew the monitor lease; returns whether this supervisor may send alerts"""
+        if self.lease is None:
+            return True
+        was_leader, self.is_leader = self.is_leader, self.lease.acquire()
+        if self.is_leader and not was_leader:
+            print(f"👑 Acquired monitor lease ({self.lease.describe()}) - sending alerts")
+        elif was_leader and not self.is_leader:
+            print("⚠️ Lost monitor lease - evaluating without alerts")
+        return self.is_leader
+
+    def run_cycle(self):
+        """Dispatch one evaluation cycle and collect results until the deadline"""
+        self.cycle_id += 1
+        started = time.time()
+        print(f"\n🔄 Starting sharded cycle {self.cycle_id} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        self.acquire_lease()
+        IS_LEADER.set(1 if self.is_leader else 0)
+
+        self.reap_dead_workers()
+        self.respawn_workers()
+
+        node_ids = self.monitor.fetch_active_node_ids()
+        if not node_ids:
+            print("❌ No active nodes found, skipping cycle")
+            self.monitor.cycle_finished()
+            return
+
+        assignment = self.dispatch(node_ids)
+        owners = {node_id: worker_id for worker_id, nodes in assignment.items() for node_id in nodes}
+
+        pending = set(node_ids)
+        alerts = []
+        errors = 0
+        deadline = started + self.interval_seconds * 0.9
+
+        while pending and time.time() < deadline:
+            try:
+                cycle_id, worker_id, node_id, sensor_data, alert_info, error = self.result_queue.get(
+                    timeout=min(max(deadline - time.time(), 0.01), 1.0)
+                )
+            except queue.Empty:
+                # Re-dispatch the unfinished nodes of any worker that died mid-cycle
+                dead = self.reap_dead_workers()
+                orphaned = [n for n in pending if owners.get(n) in dead]
+                if orphaned and self.workers:
+                    for worker_id, nodes in self.dispatch(orphaned).items():
+                        for node_id in nodes:
+                            owners[node_id] = worker_id
+                continue
+
+            if cycle_id != self.cycle_id:
+                continue  # Late result from an earlier cycle
+            pending.discard(node_id)
+
+            if error:
+                errors += 1
+                print(f"❌ Worker {worker_id} failed on node {node_id}: {error}")
+                continue
+            if sensor_data:
+                # Workers evaluate; their counters live in their own processes
+                ALERTS_EVALUATED.inc()
+                self.monitor.last_reading_at[node_id] = sensor_data.get("timestamp")
+                tracer.finish(sensor_data.get("trace"), "reading")
+            if alert_info and alert_info["should_alert"]:
+                alerts.append((sensor_data, alert_info))
+
+        if alerts:
+            # Collecting results can outlast the TTL, so renew before sending
+            self.acquire_lease()
+        for sensor_data, alert_info in alerts:
+            self.monitor.print_sensor_status(sensor_data, alert_info)
+            if self.lease is not None and not self.lease.is_held():
+                print("⚠️ Monitor lease not held - leaving alerts to the active monitor")
+                continue
+            self.monitor.send_alerts(sensor_data, alert_info)
+
+        print(
+            f"📊 Cycle {self.cycle_id}: {len(node_ids) - len(pending)}/{len(node_ids)} nodes evaluated "
+            f"across {len(assignment)} workers, {len(alerts)} alerts, {errors} errors "
+            f"in {time.time() - started:.1f}s"
+        )
+        if pending:
+            print(f"⚠️ No result before deadline for nodes: {sorted(pending, key=str)}")
+        self.monitor.cycle_finished()
+
+    def run(self):
+        """Start workers and run cycles until interrupted"""
+        self.respawn_workers()
+        self.monitor.start_metrics(self.interval_seconds)
+        profiler.install_signal()
+
+        print(f"🚀 Starting sharded monitoring (interval: {self.interval_seconds}s)")
+        print("Press Ctrl+C to stop")
+
+        try:
+            while True:
+                started = time.time()
+                with profiler.profile("monitor_supervisor_cycle"):
+                    self.run_cycle()
+                self.wait_until(started + self.interval_seconds)
+        except KeyboardInterrupt:
+            print("\n🛑 Monitoring stopped by user")
+        finally:
+            self.stop()
+
+    def wait_until(self, next_run):
+        """Sleep until the next cycle, renewing the lease several times per TTL"""
+        while time.time() < next_run:
+            if self.lease is None:
+                time.sleep(next_run - time.time())
+                return
+            time.sleep(max(min(self.lease.ttl_seconds / 3, next_run - time.time()), 0))
+            self.acquire_lease()
+            IS_LEADER.set(1 if self.is_leader else 0)
+
+    def run_once(self):
+        """Start workers, run a single cycle under the lease and shut down"""
+        self.respawn_workers()
+        try:
+            self.run_cycle()
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Ask workers to exit, wait briefly for them and give up the lease"""
+        for process, task_queue in self.workers.values():
+            task_queue.put(None)
+        for process, _ in self.workers.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self.lease is not None:
+            self.lease.release()
+
+def main():
+    """Main function to run the sharded monitor supervisor"""
+    try:
+        once = "--once" in sys.argv[1:]
+        args = [arg for arg in sys.argv[1:] if arg != "--once"]
+        num_workers = int(args[0]) if len(args) > 0 else None
+        interval = int(args[1]) if len(args) > 1 else 60
+        supervisor = MonitorSupervisor(num_workers, interval)
+        if once:
+            supervisor.run_once()
+        else:
+            supervisor.run()
+    except ValueError as e:
+        print(f"❌ {e}")
+        print("Usage: python monitor_supervisor.py [--once] [num_workers] [interval_seconds]")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Fatal error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
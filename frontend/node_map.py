@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+TerraShield Node Map
+Multi-node risk map with marker clustering and incremental marker updates
+
+The base map (tiles and layer control) is identical on every refresh, so
+st_folium keeps the same component and the user's pan/zoom. Only the node
+layer is rebuilt and sent as a feature group, which the component swaps in
+place without reloading the map.
+"""
+
+import folium
+from folium.plugins import MarkerCluster
+
+DEFAULT_CENTER = (19.198088, 72.827102)
+
+RISK_COLORS = {
+    "CRITICAL": "#ff3742",
+    "WARNING": "#ff9500",
+    "NORMAL": "#26d367",
+    "UNKNOWN": "#8395a7",
+}
+
+def build_base_map(center=DEFAULT_CENTER, zoom_start=15):
+    """Base map with street and satellite layers (no node markers)"""
+    # Create base map without default tiles
+    m = folium.Map(location=list(center), zoom_start=zoom_start, control_scale=True, tiles=None)
+
+    # --- Base Layers ---
+    # Street Map (OpenStreetMap)
+    folium.TileLayer(
+        tiles="OpenStreetMap",
+        name="Street Map",
+        attr="© OpenStreetMap contributors"
+    ).add_to(m)
+
+    # Satellite
+    folium.TileLayer(
+        tiles="https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}",
+        name="Satellite",
+        attr="Tiles © Esri — Source: Esri, Maxar, Earthstar Geographics, and the GIS User Community"
+    ).add_to(m)
+
+    # Layer control
+    folium.LayerControl(position="topright", collapsed=False).add_to(m)
+    return m
+
+def node_popup(node, latest, risk_level):
+    """Popup HTML for one node"""
+    if latest is None:
+        readings = '<p style="margin: 5px 0;">No recent readings</p>'
+    else:
+        readings = f"""
+        <p style="margin: 5px 0;"><strong>💧 Moisture:</strong> {latest['moisture']:.1f}%</p>
+        <p style="margin: 5px 0;"><strong>🌡️ Temperature:</strong> {latest['temperature']:.1f}°C</p>
+        <p style="margin: 5px 0;"><strong>📐 Tilt:</strong> {latest['tilt']:.1f}°</p>
+        <p style="margin: 5px 0;"><strong>📳 Vibration:</strong> {latest['vibration']:.1f}°/s</p>
+        """
+    return f"""
+    <div style="font-family: Arial, sans-serif; width: 200px;">
+        <h3 style="color: #2a5298; margin: 0 0 10px 0;">🌄 Node {node['node_id']}</h3>
+        <p style="margin: 5px 0;"><strong>🚦 Risk:</strong> {risk_level}</p>
+        <p style="margin: 5px 0;"><strong>📍 Location:</strong> {node['latitude']}, {node['longitude']}</p>
+        {readings}
+    </div>
+    """
+
+def build_node_layer(nodes, node_state):
+    """Clustered, risk-coloured node markers as a single feature group
+
+    nodes: [{"node_id", "latitude", "longitude"}, ...]
+    node_state: {node_id: (risk_level, latest_values_or_None)}
+    """
+    layer = folium.FeatureGroup(name="Nodes")
+    cluster = MarkerCluster(options={"disableClusteringAtZoom": 16}).add_to(layer)
+
+    for node in nodes:
+        risk_level, latest = node_state.get(node["node_id"], ("UNKNOWN", None))
+        color = RISK_COLORS.get(risk_level, RISK_COLORS["UNKNOWN"])
+        folium.CircleMarker(
+            [node["latitude"], node["longitude"]],
+            radius=10,
+            color=color,
+            weight=2,
+            fill=True,
+            fill_color=color,
+            fill_opacity=0.8,
+            tooltip=f"Node {node['node_id']} · {risk_level}",
+            popup=folium.Popup(node_popup(node, latest, risk_level), max_width=250),
+        ).add_to(cluster)
+
+    return layer
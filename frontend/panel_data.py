@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+TerraShield Panel Data
+Backend data for the live dashboard panels, fetched in one concurrent round
+
+load_panel_data() asks for /summary and the sensor rows newer than the buffer
+cursor through a single PanelFetcher.fetch_all(), so a tick costs the slower
+of the two requests rather than both. The rows are always appended to the
+shared SensorBuffer, whatever the summary returns, so the charts, table and
+map stay current while the summary-driven panels render from /summary.
+"""
+
+DEFAULT_TIMEOUT = 3.0
+ROW_LIMIT = 500
+
+def sensor_rows_spec(backend_url, since, timeout=DEFAULT_TIMEOUT):
+    """fetch_all() spec for rows newer than the buffer cursor (latest window on first load)"""
+    params = {"since": since, "limit": ROW_LIMIT} if since else {"limit": ROW_LIMIT}
+    return {"url": f"{backend_url}/sensor-data", "params": params, "timeout": timeout}
+
+def sensor_rows(result):
+    """Rows from a /sensor-data fetch result; raises when the backend failed"""
+    if result["error"]:
+        raise RuntimeError(result["error"])
+    data = result["data"]
+    if isinstance(data, dict):
+        if data.get("status") == "error":
+            raise RuntimeError(data.get("message"))
+        data = [data]
+    return data
+
+def summary_from(result):
+    """(summary, error) from a /summary fetch result; an unusable response is ({}, error)"""
+    data = result["data"]
+    if not isinstance(data, dict) or data.get("status") == "error":
+        return {}, result["error"] or (data or {}).get("message") or "unexpected /summary response"
+    return data, result["error"]
+
+def load_panel_data(fetcher, buffer, backend_url, timeout=DEFAULT_TIMEOUT):
+    """Fetch /summary and new sensor rows together and fold the rows into the buffer
+
+    Returns {"summary", "summary_error", "rows_error"}; the rows themselves are
+    read from buffer.df. On a failing backend the buffer keeps what it holds.
+    """
+    results = fetcher.fetch_all({
+        "summary": {"url": f"{backend_url}/summary", "timeout": timeout},
+        "sensor-data": sensor_rows_spec(backend_url, buffer.cursor, timeout),
+    })
+
+    summary, summary_error = summary_from(results["summary"])
+    try:
+        # Rows already held (the cursor may have moved meanwhile) are dropped by the buffer
+        buffer.refresh(lambda _since: sensor_rows(results["sensor-data"]))
+        rows_error = None
+    except Exception as e:
+        rows_error = str(e)
+
+    return {"summary": summary, "summary_error": summary_error, "rows_error": rows_error}
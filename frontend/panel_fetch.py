@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+TerraShield Panel Fetcher
+Concurrent, deadline-bounded HTTP fetching for dashboard panels
+
+All requests share one pooled keep-alive session. fetch_all() issues every
+panel's request at once and waits at most for the longest deadline, so a
+render costs the slowest source (capped by its deadline) rather than the sum
+of all sources. A source that errors or misses its deadline falls back to its
+last good response, marked stale, and the other panels are unaffected.
+
+Request latency is recorded per source in panel_fetch_duration_seconds, and
+fallbacks to the last good response count as stale cache_requests_total.
+"""
+
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from metrics import CACHE_REQUESTS, histogram
+
+DEFAULT_TIMEOUT = 3.0
+
+FETCH_SECONDS = histogram("panel_fetch_duration_seconds", "Backend request latency per panel source", ("source", "outcome"))
+
+class PanelFetcher:
+    def __init__(self, pool_size=10, max_workers=8):
+        """Create the pooled session and the worker threads that issue requests"""
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="panel-fetch")
+        self._last_good = {}    # name -> (data, fetched_at)
+        self._lock = threading.Lock()
+
+    def _get_json(self, name, url, params, timeout):
+        with FETCH_SECONDS.time(source=name):
+            response = self.session.get(url, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def _remember(self, name, future):
+        """Keep successful responses, including ones that land after the deadline"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        with self._lock:
+            self._last_good[name] = (future.result(), time.time())
+
+    def fetch_all(self, specs):
+        """Fetch {name: {"url", "params", "timeout"}} concurrently
+
+        Returns {name: {"data", "stale", "error", "fetched_at"}}; data is the last
+        good response (or None) when a source fails or misses its deadline.
+        """
+        futures = {}
+        deadline = 0.0
+        for name, spec in specs.items():
+            timeout = spec.get("timeout", DEFAULT_TIMEOUT)
+            deadline = max(deadline, timeout)
+            future = self.executor.submit(self._get_json, name, spec["url"], spec.get("params"), timeout)
+            future.add_done_callback(lambda f, name=name: self._remember(name, f))
+            futures[name] = future
+
+        done, _ = wait(futures.values(), timeout=deadline)
+
+        results = {}
+        for name, future in futures.items():
+            if future in done and future.exception() is None:
+                CACHE_REQUESTS.inc(cache=f"panel_{name}", result="miss")
+                results[name] = {"data": future.result(), "stale": False, "error": None, "fetched_at": time.time()}
+                continue
+
+            error = "timed out" if future not in done else str(future.exception())
+            with self._lock:
+                data, fetched_at = self._last_good.get(name, (None, None))
+            CACHE_REQUESTS.inc(cache=f"panel_{name}", result="stale" if data is not None else "empty")
+            results[name] = {"data": data, "stale": True, "error": error, "fetched_at": fetched_at}
+
+        return results
+
+    def fetch(self, name, url, params=None, timeout=DEFAULT_TIMEOUT):
+        """Fetch a single source with the same deadline and fallback behaviour"""
+        return self.fetch_all({name: {"url": url, "params": params, "timeout": timeout}})[name]
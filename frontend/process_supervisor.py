@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+TerraShield Process Supervisor
+Starts the system's processes in dependency order and keeps them running
+
+Each Component is a command with an optional readiness probe. A component
+starts once everything it depends on is ready, so nothing waits on a fixed
+sleep. It counts as ready when its probe first succeeds: an HTTP endpoint
+answering, a port accepting connections, or (without a probe) the process
+still running after STARTUP_GRACE seconds. A child that exits is restarted
+after a delay that doubles on each consecutive crash (SUPERVISOR_BACKOFF up
+to SUPERVISOR_BACKOFF_MAX seconds). The delay resets once the child has
+stayed up for SUPERVISOR_STABLE seconds.
+
+Output from all children is printed with a [name] prefix, and also appended
+to SUPERVISOR_LOG if that is set. Uptime and restart counts per component
+are printed every SUPERVISOR_STATUS_INTERVAL seconds and on shutdown.
+"""
+
+import os
+import time
+import socket
+import signal
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+BACKOFF = float(os.getenv("SUPERVISOR_BACKOFF", "1"))
+BACKOFF_MAX = float(os.getenv("SUPERVISOR_BACKOFF_MAX", "60"))
+STABLE_SECONDS = float(os.getenv("SUPERVISOR_STABLE", "60"))
+READY_TIMEOUT = float(os.getenv("SUPERVISOR_READY_TIMEOUT", "60"))
+STATUS_INTERVAL = float(os.getenv("SUPERVISOR_STATUS_INTERVAL", "300"))
+STOP_TIMEOUT = float(os.getenv("SUPERVISOR_STOP_TIMEOUT", "35"))
+LOG_FILE = os.getenv("SUPERVISOR_LOG", "")
+STARTUP_GRACE = 2.0
+POLL_INTERVAL = 0.2
+
+def http_probe(url, timeout=1.0):
+    """Ready once `url` answers with a non-5xx status"""
+    def probe():
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                return response.status < 500
+        except urllib.error.HTTPError as e:
+            return e.code < 500
+        except (OSError, ValueError):
+            return False
+    probe.description = url
+    return probe
+
+def tcp_probe(host, port, timeout=1.0):
+    """Ready once host:port accepts connections"""
+    def probe():
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+    probe.description = f"tcp://{host}:{port}"
+    return probe
+
+class Component:
+    def __init__(self, name, command, cwd=None, ready=None, depends_on=(), restart=True, env=None):
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.probe = ready
+        self.depends_on = tuple(depends_on)
+        self.restart = restart
+        self.env = env or {}
+
+        self.process = None
+        self.ready = False
+        self.started_at = None      # monotonic time of the current run
+        self.ready_after = None     # seconds from start to ready, current run
+        self.restarts = 0
+        self.crashes = 0            # consecutive crashes, drives the backoff
+        self.next_start = 0.0       # monotonic time the next (re)start is due
+        self.last_exit = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def uptime(self):
+        return time.monotonic() - self.started_at if self.running else 0.0
+
+    def check_ready(self):
+        if self.probe is None:
+            return self.uptime() >= STARTUP_GRACE
+        return self.probe()
+
+class Supervisor:
+    def __init__(self, components, log_file=LOG_FILE):
+        self.components = {c.name: c for c in components}
+        for c in components:
+            missing = [d for d in c.depends_on if d not in self.components]
+            if missing:
+                raise ValueError(f"{c.name} depends on unknown component(s): {', '.join(missing)}")
+        self.order = self._start_order()
+        self._log = open(log_file, "a", encoding="utf-8") if log_file else None
+        self._log_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def _start_order(self):
+        """Components sorted so each comes after its dependencies"""
+        order, visiting = [], set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through {name}")
+            visiting.add(name)
+            for dependency in self.components[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.components:
+            visit(name)
+        return order
+
+    # ---------- logging ----------
+    def log(self, name, line):
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] [{name}] {line}"
+        with self._log_lock:
+            print(line, flush=True)
+            if self._log:
+                self._log.write(line + "\n")
+                self._log.flush()
+
+    def _pump(self, component, stream):
+        for line in stream:
+            self.log(component.name, line.rstrip())
+
+    # ---------- children ----------
+    def _spawn(self, component):
+        env = {**os.environ, "PYTHONUNBUFFERED": "1", "PYTHONIOENCODING": "utf-8", **component.env}
+        try:
+            component.process = subprocess.Popen(
+                component.command, cwd=component.cwd, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                encoding="utf-8", errors="replace",
+            )
+        except OSError as e:
+            self.log("supervisor", f"❌ Could not start {component.name}: {e}")
+            self._schedule_restart(component)
+            return
+        component.started_at = time.monotonic()
+        component.ready = False
+        component.ready_after = None
+        self.log("supervisor", f"▶️ Started {component.name} (pid {component.process.pid})")
+        threading.Thread(target=self._pump, args=(component, component.process.stdout),
+                         name=f"log-{component.name}", daemon=True).start()
+
+    def _schedule_restart(self, component):
+        component.process = None
+        component.ready = False
+        component.crashes += 1
+        delay = min(BACKOFF * 2 ** (component.crashes - 1), BACKOFF_MAX)
+        component.next_start = time.monotonic() + delay
+        self.log("supervisor", f"🔁 Restarting {component.name} in {delay:.0f}s")
+
+    def _deps_ready(self, component):
+        return all(self.components[d].ready for d in component.depends_on)
+
+    def poll(self):
+        """One supervision step: start due components, probe readiness, reap exits"""
+        now = time.monotonic()
+        for name in self.order:
+            c = self.components[name]
+
+            if c.process is None:
+                if c.next_start is not None and now >= c.next_start and self._deps_ready(c):
+                    if c.started_at is not None:
+                        c.restarts += 1
+                    self._spawn(c)
+                continue
+
+            code = c.process.poll()
+            if code is not None:
+                c.last_exit = code
+                uptime = now - c.started_at
+                self.log("supervisor", f"⚠️ {name} exited with code {code} after {uptime:.0f}s")
+                if uptime >= STABLE_SECONDS:
+                    c.crashes = 0
+                if c.restart:
+                    self._schedule_restart(c)
+                else:
+                    c.process, c.ready, c.next_start = None, False, None
+                continue
+
+            if not c.ready and c.check_ready():
+                c.ready = True
+                c.ready_after = now - c.started_at
+                self.log("supervisor", f"✅ {name} ready after {c.ready_after:.1f}s")
+            if c.ready and c.crashes and now - c.started_at >= STABLE_SECONDS:
+                c.crashes = 0
+
+    def start(self, timeout=READY_TIMEOUT):
+        """Start everything and return once all components are ready (False on timeout)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.poll()
+            if all(c.ready for c in self.components.values()):
+                return True
+            time.sleep(POLL_INTERVAL)
+        waiting = [c.name for c in self.components.values() if not c.ready]
+        self.log("supervisor", f"⚠️ Not ready after {timeout:.0f}s: {', '.join(waiting)}")
+        return False
+
+    def run(self, status_interval=STATUS_INTERVAL):
+        """Supervise until stop() or Ctrl+C"""
+        next_status = time.monotonic() + status_interval
+        try:
+            while not self._stopping.is_set():
+                self.poll()
+                if time.monotonic() >= next_status:
+                    self.print_status()
+                    next_status = time.monotonic() + status_interval
+                self._stopping.wait(POLL_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        self._stopping.set()
+
+    def shutdown(self, timeout=STOP_TIMEOUT):
+        """Terminate children in reverse start order and wait for them"""
+        self.print_status()
+        for name in reversed(self.order):
+            c = self.components[name]
+            c.next_start = None
+            if not c.running:
+                continue
+            self.log("supervisor", f"🛑 Stopping {name}")
+            try:
+                c.process.terminate()
+                c.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.log("supervisor", f"⚠️ {name} did not stop in {timeout:.0f}s, killing it")
+                c.process.kill()
+                c.process.wait()
+            except ProcessLookupError:
+                pass
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    # ---------- reporting ----------
+    def status(self):
+        """Per-component state, uptime and restart count"""
+        report = {}
+        for name in self.order:
+            c = self.components[name]
+            report[name] = {
+                "state": ("ready" if c.ready else "starting" if c.running
+                          else "restarting" if c.next_start is not None else "stopped"),
+                "pid": c.process.pid if c.running else None,
+                "uptime_s": round(c.uptime(), 1),
+                "ready_after_s": round(c.ready_after, 2) if c.ready_after is not None else None,
+                "restarts": c.restarts,
+                "last_exit": c.last_exit,
+            }
+        return report
+
+    def print_status(self):
+        for name, s in self.status().items():
+            self.log(
+                "supervisor",
+                f"📊 {name}: {s['state']}, up {s['uptime_s']:.0f}s, "
+                f"{s['restarts']} restarts, last exit {s['last_exit']}"
+            )
+
+def install_signal_handlers(supervisor):
+    """Stop the supervisor (and its children) on SIGTERM as well as Ctrl+C"""
+    def on_signal(signum, frame):
+        supervisor.stop()
+    signal.signal(signal.SIGTERM, on_signal)
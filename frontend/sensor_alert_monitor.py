@@ -2,21 +2,45 @@
 """
 TerraShield Sensor Alert Monitor
 Fetches latest sensor values and sends WhatsApp alerts based on thresholds
+
+/healthz, /readyz, /metrics and /traces are served on MONITOR_METRICS_PORT
+(0 disables). Each new reading is traced from its created_at through fetch,
+evaluation and, for alerts, delivery to every recipient (see tracing.py).
+Cycles can be profiled with PROFILE_RATE or on demand with SIGUSR2 (see
+profiling.py).
 """
 
 import os
 import sys
-import math
 import time
 from datetime import datetime
 from dotenv import load_dotenv
-from supabase import create_client
-from twilio.rest import Client
 
 # Add backend directory to path to import modules
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
 from messages import translations, format_alert
+from calibration import with_derived
+from risk import MOISTURE_THRESHOLD, VIBRATION_THRESHOLD, TILT_THRESHOLD, check_thresholds
+from data_access import get_database, DatabaseError
+from spool import get_spool
+from monitor_lease import create_lease
+from language_prefs import get_language_prefs, DEFAULT_LANGUAGE
+from twilio_client import get_twilio_client, send_message
+from metrics import ALERTS_EVALUATED, ALERTS_FIRED, ALERTS_DELIVERED, collector, gauge, serve_metrics
+from tracing import Trace, tracer, parse_timestamp
+from profiling import profiler
+
+# Alert recipients: "fixed" sends to ALERT_PHONE only; "subscribers" sends to
+# every subscribed user in user_prefs (ALERT_PHONE while there are none)
+DEFAULT_ALERT_PHONE = "+918767840869"
+ALERT_PHONE = os.getenv("ALERT_PHONE", DEFAULT_ALERT_PHONE)
+ALERT_RECIPIENTS = os.getenv("ALERT_RECIPIENTS", "fixed").lower()
+
+METRICS_PORT = int(os.getenv("MONITOR_METRICS_PORT", "9101"))
+
+LAST_CYCLE = gauge("monitor_last_cycle_timestamp_seconds", "When the last monitoring cycle finished")
+IS_LEADER = gauge("monitor_is_leader", "1 while this instance holds the monitor lease")
 
 class SensorAlertMonitor:
     def __init__(self):
@@ -38,65 +62,104 @@ class SensorAlertMonitor:
         if not self.TWILIO_SID or not self.TWILIO_TOKEN:
             raise ValueError("TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN must be set in environment variables")
         
-        # Alert thresholds
-        self.MOISTURE_THRESHOLD = int(os.getenv("MOISTURE_THRESHOLD", "80"))
-        self.VIBRATION_THRESHOLD = int(os.getenv("VIBRATION_THRESHOLD", "10"))
-        self.TILT_THRESHOLD = int(os.getenv("TILT_THRESHOLD", "10"))
+        # Initialize clients (shared pooled database access)
+        self.db = get_database()
+        self.spool = get_spool()   # readings the backend could not store while offline
+        self.twilio_client = get_twilio_client()
+        self.last_reading_at = {}   # node_id -> created_at of the newest reading fetched
+        self.last_cycle_at = None
         
-        # Initialize clients
-        self.supabase = create_client(self.SUPABASE_URL, self.SUPABASE_KEY)
-        self.twilio_client = Client(self.TWILIO_SID, self.TWILIO_TOKEN)
+        # Per-user languages, kept current by changes broadcast from the backend / messaging gateway
+        self.language_prefs = get_language_prefs(self.db)
+        self.language_prefs.listen()
         
         print("✅ Sensor Alert Monitor initialized successfully")
-        print(f"📊 Thresholds - Moisture: {self.MOISTURE_THRESHOLD}%, Vibration: {self.VIBRATION_THRESHOLD}g, Tilt: {self.TILT_THRESHOLD}°")
+        print(f"📊 Thresholds - Moisture: {MOISTURE_THRESHOLD:g}%, Vibration: {VIBRATION_THRESHOLD:g}°/s, Tilt: {TILT_THRESHOLD:g}°")
     
-    def calculate_vibration(self, gx, gy, gz):
-        """Calculate vibration magnitude from gyroscope data"""
-        return math.sqrt(gx**2 + gy**2 + gz**2)
+    def start_metrics(self, interval_seconds=60, port=METRICS_PORT):
+        """Serve /healthz, /readyz and /metrics; ready while cycles keep finishing on time"""
+        @collector
+        def monitor_state():
+            now = time.time()
+            ages = []
+            for node_id, created_at in list(self.last_reading_at.items()):
+                ts = parse_timestamp(created_at)
+                if ts is not None:
+                    ages.append(({"node_id": node_id}, round(now - ts, 1)))
+            yield ("node_reading_age_seconds", "gauge", "Age of the node's newest reading seen by the monitor", ages)
+
+        def ready():
+            age = time.time() - self.last_cycle_at if self.last_cycle_at else None
+            ok = age is not None and age < 3 * interval_seconds + 30
+            return ok, {"last_cycle_age_seconds": round(age, 1) if age is not None else None}
+
+        return serve_metrics(port, ready=ready, routes={"/traces": tracer.slowest})
     
-    def calculate_tilt(self, ax, ay, az):
-        """Calculate tilt angle from accelerometer data"""
+    def cycle_finished(self):
+        """Record a completed cycle for /readyz and /metrics"""
+        self.last_cycle_at = time.time()
+        LAST_CYCLE.set(self.last_cycle_at)
+    
+    def fetch_active_node_ids(self):
+        """Get every node that has reported, including ones only in the spool"""
         try:
-            tilt = math.degrees(math.atan2(math.sqrt(ax**2 + ay**2), az))
-            return tilt
-        except Exception:
-            return 0
+            try:
+                rows = self.db.nodes()
+            except DatabaseError as e:
+                print(f"⚠️ Database unavailable ({e}), using spooled readings")
+                rows = []
+            node_ids = []
+            for node_id in [row.get("node_id") for row in rows] + self.spool.node_ids():
+                if node_id is not None and node_id not in node_ids:
+                    node_ids.append(node_id)
+            return node_ids
+            
+        except Exception as e:
+            print(f"❌ Error fetching node list: {e}")
+            return []
     
-    def fetch_latest_sensor_data(self):
-        """Fetch the latest sensor data from Supabase"""
+    def fetch_latest_sensor_data(self, node_id=None):
+        """Fetch the latest sensor data from Supabase or the local spool (optionally for one node)"""
         try:
-            response = (
-                self.supabase.table("sensor_readings")
-                .select("ax, ay, az, gx, gy, gz, moisture, temperature, created_at, node_id, packet_no, latitude, longitude")
-                .order("created_at", desc=True)
-                .limit(1)
-                .execute()
-            )
+            latest = None
+            try:
+                latest = self.db.latest_reading(node_id=node_id)
+            except DatabaseError as e:
+                print(f"⚠️ Database unavailable ({e}), using spooled readings")
             
-            if not response.data:
+            # Readings spooled while offline are newer than anything in the database
+            spooled = self.spool.latest(node_id)
+            if spooled and (latest is None or str(spooled.get("created_at")) > str(latest.get("created_at"))):
+                latest = spooled
+            
+            if not latest:
                 print("⚠️ No sensor data found in database")
                 return None
             
-            row = response.data[0]
+            # Moisture, vibration and tilt as stored at ingest
+            row = with_derived([latest])[0]
+            node_key, created_at = row.get("node_id"), row.get("created_at")
+            # Only a reading seen for the first time is traced; later cycles re-read the same row
+            trace = None
+            if self.last_reading_at.get(node_key) != created_at:
+                trace = Trace(f"{node_key}:{row.get('packet_no')}", parse_timestamp(created_at)).mark("fetched")
+            self.last_reading_at[node_key] = created_at
             print(f"📡 Fetched latest sensor data from node {row.get('node_id', 'unknown')}")
             
-            # Calculate derived values
-            gx, gy, gz = row.get("gx", 0), row.get("gy", 0), row.get("gz", 0)
-            vibration = self.calculate_vibration(gx, gy, gz)
-            
             ax, ay, az = row.get("ax", 0), row.get("ay", 0), row.get("az", 0)
-            tilt = self.calculate_tilt(ax, ay, az)
+            gx, gy, gz = row.get("gx", 0), row.get("gy", 0), row.get("gz", 0)
             
             sensor_data = {
-                "moisture": row.get("moisture", 0),
-                "vibration": round(vibration, 2),
-                "tilt": round(tilt, 2),
+                "moisture": row["moisture"],
+                "vibration": row["vibration"],
+                "tilt": row["tilt"],
                 "temperature": row.get("temperature", 0),
                 "node_id": row.get("node_id", "unknown"),
                 "packet_no": row.get("packet_no", 0),
                 "latitude": row.get("latitude", 0),
                 "longitude": row.get("longitude", 0),
                 "timestamp": row.get("created_at"),
+                "trace": trace,
                 "raw_data": {
                     "ax": ax, "ay": ay, "az": az,
                     "gx": gx, "gy": gy, "gz": gz
@@ -111,59 +174,25 @@ class SensorAlertMonitor:
     
     def check_alert_conditions(self, sensor_data):
         """Check if alert conditions are met based on sensor thresholds"""
-        moisture = sensor_data["moisture"]
-        vibration = sensor_data["vibration"]
-        tilt = sensor_data["tilt"]
-        
-        # Count how many thresholds are exceeded
-        exceeded_count = sum([
-            moisture > self.MOISTURE_THRESHOLD,
-            vibration > self.VIBRATION_THRESHOLD,
-            tilt > self.TILT_THRESHOLD
-        ])
-        
-        # Alert if 2 or more thresholds are exceeded
-        should_alert = exceeded_count >= 2
-        
-        alert_info = {
-            "should_alert": should_alert,
-            "exceeded_count": exceeded_count,
-            "moisture_exceeded": moisture > self.MOISTURE_THRESHOLD,
-            "vibration_exceeded": vibration > self.VIBRATION_THRESHOLD,
-            "tilt_exceeded": tilt > self.TILT_THRESHOLD,
-            "moisture_value": moisture,
-            "vibration_value": vibration,
-            "tilt_value": tilt
-        }
+        ALERTS_EVALUATED.inc()
+        # Alert if 2 or more thresholds are exceeded (same rules as the dashboard risk level)
+        alert_info = check_thresholds(sensor_data)
         
+        if sensor_data.get("trace") is not None:
+            sensor_data["trace"].mark("evaluated")
         return alert_info
     
     def get_subscribed_users(self):
-        """Get list of subscribed users - using hardcoded number with current language"""
-        # Get current language from language selector
-        current_language = self.get_current_language()
-        
-        # Hardcoded phone number for alerts
-        users = [
-            {"phone": "+918767840869", "language": current_language}
-        ]
-        print(f"👥 Sending alerts to: {users[0]['phone']} in {current_language}")
+        """Get alert recipients with their languages (from memory, no I/O)"""
+        users = self.language_prefs.subscribers() if ALERT_RECIPIENTS == "subscribers" else []
+        if not users:
+            users = [{"phone": ALERT_PHONE, "language": self.language_prefs.language(ALERT_PHONE)}]
+        print("👥 Sending alerts to: " + ", ".join(f"{u['phone']} ({u['language']})" for u in users))
         return users
     
-    def get_current_language(self):
-        """Get current language from file"""
-        try:
-            if os.path.exists("current_language.txt"):
-                with open("current_language.txt", "r") as f:
-                    language = f.read().strip()
-                    if language in ["english", "hindi", "marathi"]:
-                        return language
-        except Exception as e:
-            print(f"⚠️ Could not read language file: {e}")
-        return "english"  # Default fallback
-    
     def send_whatsapp_alert(self, phone, language, sensor_data, alert_info):
         """Send WhatsApp alert to a specific user"""
+        trace = sensor_data["trace"].branch(phone[-4:]) if sensor_data.get("trace") is not None else None
         try:
             # Format alert message based on language
             msg = format_alert(
@@ -184,21 +213,34 @@ class SensorAlertMonitor:
             full_msg = msg + context_msg
             
             # Send WhatsApp message
-            message = self.twilio_client.messages.create(
+            if trace is not None:
+                trace.mark("sent")
+            message = send_message(
                 from_=self.FROM_WHATSAPP,
                 to=f"whatsapp:{phone}",
-                body=full_msg
+                body=full_msg,
+                operation="alert",
+                client=self.twilio_client
             )
             
+            ALERTS_DELIVERED.inc(channel="whatsapp", outcome="sent")
+            if trace is not None:
+                tracer.finish(trace.mark("acknowledged"), "alert")
             print(f"✅ WhatsApp alert sent to {phone} (SID: {message.sid})")
             return True
             
         except Exception as e:
+            ALERTS_DELIVERED.inc(channel="whatsapp", outcome="failed")
+            if trace is not None:
+                tracer.finish(trace.mark("failed"), "alert", outcome="failed")
             print(f"❌ Failed to send WhatsApp alert to {phone}: {e}")
             return False
     
     def send_alerts(self, sensor_data, alert_info):
         """Send alerts to all subscribed users"""
+        ALERTS_FIRED.inc()
+        if sensor_data.get("trace") is not None:
+            sensor_data["trace"].mark("queued")
         users = self.get_subscribed_users()
         
         if not users:
@@ -208,7 +250,7 @@ class SensorAlertMonitor:
         success_count = 0
         for user in users:
             phone = user["phone"]
-            language = user.get("language", "english")
+            language = user.get("language") or DEFAULT_LANGUAGE
             
             if self.send_whatsapp_alert(phone, language, sensor_data, alert_info):
                 success_count += 1
@@ -242,7 +284,7 @@ class SensorAlertMonitor:
         temperature = sensor_data.get('temperature', 0) or 0
         
         print(f"  💧 Moisture: {moisture:.1f}% {'🚨' if alert_info['moisture_exceeded'] else '✅'}")
-        print(f"  📳 Vibration: {vibration:.1f}g {'🚨' if alert_info['vibration_exceeded'] else '✅'}")
+        print(f"  📳 Vibration: {vibration:.1f}°/s {'🚨' if alert_info['vibration_exceeded'] else '✅'}")
         print(f"  📐 Tilt: {tilt:.1f}° {'🚨' if alert_info['tilt_exceeded'] else '✅'}")
         print(f"  🌡️ Temperature: {temperature:.1f}°C")
         
@@ -255,7 +297,7 @@ class SensorAlertMonitor:
             print("  ✅ All sensors within normal range")
         print("="*60)
     
-    def run_monitoring_cycle(self):
+    def run_monitoring_cycle(self, lease=None):
         """Run one complete monitoring cycle"""
         print(f"\n🔄 Starting monitoring cycle at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
@@ -267,31 +309,95 @@ class SensorAlertMonitor:
         
         # Check alert conditions
         alert_info = self.check_alert_conditions(sensor_data)
+        tracer.finish(sensor_data["trace"], "reading")
         
         # Print status
         self.print_sensor_status(sensor_data, alert_info)
         
         # Send alerts if needed
         if alert_info['should_alert']:
+            if lease is not None and not lease.is_held():
+                print("⚠️ Lease expired during cycle - leaving alerts to the active monitor")
+                return
             self.send_alerts(sensor_data, alert_info)
         else:
             print("✅ No alerts needed - all sensors within normal range")
     
-    def run_continuous_monitoring(self, interval_seconds=60):
-        """Run continuous monitoring with specified interval"""
+    def run_once(self, lease=None):
+        """One cycle for --once: alerts are sent only if this instance can take the lease"""
+        if lease is None:
+            self.run_monitoring_cycle()
+            return
+        if not lease.acquire():
+            print(f"💤 Monitor lease held by another instance ({lease.describe()}) - evaluating without alerts")
+            self.run_standby_cycle()
+            return
+        try:
+            self.run_monitoring_cycle(lease=lease)
+        finally:
+            lease.release()
+    
+    def run_standby_cycle(self):
+        """Keep a standby monitor warm: fetch and evaluate, but never send alerts"""
+        sensor_data = self.fetch_latest_sensor_data()
+        if sensor_data:
+            alert_info = self.check_alert_conditions(sensor_data)
+            state = "ALERT" if alert_info["should_alert"] else "normal"
+            print(f"💤 Standby: latest reading {sensor_data['timestamp']} from node {sensor_data['node_id']} ({state})")
+    
+    def run_continuous_monitoring(self, interval_seconds=60, lease=None):
+        """Run continuous monitoring with specified interval
+        
+        With a lease, only the instance holding it sends alerts; the others stay
+        in warm standby and take over as soon as the lease expires.
+        """
         print(f"🚀 Starting continuous monitoring (interval: {interval_seconds}s)")
+        if lease is not None:
+            print(f"🔒 Leader election via {lease.describe()} (TTL {lease.ttl_seconds:.0f}s, id {lease.holder_id})")
         print("Press Ctrl+C to stop")
         
+        is_leader = lease is None
         try:
             while True:
-                self.run_monitoring_cycle()
+                started = time.time()
+                
+                if lease is not None:
+                    was_leader, is_leader = is_leader, lease.acquire()
+                    if is_leader and not was_leader:
+                        print("👑 Acquired monitor lease - this instance is now active")
+                    elif was_leader and not is_leader:
+                        print("⚠️ Lost monitor lease - switching to standby")
+                
+                with profiler.profile("monitor_cycle"):
+                    if is_leader:
+                        self.run_monitoring_cycle(lease=lease)
+                    else:
+                        self.run_standby_cycle()
+                IS_LEADER.set(1 if is_leader else 0)
+                self.cycle_finished()
+                
                 print(f"⏰ Waiting {interval_seconds} seconds until next check...")
-                time.sleep(interval_seconds)
+                next_run = started + interval_seconds
+                while time.time() < next_run:
+                    if lease is None:
+                        time.sleep(next_run - time.time())
+                        break
+                    time.sleep(max(min(lease.ttl_seconds / 3, next_run - time.time()), 0))
+                    # Leader renews; standby takes over the moment the lease frees up
+                    if lease.acquire():
+                        if not is_leader:
+                            break
+                    elif is_leader:
+                        print("⚠️ Lost monitor lease - switching to standby")
+                        is_leader = False
                 
         except KeyboardInterrupt:
             print("\n🛑 Monitoring stopped by user")
         except Exception as e:
             print(f"❌ Monitoring error: {e}")
+        finally:
+            if lease is not None:
+                lease.release()
 
 def main():
     """Main function to run the sensor alert monitor"""
@@ -303,17 +409,20 @@ def main():
         if len(sys.argv) > 1:
             if sys.argv[1] == "--once":
                 # Run once
-                monitor.run_monitoring_cycle()
+                monitor.run_once(create_lease(monitor.db))
             elif sys.argv[1] == "--continuous":
                 # Run continuously
                 interval = int(sys.argv[2]) if len(sys.argv) > 2 else 60
-                monitor.run_continuous_monitoring(interval)
+                monitor.start_metrics(interval)
+                profiler.install_signal()
+                lease = create_lease(monitor.db, interval)
+                monitor.run_continuous_monitoring(interval, lease)
             else:
                 print("Usage: python sensor_alert_monitor.py [--once|--continuous] [interval_seconds]")
                 sys.exit(1)
         else:
             # Default: run once
-            monitor.run_monitoring_cycle()
+            monitor.run_once(create_lease(monitor.db))
             
     except Exception as e:
         print(f"❌ Fatal error: {e}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+TerraShield Sensor Buffer
+Bounded, time-ordered store of sensor rows for the dashboard
+
+Each refresh only asks the backend for rows at or after the newest timestamp
+already held, derives columns for those new rows, and appends them to a single
+ascending DataFrame. When nothing new arrives the same DataFrame object is
+returned, so reruns with no new data do no DataFrame work at all.
+"""
+
+import time
+import threading
+import pandas as pd
+
+SENSOR_COLUMNS = ["node_id", "moisture", "temperature", "tilt", "vibration", "timestamp"]
+
+class SensorBuffer:
+    def __init__(self, max_rows=5000):
+        """Create an empty buffer holding at most max_rows readings"""
+        self.max_rows = max_rows
+        self.df = pd.DataFrame(columns=SENSOR_COLUMNS)
+        self.cursor = None          # raw created_at string of the newest row held
+        self.version = 0            # bumped whenever rows are appended
+        self.last_fetch = 0.0
+        self._lock = threading.Lock()
+
+    def _prepare(self, rows):
+        """Build a DataFrame for newly fetched rows and derive their columns"""
+        new = pd.DataFrame(rows)
+        for column in SENSOR_COLUMNS:
+            if column not in new.columns:
+                new[column] = 0 if column != "timestamp" else None
+
+        new["raw_timestamp"] = new["timestamp"]
+        new["timestamp"] = pd.to_datetime(new["timestamp"], errors="coerce", utc=True)
+        new = new.dropna(subset=["timestamp"]).sort_values("timestamp", kind="stable")
+        return new
+
+    def _drop_seen(self, new):
+        """Drop rows already held (the cursor query is inclusive of the last timestamp)"""
+        if self.df.empty:
+            return new
+        last_ts = self.df["timestamp"].iloc[-1]
+        held_at_last = set(self.df.loc[self.df["timestamp"] == last_ts, "node_id"])
+        keep = (new["timestamp"] > last_ts) | (
+            (new["timestamp"] == last_ts) & ~new["node_id"].isin(held_at_last)
+        )
+        return new[keep]
+
+    def refresh(self, fetch_rows, min_interval=0):
+        """Append rows from fetch_rows(since_cursor); returns the buffer DataFrame
+        
+        Calls within min_interval seconds of the last fetch reuse the buffer as is,
+        so several panels can ask for fresh data without each hitting the backend.
+        """
+        with self._lock:
+            if time.time() - self.last_fetch < min_interval:
+                return self.df
+            self.last_fetch = time.time()
+            rows = fetch_rows(self.cursor)
+            if not rows:
+                return self.df
+
+            new = self._drop_seen(self._prepare(rows))
+            if new.empty:
+                return self.df
+
+            self.cursor = new["raw_timestamp"].iloc[-1]
+            new = new.drop(columns=["raw_timestamp"])
+
+            combined = pd.concat([self.df, new], ignore_index=True) if not self.df.empty else new.reset_index(drop=True)
+            if len(combined) > self.max_rows:
+                combined = combined.iloc[-self.max_rows:].reset_index(drop=True)
+
+            self.df = combined
+            self.version += 1
+            return self.df
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+TerraShield Sensor Charts
+Linked WebGL sensor subplots on one real datetime axis
+
+Every sensor gets its own row in a single figure with a shared x-axis, drawn
+with Scattergl so the browser renders on the GPU. Series longer than the point
+budget are reduced on the Streamlit server with min/max bucketing (spikes such
+as tremor bursts survive) before anything is shipped to the browser.
+"""
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+POINT_BUDGET = 2000     # points per trace sent to the browser
+
+def downsample_minmax(x, y, budget=POINT_BUDGET):
+    """Indices keeping the min and max of each bucket, for at most ~budget points"""
+    n = len(y)
+    if n <= budget:
+        return np.arange(n)
+
+    buckets = max(budget // 2, 1)
+    bucket = np.arange(n) * buckets // n
+    values = np.nan_to_num(np.asarray(y, dtype=float), nan=0.0)
+
+    # Sort by (bucket, value): the first/last entry of each bucket is its min/max
+    order = np.lexsort((values, bucket))
+    sorted_bucket = bucket[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+def build_sensor_figure(df, specs, point_budget=POINT_BUDGET):
+    """One figure, one row per sensor in specs [(column, title, color, y_title), ...]
+
+    Multiple nodes are drawn as separate traces in each row. Returns None when
+    there is nothing to plot.
+    """
+    specs = [spec for spec in specs if spec[0] in df.columns]
+    if df.empty or not specs:
+        return None
+
+    fig = make_subplots(
+        rows=len(specs), cols=1, shared_xaxes=True, vertical_spacing=0.04,
+        subplot_titles=[title for _, title, _, _ in specs]
+    )
+
+    groups = df.groupby("node_id", sort=True) if "node_id" in df.columns and df["node_id"].nunique() > 1 else [(None, df)]
+    downsampled = False
+
+    for node_id, node_df in groups:
+        x = node_df["timestamp"].to_numpy()
+        for row, (column, _, color, y_title) in enumerate(specs, start=1):
+            y = node_df[column].to_numpy(dtype=float)
+            keep = downsample_minmax(x, y, point_budget)
+            downsampled = downsampled or len(keep) < len(y)
+
+            fig.add_trace(
+                go.Scattergl(
+                    x=x[keep], y=y[keep],
+                    mode="lines+markers" if len(keep) <= 200 else "lines",
+                    name=f"Node {node_id}" if node_id is not None else column.title(),
+                    legendgroup=str(node_id),
+                    showlegend=node_id is not None and row == 1,
+                    line=dict(color=color if node_id is None else None, width=1.5),
+                    marker=dict(size=4),
+                ),
+                row=row, col=1
+            )
+            fig.update_yaxes(title_text=y_title, row=row, col=1)
+
+    fig.update_layout(
+        height=220 * len(specs),
+        margin=dict(l=40, r=20, t=40, b=30),
+        hovermode="x unified",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(size=12),
+        uirevision="sensor-charts",   # keep zoom/pan across refreshes
+    )
+    fig.update_xaxes(title_text="Time", row=len(specs), col=1)
+    if downsampled:
+        fig.add_annotation(
+            text=f"downsampled to ≤{point_budget} points per series",
+            xref="paper", yref="paper", x=1, y=1.02, showarrow=False,
+            font=dict(size=10, color="#666"), xanchor="right", yanchor="bottom"
+        )
+    return fig
@@ -1,64 +1,62 @@
 #!/usr/bin/env python3
 """
 TerraShield Complete System Startup
-Runs both language selector and sensor monitor
+Runs the messaging gateway and the sensor monitor
+
+The monitor starts once the gateway accepts connections. Both are restarted
+if they exit (see process_supervisor.py).
 """
 
 import os
 import sys
-import time
-import threading
-import subprocess
-from datetime import datetime
 
-def run_language_selector():
-    """Run the language selector in a separate thread"""
-    print("🌍 Starting Language Selector...")
-    try:
-        subprocess.run([sys.executable, "language_selector.py"], check=True)
-    except Exception as e:
-        print(f"❌ Language selector error: {e}")
+from process_supervisor import Supervisor, Component, http_probe, tcp_probe, install_signal_handlers
 
-def run_sensor_monitor():
-    """Run the sensor monitor in a separate thread"""
-    print("📡 Starting Sensor Monitor...")
-    try:
-        # Wait a bit for language selector to start
-        time.sleep(5)
-        subprocess.run([sys.executable, "sensor_alert_monitor.py", "--continuous", "2"], check=True)
-    except Exception as e:
-        print(f"❌ Sensor monitor error: {e}")
+HERE = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", "5001"))
+MONITOR_METRICS_PORT = int(os.getenv("MONITOR_METRICS_PORT", "9101"))
+
+def build_supervisor(interval=2):
+    """Messaging gateway first, then the continuous sensor monitor"""
+    return Supervisor([
+        Component(
+            "gateway",
+            [sys.executable, "gateway.py"],
+            cwd=os.path.join(HERE, "..", "backend"),
+            ready=tcp_probe("127.0.0.1", GATEWAY_PORT),
+        ),
+        Component(
+            "monitor",
+            [sys.executable, "sensor_alert_monitor.py", "--continuous", str(interval)],
+            cwd=HERE,
+            ready=http_probe(f"http://127.0.0.1:{MONITOR_METRICS_PORT}/healthz") if MONITOR_METRICS_PORT else None,
+            depends_on=["gateway"],
+        ),
+    ])
 
 def main():
     """Main startup function"""
     print("🚀 TerraShield Complete System")
     print("=" * 50)
-    print("Starting both Language Selector and Sensor Monitor...")
+    print("Starting both Messaging Gateway and Sensor Monitor...")
     print("=" * 50)
-    
-    # Start language selector in background thread
-    language_thread = threading.Thread(target=run_language_selector, daemon=True)
-    language_thread.start()
-    
-    # Wait a moment for language selector to initialize
-    time.sleep(3)
-    
-    # Start sensor monitor in background thread
-    monitor_thread = threading.Thread(target=run_sensor_monitor, daemon=True)
-    monitor_thread.start()
-    
-    print("\n✅ Both services started!")
+
+    supervisor = build_supervisor()
+    install_signal_handlers(supervisor)
+
+    try:
+        if supervisor.start():
+            print("\n✅ Both services are ready!")
+    except KeyboardInterrupt:
+        supervisor.shutdown()
+        return
+
     print("📱 Send 'hi' to your WhatsApp to change language")
     print("📡 Sensor monitor is running continuously")
     print("🛑 Press Ctrl+C to stop all services")
-    
-    try:
-        # Keep main thread alive
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\n🛑 Shutting down TerraShield system...")
-        print("✅ All services stopped")
+
+    supervisor.run()
+    print("\n🛑 TerraShield system stopped")
 
 if __name__ == "__main__":
     main()
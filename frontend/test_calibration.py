@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for TerraShield sensor calibration and the shared risk thresholds
+Checks unit conversion on raw packets without touching the database
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from calibration import CalibrationTable, calibrate_rows, with_derived
+from risk import THRESHOLDS, assess_risk, check_thresholds
+
+SAMPLE_PACKET = {
+    "node_id": 1, "packet_no": 1127,
+    "ax": -2216, "ay": 1532, "az": 16244,
+    "gx": -135, "gy": 759, "gz": -68,
+    "temperature": 47.3, "soil_raw": 4095, "moisture": 0.0
+}
+
+
+@pytest.fixture
+def default_table():
+    return CalibrationTable(path=os.path.join(tempfile.gettempdir(), "missing_calibration.json"))
+
+
+def test_default_units(default_table):
+    """Raw counts are converted to g, deg/s and moisture percent"""
+    row = calibrate_rows([SAMPLE_PACKET], table=default_table)[0]
+
+    assert row["az_g"] == pytest.approx(16244 / 16384, abs=0.001)
+    assert row["vibration"] == pytest.approx((135**2 + 759**2 + 68**2) ** 0.5 / 131, abs=0.01)
+    assert 0 < row["tilt"] < 15   # near-vertical sensor
+    assert row["moisture"] == 0.0   # dry soil
+
+
+def test_per_node_table(tmp_path):
+    """Node entries override offsets, orientation and soil curve"""
+    path = tmp_path / "calibration.json"
+    path.write_text(json.dumps({
+        "nodes": {
+            "2": {
+                "gyro_offset": [-135, 759, -68],
+                "orientation": [[1, 0, 0], [0, 1, 0], [0, 0, -1]],
+                "soil_curve": [[4000, 0], [2000, 100]]
+            }
+        }
+    }))
+
+    table = CalibrationTable(path=str(path))
+    packets = [dict(SAMPLE_PACKET), dict(SAMPLE_PACKET, node_id=2, soil_raw=3000)]
+    node1, node2 = calibrate_rows(packets, table=table)
+
+    assert node2["vibration"] == 0.0
+    assert node2["az_g"] < 0 < node1["az_g"]
+    assert node2["moisture"] == pytest.approx(50.0, abs=0.01)
+
+
+def test_with_derived_keeps_stored_values(default_table):
+    """Values stored at ingest are used as-is; only older rows are calibrated"""
+    stored = dict(SAMPLE_PACKET, moisture=12.5, vibration=1.25, tilt=3.5)
+    legacy = dict(SAMPLE_PACKET, packet_no=1128)
+
+    kept, computed = with_derived([stored, legacy], table=default_table)
+
+    assert (kept["moisture"], kept["vibration"], kept["tilt"]) == (12.5, 1.25, 3.5)
+    assert "az_g" not in kept
+    assert computed["vibration"] == calibrate_rows([legacy], table=default_table)[0]["vibration"]
+
+
+@pytest.mark.parametrize("values, level, should_alert", [
+    ({"moisture": 50, "vibration": 5, "tilt": 5}, "NORMAL", False),
+    ({"moisture": THRESHOLDS["moisture"] + 5, "vibration": 5, "tilt": 5}, "WARNING", False),
+    ({"moisture": THRESHOLDS["moisture"] + 5, "vibration": THRESHOLDS["vibration"] + 2, "tilt": 5}, "CRITICAL", True),
+    ({"moisture": 50, "vibration": THRESHOLDS["vibration"], "tilt": THRESHOLDS["tilt"]}, "NORMAL", False),
+])
+def test_alert_and_risk_agree(values, level, should_alert):
+    """A reading the monitor alerts on is CRITICAL everywhere else"""
+    alert = check_thresholds(values)
+    risk = assess_risk(values)
+
+    assert alert["should_alert"] is should_alert
+    assert risk["level"] == level
+    assert (risk["level"] == "CRITICAL") == alert["should_alert"]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the Supabase access layer's retries and circuit breaker
+Queries are stubbed, so no database or network is needed
+"""
+
+import os
+import sys
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from data_access import CircuitBreaker, Database, DatabaseError, DatabaseUnavailable, is_unavailable
+
+
+class FailingQuery:
+    """Query builder whose execute() raises the given errors in turn, then succeeds"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, _table):
+        return self
+
+    def execute(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return type("Response", (), {"data": [{"ok": True}]})()
+
+
+def database(threshold=3):
+    return Database("http://127.0.0.1:9", "test-key", retries=2, backoff=0.001,
+                    breaker=CircuitBreaker(threshold=threshold, reset_seconds=60))
+
+
+def unavailable(code="PGRST001"):
+    return APIError({"message": "Database client error", "code": code, "hint": None, "details": None})
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("PGRST000", True), ("PGRST001", True), ("57P01", True), ("08006", True), (503, True),
+    ("PGRST204", False), ("23505", False), ("42P01", False), (400, False),
+])
+def test_unavailable_codes(code, expected):
+    assert is_unavailable(unavailable(code)) is expected
+
+
+def test_503_api_error_is_retried_and_raised_as_database_error():
+    db = database()
+    query = FailingQuery([unavailable(), unavailable(503), unavailable()])
+
+    with pytest.raises(DatabaseError):
+        db.run("insert_readings", query, idempotent=True)
+
+    assert query.calls == 3
+    assert db.breaker.state == "open"
+    with pytest.raises(DatabaseUnavailable):
+        db.run("insert_readings", FailingQuery([]))
+
+
+def test_retry_recovers_after_outage():
+    db = database()
+    query = FailingQuery([httpx.ConnectError("refused"), unavailable()])
+
+    assert db.run("recent_readings", query, idempotent=True) == [{"ok": True}]
+    assert query.calls == 3
+    assert db.breaker.state == "closed"
+
+
+def test_query_error_is_the_callers_and_keeps_breaker_closed():
+    db = database(threshold=1)
+    query = FailingQuery([APIError({"message": "column missing", "code": "PGRST204", "hint": None, "details": None})])
+
+    with pytest.raises(APIError):
+        db.run("insert_readings", query, idempotent=True)
+
+    assert query.calls == 1
+    assert db.breaker.state == "closed"
+
+
+def test_writes_are_not_retried():
+    db = database()
+    query = FailingQuery([unavailable()])
+
+    with pytest.raises(DatabaseError):
+        db.run("insert_readings", query)
+
+    assert query.calls == 1
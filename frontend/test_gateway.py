@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the WhatsApp messaging gateway
+Checks command matching and opt-in subscription without Twilio or the database
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from gateway import MessagingGateway
+from language_prefs import LanguagePreferences
+
+SENDER = "whatsapp:+919800000001"
+PHONE = "+919800000001"
+
+
+@pytest.fixture
+def gateway(tmp_path):
+    prefs = LanguagePreferences(db=None, path=str(tmp_path / "user_prefs.json"), peers=[])
+    return MessagingGateway(prefs, send=lambda to, body: None)
+
+
+def subscribed(gateway):
+    return [user["phone"] for user in gateway.prefs.subscribers()]
+
+
+@pytest.mark.parametrize("body", ["what is this?", "hello", "sensor values"])
+def test_unknown_sender_is_not_subscribed(gateway, body):
+    """Messaging the bot without an explicit command never subscribes the sender"""
+    name, reply = gateway.dispatch(SENDER, body)
+
+    assert name == "welcome"
+    assert "subscribe" in reply
+    assert gateway.prefs.get(PHONE) is None
+    assert subscribed(gateway) == []
+
+
+def test_unknown_command_from_known_user_does_not_subscribe(gateway):
+    gateway.dispatch(SENDER, "Hindi")
+    name, _ = gateway.dispatch(SENDER, "asdf qwerty")
+
+    assert name == "unknown"
+    assert gateway.prefs.language(PHONE) == "hindi"
+    assert subscribed(gateway) == []
+
+
+@pytest.mark.parametrize("body", ["subscribe", "START", "join!"])
+def test_subscribe_and_stop(gateway, body):
+    name, _ = gateway.dispatch(SENDER, body)
+    assert name == "subscribe"
+    assert subscribed(gateway) == [PHONE]
+
+    name, _ = gateway.dispatch(SENDER, "stop")
+    assert name == "unsubscribe"
+    assert subscribed(gateway) == []
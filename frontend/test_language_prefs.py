@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-phone language preference store
+A dict-backed table stands in for Supabase, so no database is needed
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from language_prefs import LanguagePreferences
+
+PHONE = "+919800000001"
+
+
+class FakeTable:
+    """user_prefs keyed on phone; an upsert only writes the columns it was given"""
+
+    def __init__(self):
+        self.rows = {}
+        self.down = False
+        self.saves = []
+
+    def save_user_prefs(self, prefs):
+        if self.down:
+            raise ConnectionError("database down")
+        self.saves.append(prefs)
+        for pref in prefs:
+            row = self.rows.setdefault(pref["phone"], {"phone": pref["phone"], "language": None, "subscribed": False})
+            row.update(pref)
+
+    def user_prefs(self):
+        return [dict(row) for row in self.rows.values()]
+
+    def get_user_pref(self, phone):
+        row = self.rows.get(phone)
+        return dict(row) if row else None
+
+
+@pytest.fixture
+def table():
+    return FakeTable()
+
+
+def store(table, tmp_path):
+    return LanguagePreferences(db=table, path=str(tmp_path / "user_prefs.json"), peers=[]).load()
+
+
+def test_workers_changing_different_fields_keep_both(table, tmp_path):
+    """A subscribe on one worker and a language change on another both survive"""
+    first, second = store(table, tmp_path), store(table, tmp_path)
+
+    first.set_subscribed(PHONE, True)
+    first.flush()
+    second.set_language(PHONE, "hindi")   # second has not heard of the user yet
+    second.flush()
+
+    assert table.rows[PHONE] == {"phone": PHONE, "language": "hindi", "subscribed": True}
+    assert table.saves[-1] == [{"phone": PHONE, "language": "hindi"}]
+
+
+def test_lookup_finds_user_registered_elsewhere(table, tmp_path):
+    first, second = store(table, tmp_path), store(table, tmp_path)
+    first.set_subscribed(PHONE, True)
+    first.flush()
+
+    assert second.get(PHONE) is None
+    assert second.lookup(PHONE)["subscribed"] is True
+    assert second.get(PHONE) is not None
+
+
+def test_pending_change_survives_restart(table, tmp_path):
+    """A change saved only to the local file reaches the table after a restart"""
+    table.down = True
+    prefs = store(table, tmp_path)
+    prefs.set_language(PHONE, "marathi")
+    assert prefs.flush() is False
+    assert PHONE not in table.rows
+
+    table.down = False
+    restarted = store(table, tmp_path)
+    assert restarted.language(PHONE) == "marathi"
+    assert restarted.flush() is True
+    assert table.rows[PHONE]["language"] == "marathi"
+
+
+def test_change_during_flush_stays_pending(table, tmp_path):
+    prefs = store(table, tmp_path)
+    prefs.set_language(PHONE, "hindi")
+    save = table.save_user_prefs
+
+    def save_while_user_changes_again(rows):
+        save(rows)
+        prefs.set_language(PHONE, "marathi")   # Arrives while the upsert is in flight
+
+    table.save_user_prefs = save_while_user_changes_again
+    assert prefs.flush() is False
+    assert table.rows[PHONE]["language"] == "hindi"
+
+    table.save_user_prefs = save
+    assert prefs.flush() is True
+    assert table.rows[PHONE]["language"] == "marathi"
+
+
+def test_refresh_keeps_unsaved_local_change(table, tmp_path):
+    table.rows[PHONE] = {"phone": PHONE, "language": "english", "subscribed": True}
+    prefs = store(table, tmp_path)
+    table.down = True
+    prefs.set_language(PHONE, "hindi")
+    prefs.flush()
+    table.down = False   # Back, but the change has not been retried yet
+
+    assert prefs.refresh() is True
+
+    assert prefs.language(PHONE) == "hindi"
+    assert prefs.get(PHONE)["subscribed"] is True
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for per-node packet sequence tracking
+Checks loss, duplicates and reorders computed from packet_no alone
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from link_quality import NodeLinkStats, LinkQualityTracker
+
+
+def feed(*packet_nos):
+    stats = NodeLinkStats(1)
+    results = [stats.record(n, seen_at=1000.0) for n in packet_nos]
+    return stats, results, stats.snapshot(now=1000.0)
+
+
+def test_in_order():
+    _, results, snap = feed(1, 2, 3, 4)
+
+    assert results == ["new"] * 4
+    assert snap["loss_rate"] == 0.0
+    assert snap["window"] == 4
+    assert snap["missing"] == snap["gaps"] == 0
+
+
+def test_gap():
+    _, results, snap = feed(1, 2, 5)
+
+    assert results == ["new"] * 3
+    assert snap["gaps"] == 1
+    assert snap["missing"] == 2
+    assert snap["loss_rate"] == pytest.approx(2 / 5)
+
+
+def test_duplicate():
+    _, results, snap = feed(1, 2, 2, 1)
+
+    assert results == ["new", "new", "duplicate", "duplicate"]
+    assert snap["duplicates"] == 2
+    assert snap["received"] == 2
+    assert snap["loss_rate"] == 0.0
+
+
+def test_reorder_fills_gap():
+    _, results, snap = feed(1, 3, 2)
+
+    assert results == ["new", "new", "reordered"]
+    assert snap["missing"] == 0
+    assert snap["loss_rate"] == 0.0
+
+
+def test_reorder_before_first_packet_seen():
+    """A late packet older than the first one seen widens the window instead of going below zero loss"""
+    _, results, snap = feed(5, 4)
+    assert results == ["new", "reordered"]
+    assert snap["window"] == 2
+    assert snap["loss_rate"] == 0.0
+
+    _, _, snap = feed(5, 2)
+    assert snap["window"] == 4
+    assert snap["missing"] == 2
+    assert snap["loss_rate"] == pytest.approx(0.5)
+
+
+def test_tracker_keys_nodes_by_integer():
+    tracker = LinkQualityTracker()
+    tracker.record({"node_id": "7", "packet_no": "1"})
+    assert tracker.record({"node_id": 7, "packet_no": 1}) == "duplicate"
+    assert tracker.record({"node_id": "x", "packet_no": 1}) is None
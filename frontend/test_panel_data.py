@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for the dashboard panel data round
+Checks that new sensor rows reach the buffer whatever /summary returns
+"""
+
+import os
+import sys
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from panel_data import load_panel_data
+from sensor_buffer import SensorBuffer
+
+BACKEND_URL = "http://backend.test"
+SUMMARY = {"1": {"node_id": 1, "risk": {"level": "NORMAL"}, "last_reading_at": "2025-06-01T00:00:02+00:00"}}
+
+
+def reading(second, node_id=1):
+    return {"node_id": node_id, "moisture": 40.0, "temperature": 25.0, "tilt": 1.0, "vibration": 0.5,
+            "timestamp": f"2025-06-01T00:00:0{second}+00:00"}
+
+
+class FakeFetcher:
+    """Answers fetch_all() from canned responses and records the requests"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def fetch_all(self, specs):
+        self.requests.append(specs)
+        results = {}
+        for name in specs:
+            data, error = self.responses[name]
+            results[name] = {"data": data, "stale": error is not None, "error": error, "fetched_at": None}
+        return results
+
+
+def test_healthy_summary_still_refreshes_buffer():
+    """Rows keep arriving in the buffer on every round, even when /summary answers"""
+    buffer = SensorBuffer()
+    fetcher = FakeFetcher({"summary": (SUMMARY, None), "sensor-data": ([reading(1)], None)})
+
+    first = load_panel_data(fetcher, buffer, BACKEND_URL)
+    fetcher.responses["sensor-data"] = ([reading(1), reading(2), reading(2, node_id=2)], None)
+    second = load_panel_data(fetcher, buffer, BACKEND_URL)
+
+    assert first["summary"] == second["summary"] == SUMMARY
+    assert second["rows_error"] is None
+    assert len(buffer.df) == 3
+    assert fetcher.requests[1]["sensor-data"]["params"]["since"] == reading(1)["timestamp"]
+
+
+def test_failing_rows_keep_buffer_and_summary():
+    """A failed /sensor-data request is reported without touching held rows"""
+    buffer = SensorBuffer()
+    fetcher = FakeFetcher({"summary": (SUMMARY, None), "sensor-data": ([reading(1)], None)})
+    load_panel_data(fetcher, buffer, BACKEND_URL)
+
+    fetcher.responses["sensor-data"] = (None, "timed out")
+    result = load_panel_data(fetcher, buffer, BACKEND_URL)
+
+    assert result["rows_error"] == "timed out"
+    assert result["summary"] == SUMMARY
+    assert len(buffer.df) == 1
+
+
+def test_unusable_summary_is_empty():
+    """An error body from /summary means the panels fall back to buffered rows"""
+    fetcher = FakeFetcher({
+        "summary": ({"status": "error", "message": "db down"}, None),
+        "sensor-data": ([reading(1)], None),
+    })
+    result = load_panel_data(fetcher, SensorBuffer(), BACKEND_URL)
+
+    assert result["summary"] == {}
+    assert result["summary_error"] == "db down"
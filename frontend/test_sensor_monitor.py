@@ -59,28 +59,25 @@ def test_environment():
         return True
 
 def test_calculations():
-    """Test sensor value calculations"""
+    """Test derived sensor values (computed once at ingest)"""
     print("\nTesting sensor calculations...")
     
     try:
-        from sensor_alert_monitor import SensorAlertMonitor
-        monitor = SensorAlertMonitor()
+        from calibration import with_derived
         
-        # Test vibration calculation
-        vibration = monitor.calculate_vibration(1, 2, 3)
+        # Rows stored without derived values are calibrated on read
+        row = with_derived([{"node_id": 1, "ax": 0, "ay": 0, "az": 16384, "gx": 131, "gy": 262, "gz": 393}])[0]
         expected_vibration = (1**2 + 2**2 + 3**2)**0.5
-        if abs(vibration - expected_vibration) < 0.01:
+        if abs(row["vibration"] - expected_vibration) < 0.01:
             print("✅ Vibration calculation working correctly")
         else:
-            print(f"❌ Vibration calculation error: got {vibration}, expected {expected_vibration}")
+            print(f"❌ Vibration calculation error: got {row['vibration']}, expected {expected_vibration}")
             return False
         
-        # Test tilt calculation
-        tilt = monitor.calculate_tilt(0, 0, 1)  # Should be 0 degrees
-        if abs(tilt) < 0.01:
+        if abs(row["tilt"]) < 0.01:
             print("✅ Tilt calculation working correctly")
         else:
-            print(f"❌ Tilt calculation error: got {tilt}, expected ~0")
+            print(f"❌ Tilt calculation error: got {row['tilt']}, expected ~0")
             return False
         
         return True
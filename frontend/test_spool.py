@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline reading spool
+Checks the frame format, crash recovery and replay ordering on a temporary directory
+"""
+
+import os
+import sys
+import zlib
+import struct
+
+import pytest
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from spool import HEADER, Spool, read_frames
+
+
+def reading(packet_no, node_id=1):
+    return {"node_id": node_id, "packet_no": packet_no, "created_at": f"2025-06-01T00:00:{packet_no:02d}+00:00"}
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return Spool(str(tmp_path / "spool"))
+
+
+def sealed_segment(spool, *frames):
+    """Write each frame with its own append and seal the segment; returns its path"""
+    for frame in frames:
+        spool.append(frame)
+    with spool._lock:
+        spool._seal()
+    return spool.segments()[-1]
+
+
+def test_frame_format(spool):
+    path = sealed_segment(spool, [reading(1)])
+
+    with open(path, "rb") as f:
+        data = f.read()
+    length, checksum = HEADER.unpack(data[:HEADER.size])
+    payload = data[HEADER.size:]
+    assert length == len(payload)
+    assert checksum == zlib.crc32(payload)
+    assert list(read_frames(path)) == [[reading(1)]]
+
+
+def test_torn_tail_costs_only_the_last_frame(spool):
+    path = sealed_segment(spool, [reading(1)], [reading(2)])
+    with open(path, "ab") as f:
+        f.write(HEADER.pack(100, 0) + b'[{"node_id"')   # Crash mid-write
+
+    assert list(read_frames(path)) == [[reading(1)], [reading(2)]]
+
+
+def test_replay_sends_in_spool_order_and_removes_segments(spool):
+    sealed_segment(spool, [reading(1), reading(2)], [reading(3)])
+    sealed_segment(spool, [reading(4)])
+    sent = []
+
+    assert spool.replay(sent.append, batch_size=2, concurrency=2) == 4
+    assert [r["packet_no"] for batch in sent for r in batch] == [1, 2, 3, 4]
+    assert not spool.pending()
+
+
+def test_failure_keeps_segment_and_stops(spool):
+    first = sealed_segment(spool, [reading(1)])
+    second = sealed_segment(spool, [reading(2)])
+
+    def send(batch):
+        raise ConnectionError("database down")
+
+    with pytest.raises(ConnectionError):
+        spool.replay(send)
+    assert spool.segments() == [first, second]
+
+
+def test_rejected_segment_is_quarantined_and_replay_goes_on(spool):
+    first = sealed_segment(spool, [dict(reading(1), bogus=1)])
+    sealed_segment(spool, [reading(2)])
+    sent = []
+
+    def send(batch):
+        if any("bogus" in r for r in batch):
+            raise ValueError("unknown column")
+        sent.extend(batch)
+
+    assert spool.replay(send, is_rejected=lambda e: isinstance(e, ValueError)) == 1
+    assert sent == [reading(2)]
+    assert not spool.pending()
+    assert os.path.exists(os.path.join(spool.directory, "quarantine", os.path.basename(first) + ".rejected"))
+
+
+def test_corrupt_frame_keeps_later_frames(spool):
+    path = sealed_segment(spool, [reading(1)], [reading(2)], [reading(3)])
+    with open(path, "r+b") as f:
+        length, _ = HEADER.unpack(f.read(HEADER.size))
+        f.seek(HEADER.size + length + HEADER.size)   # Payload of the second frame
+        f.write(b"X")
+    sent = []
+
+    assert spool.replay(sent.extend) == 1
+    assert sent == [reading(1)]
+    kept = os.path.join(spool.directory, "quarantine", os.path.basename(path) + ".corrupt")
+    assert os.path.exists(kept)
+    assert not spool.pending()
+
+
+class DownDatabase:
+    """Supabase reachable, database behind it not: PostgREST answers 503 PGRST001"""
+
+    def insert_readings(self, records):
+        from postgrest.exceptions import APIError
+        raise APIError({"message": "Database client error", "code": "PGRST001", "hint": None, "details": None})
+
+
+def test_ingest_spools_when_postgrest_reports_database_down(spool, monkeypatch):
+    import app as backend
+    monkeypatch.setattr(backend, "get_database", lambda: DownDatabase())
+    monkeypatch.setattr(backend, "get_spool", lambda: spool)
+    monkeypatch.setattr(backend, "get_archive", lambda: None)
+    client = backend.create_app().test_client()
+
+    packet = {"node_id": 7, "packet_no": 1, "ax": 0, "ay": 0, "az": 16384, "gx": 0, "gy": 0, "gz": 0,
+              "soil_raw": 2000, "temperature": 25.0, "firmware": "v2"}
+    response = client.post("/sensor-data", json=packet)
+
+    assert response.status_code == 200
+    assert response.get_json()["spooled"] is True
+    stored = list(spool.records())
+    assert [r["packet_no"] for r in stored] == [1]
+    assert "firmware" not in stored[0]   # Not a sensor_readings column
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the webhook guard state shared by backend workers
+Two guards on one SQLite file stand in for two pre-forked workers
+"""
+
+import os
+import sys
+
+# Add backend directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from webhook_guard import SharedState, SharedDedupeCache, SharedRateLimiter
+
+
+def workers(tmp_path, count=2):
+    path = str(tmp_path / "webhooks.db")
+    return [SharedState(path) for _ in range(count)]
+
+
+def test_retry_on_another_worker_is_a_duplicate(tmp_path):
+    first, second = (SharedDedupeCache(state, "gateway") for state in workers(tmp_path))
+
+    assert not first.seen("SM1")
+    assert second.seen("SM1")
+
+    second.forget("SM1")   # Handler failed: Twilio's retry goes through
+    assert not first.seen("SM1")
+
+
+def test_rate_limit_is_shared_by_workers(tmp_path):
+    limiters = [SharedRateLimiter(state, "gateway", rate=0.001, burst=4) for state in workers(tmp_path)]
+
+    allowed = [limiters[i % 2].allow("whatsapp:+919800000001") for i in range(8)]
+
+    assert allowed == [True] * 4 + [False] * 4
+    assert limiters[0].allow("whatsapp:+919800000002")
+
+
+def test_dedupe_keeps_at_most_max_entries(tmp_path):
+    cache = SharedDedupeCache(workers(tmp_path, 1)[0], "gateway", max_entries=10)
+    for i in range(200):
+        cache.seen(f"SM{i}")
+
+    assert len(cache) == 10
+    assert cache.seen("SM199")
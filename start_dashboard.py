@@ -2,44 +2,42 @@
 """
 TerraShield Dashboard Startup Script
 Runs both Flask backend API and Streamlit frontend dashboard
+
+The dashboard starts as soon as the backend answers HTTP requests, and the
+browser opens once the dashboard is listening. Either process is restarted
+if it exits (see frontend/process_supervisor.py).
 """
 
 import os
 import sys
-import time
-import threading
-import subprocess
 import webbrowser
-from datetime import datetime
 
-def run_flask_backend():
-    """Run the Flask backend API in a separate thread"""
-    print("🔧 Starting Flask Backend API...")
-    try:
-        # Change to backend directory
-        backend_dir = os.path.join(os.path.dirname(__file__), 'backend')
-        os.chdir(backend_dir)
-        
-        # Run Flask app
-        subprocess.run([sys.executable, "app.py"], check=True)
-    except Exception as e:
-        print(f"❌ Flask backend error: {e}")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
 
-def run_streamlit_dashboard():
-    """Run the Streamlit dashboard in a separate thread"""
-    print("📊 Starting Streamlit Dashboard...")
-    try:
-        # Wait for Flask backend to start
-        time.sleep(3)
-        
-        # Change to frontend directory
-        frontend_dir = os.path.join(os.path.dirname(__file__), 'frontend')
-        os.chdir(frontend_dir)
-        
-        # Run Streamlit dashboard
-        subprocess.run([sys.executable, "-m", "streamlit", "run", "dashboard2.py", "--server.port=8501"], check=True)
-    except Exception as e:
-        print(f"❌ Streamlit dashboard error: {e}")
+from process_supervisor import Supervisor, Component, http_probe, install_signal_handlers
+
+BACKEND_PORT = int(os.getenv("WEB_PORT", "5000"))
+DASHBOARD_PORT = 8501
+
+def build_supervisor():
+    """Backend API first, then the dashboard"""
+    return Supervisor([
+        Component(
+            "backend",
+            [sys.executable, "app.py"],
+            cwd=os.path.join(ROOT, "backend"),
+            ready=http_probe(f"http://127.0.0.1:{BACKEND_PORT}/healthz"),
+        ),
+        Component(
+            "dashboard",
+            [sys.executable, "-m", "streamlit", "run", "dashboard2.py",
+             f"--server.port={DASHBOARD_PORT}", "--server.headless=true"],
+            cwd=os.path.join(ROOT, "frontend"),
+            ready=http_probe(f"http://localhost:{DASHBOARD_PORT}/"),
+            depends_on=["backend"],
+        ),
+    ])
 
 def main():
     """Main startup function"""
@@ -47,42 +45,33 @@ def main():
     print("=" * 50)
     print("Starting Flask Backend API and Streamlit Dashboard...")
     print("=" * 50)
-    
-    # Start Flask backend in background thread
-    flask_thread = threading.Thread(target=run_flask_backend, daemon=True)
-    flask_thread.start()
-    
-    # Wait a moment for Flask to initialize
-    time.sleep(2)
-    
-    # Start Streamlit dashboard in background thread
-    dashboard_thread = threading.Thread(target=run_streamlit_dashboard, daemon=True)
-    dashboard_thread.start()
-    
-    # Wait for Streamlit to start
-    time.sleep(5)
-    
-    print("\n✅ Both services started!")
-    print("🔧 Flask Backend API: http://127.0.0.1:5000")
-    print("📊 Streamlit Dashboard: http://localhost:8501")
-    print("📡 Sensor Data API: http://127.0.0.1:5000/sensor-data")
-    print("🛑 Press Ctrl+C to stop all services")
-    
-    # Open dashboard in browser
-    try:
-        webbrowser.open("http://localhost:8501")
-        print("🌐 Dashboard opened in your default browser")
-    except Exception as e:
-        print(f"⚠️ Could not open browser automatically: {e}")
-        print("Please manually open: http://localhost:8501")
-    
+
+    supervisor = build_supervisor()
+    install_signal_handlers(supervisor)
+
     try:
-        # Keep main thread alive
-        while True:
-            time.sleep(1)
+        ready = supervisor.start()
     except KeyboardInterrupt:
-        print("\n🛑 Shutting down TerraShield Dashboard system...")
-        print("✅ All services stopped")
+        supervisor.shutdown()
+        return
+
+    if ready:
+        print("\n✅ Both services are ready!")
+    print(f"🔧 Flask Backend API: http://127.0.0.1:{BACKEND_PORT}")
+    print(f"📊 Streamlit Dashboard: http://localhost:{DASHBOARD_PORT}")
+    print(f"📡 Sensor Data API: http://127.0.0.1:{BACKEND_PORT}/sensor-data")
+    print("🛑 Press Ctrl+C to stop all services")
+
+    if ready:
+        try:
+            webbrowser.open(f"http://localhost:{DASHBOARD_PORT}")
+            print("🌐 Dashboard opened in your default browser")
+        except Exception as e:
+            print(f"⚠️ Could not open browser automatically: {e}")
+            print(f"Please manually open: http://localhost:{DASHBOARD_PORT}")
+
+    supervisor.run()
+    print("\n🛑 TerraShield Dashboard system stopped")
 
 if __name__ == "__main__":
     main()